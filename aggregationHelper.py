@@ -0,0 +1,102 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+def weighted_rollup(
+    df: pd.DataFrame,
+    levels: Sequence[str],
+    *,
+    value_col: str,
+    weight_col: str,
+    value_name: Optional[str] = None,
+    sums: Optional[Dict[str, str]] = None,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Promedio ponderado jerárquico (sum(v·w) / sum(w)) vectorizado.
+
+    Hace UNA sola pasada sobre las filas: asigna un código de grupo al nivel
+    más fino (p.ej. macro + categoría) y acumula con np.bincount. Los niveles
+    superiores y el total se obtienen sumando los acumulados del nivel fino,
+    que son pocas filas.
+
+    Parámetros
+    ----------
+    df : DataFrame
+        Filas a nivel SKU.
+    levels : list[str]
+        Jerarquía de agrupación, de la más gruesa a la más fina.
+    value_col, weight_col : str
+        Columna a promediar y columna de peso. Solo cuentan las filas donde
+        ambas tienen valor (igual que el weightedAvg de AG Grid).
+    value_name : str | None
+        Nombre de la columna de salida (por defecto "<value_col>_pond").
+    sums : dict[str, str] | None
+        Columnas a sumar por grupo: {columna_origen: nombre_salida}.
+
+    Retorna
+    -------
+    dict[str, DataFrame]
+        Un DataFrame por nivel (clave = nombre de la columna del nivel) y
+        "total" con una sola fila.
+    """
+    levels = list(levels)
+    value_name = value_name or f"{value_col}_pond"
+    sums = dict(sums or {})
+
+    num_col = "__num"
+    den_col = "__den"
+    acc_cols: List[str] = [num_col, den_col] + list(sums.values())
+
+    if df.empty:
+        empty = pd.DataFrame(columns=levels + list(sums.values()) + [value_name])
+        out = {lvl: empty[levels[: i + 1] + list(sums.values()) + [value_name]]
+               for i, lvl in enumerate(levels)}
+        out["total"] = pd.DataFrame(
+            [{**{c: 0.0 for c in sums.values()}, value_name: np.nan}]
+        )
+        return out
+
+    # ---------- Pasada única a nivel fino ----------
+    grouper = df.groupby(levels, dropna=False, sort=True, observed=True)
+    codes = grouper.ngroup().to_numpy()
+    keys = grouper.size().index
+    n_groups = len(keys)
+
+    v = pd.to_numeric(df[value_col], errors="coerce").to_numpy(dtype="float64")
+    w = pd.to_numeric(df[weight_col], errors="coerce").to_numpy(dtype="float64")
+    valid = ~(np.isnan(v) | np.isnan(w))
+
+    leaf = keys.to_frame(index=False)
+    leaf[num_col] = np.bincount(
+        codes[valid], weights=v[valid] * w[valid], minlength=n_groups
+    )
+    leaf[den_col] = np.bincount(codes[valid], weights=w[valid], minlength=n_groups)
+
+    for src, dst in sums.items():
+        x = pd.to_numeric(df[src], errors="coerce").to_numpy(dtype="float64")
+        leaf[dst] = np.bincount(codes, weights=np.nan_to_num(x), minlength=n_groups)
+
+    def _finish(frame: pd.DataFrame) -> pd.DataFrame:
+        den = frame[den_col].to_numpy(dtype="float64")
+        num = frame[num_col].to_numpy(dtype="float64")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            frame[value_name] = np.where(np.isclose(den, 0), np.nan, num / den)
+        return frame.drop(columns=[num_col, den_col])
+
+    # ---------- Niveles superiores a partir del nivel fino ----------
+    out: Dict[str, pd.DataFrame] = {}
+    for i, lvl in enumerate(levels[:-1]):
+        keys_lvl = levels[: i + 1]
+        frame = (
+            leaf.groupby(keys_lvl, dropna=False, sort=True, observed=True)[acc_cols]
+            .sum()
+            .reset_index()
+        )
+        out[lvl] = _finish(frame)
+
+    out[levels[-1]] = _finish(leaf.copy())
+    out["total"] = _finish(leaf[acc_cols].sum().to_frame().T.reset_index(drop=True))
+
+    return out
@@ -0,0 +1,394 @@
+"""
+Jobs batch que corren después de la carga diaria.
+
+Uso:
+    python batchJobs.py snapshot --fecha 2025-01-31
+    python batchJobs.py snapshot --desde 2025-01-01 --hasta 2025-01-31
+    python batchJobs.py chiper-dia --fecha 2025-01-31
+    python batchJobs.py chiper-dia --desde 2025-01-01 --hasta 2025-01-31
+    python batchJobs.py sketches --fecha 2025-01-31
+    python batchJobs.py sketches --desde 2025-01-01 --hasta 2025-01-31
+    python batchJobs.py scoring
+    python batchJobs.py scoring --desde 2025-01-01
+    python batchJobs.py scoring --reset
+"""
+import argparse
+from datetime import date, datetime, timedelta
+from typing import Any, Iterable, List, Optional, Tuple
+
+from mySQLHelper import HOST, execute_mysql_query, execute_mysql_transaction
+from dataLoaders import (
+    CHIPER_DIA_RUN_TABLE,
+    CHIPER_DIA_TABLE,
+    SKETCH_DIA_RUN_TABLE,
+    SKETCH_DIA_TABLE,
+    SKETCH_HLL_CHIPER,
+    SKETCH_HLL_POSICIONAMIENTO,
+    SKETCH_TDIGEST_POSICIONAMIENTO,
+    SNAPSHOT_RUN_TABLE,
+    SNAPSHOT_TABLE,
+    VENTANAS_SNAPSHOT,
+    sql_chiper_sku_dia,
+    sql_posicionamiento_ventana,
+    sql_sketch_posicionamiento_dia,
+    sql_sketch_skus_chiper_dia,
+)
+from outlierScoring import DIAS_REPUNTAJE, run_scoring
+from sketchHelper import HyperLogLog, TDigest
+
+# ======================================================
+# DDL
+# ======================================================
+DDL_SNAPSHOT_POSICIONAMIENTO = f"""
+CREATE TABLE IF NOT EXISTS {SNAPSHOT_TABLE} (
+    fecha_actual                 DATE          NOT NULL,
+    dias_ventana                 SMALLINT      NOT NULL,
+    id_competidor                INT           NOT NULL,
+    id_sku                       INT           NOT NULL,
+    sku                          VARCHAR(64)   NULL,
+    macro                        VARCHAR(255)  NULL,
+    categoria                    VARCHAR(255)  NULL,
+    proveedor                    VARCHAR(255)  NULL,
+    nombre                       VARCHAR(255)  NULL,
+    precio_chiper                DECIMAL(14,4) NULL,
+    precio_lleno_competidor      DECIMAL(14,4) NULL,
+    precio_descuento_competidor  DECIMAL(14,4) NULL,
+    venta_neta                   DECIMAL(18,4) NULL,
+    posicionamiento              DOUBLE        NULL,
+    peso_venta                   DOUBLE        NULL,
+    total_skus_chiper            INT           NULL,
+    PRIMARY KEY (fecha_actual, dias_ventana, id_competidor, id_sku)
+);
+"""
+
+DDL_SNAPSHOT_POSICIONAMIENTO_RUN = f"""
+CREATE TABLE IF NOT EXISTS {SNAPSHOT_RUN_TABLE} (
+    fecha_actual   DATE      NOT NULL,
+    dias_ventana   SMALLINT  NOT NULL,
+    id_competidor  INT       NOT NULL,
+    filas          INT       NOT NULL,
+    generado_en    DATETIME  NOT NULL,
+    PRIMARY KEY (fecha_actual, dias_ventana, id_competidor)
+);
+"""
+
+
+DDL_CHIPER_SKU_DIA = f"""
+CREATE TABLE IF NOT EXISTS {CHIPER_DIA_TABLE} (
+    fecha             DATE          NOT NULL,
+    id_sku            INT           NOT NULL,
+    precio_bruto_dia  DECIMAL(14,4) NULL,
+    venta_neta_dia    DECIMAL(18,4) NULL,
+    unidades_dia      DECIMAL(18,4) NULL,
+    transacciones     INT           NOT NULL,
+    PRIMARY KEY (fecha, id_sku),
+    KEY idx_chiper_dia_sku (id_sku, fecha)
+);
+"""
+
+DDL_CHIPER_SKU_DIA_RUN = f"""
+CREATE TABLE IF NOT EXISTS {CHIPER_DIA_RUN_TABLE} (
+    fecha        DATE      NOT NULL PRIMARY KEY,
+    filas        INT       NOT NULL,
+    generado_en  DATETIME  NOT NULL
+);
+"""
+
+DDL_SKETCH_DIA = f"""
+CREATE TABLE IF NOT EXISTS {SKETCH_DIA_TABLE} (
+    fecha          DATE         NOT NULL,
+    tipo           VARCHAR(16)  NOT NULL,
+    id_competidor  INT          NOT NULL,
+    id_categoria   INT          NOT NULL,
+    n              INT          NOT NULL,
+    datos          MEDIUMBLOB   NOT NULL,
+    PRIMARY KEY (fecha, tipo, id_competidor, id_categoria),
+    KEY idx_sketch_dia_competidor (id_competidor, fecha)
+);
+"""
+
+DDL_SKETCH_DIA_RUN = f"""
+CREATE TABLE IF NOT EXISTS {SKETCH_DIA_RUN_TABLE} (
+    fecha        DATE      NOT NULL PRIMARY KEY,
+    filas        INT       NOT NULL,
+    generado_en  DATETIME  NOT NULL
+);
+"""
+
+
+def ensure_snapshot_tables() -> None:
+    execute_mysql_query(DDL_SNAPSHOT_POSICIONAMIENTO, fetch=False)
+    execute_mysql_query(DDL_SNAPSHOT_POSICIONAMIENTO_RUN, fetch=False)
+
+
+def ensure_chiper_dia_tables() -> None:
+    execute_mysql_query(DDL_CHIPER_SKU_DIA, fetch=False)
+    execute_mysql_query(DDL_CHIPER_SKU_DIA_RUN, fetch=False)
+
+
+def ensure_sketch_tables() -> None:
+    execute_mysql_query(DDL_SKETCH_DIA, fetch=False)
+    execute_mysql_query(DDL_SKETCH_DIA_RUN, fetch=False)
+
+
+def _competidores() -> List[int]:
+    df = execute_mysql_query("SELECT id FROM competidor ORDER BY id;", host=HOST)
+    if df is None or df.empty:
+        return []
+    return [int(x) for x in df["id"]]
+
+
+def _fechas(desde: date, hasta: date) -> Iterable[date]:
+    d = desde
+    while d <= hasta:
+        yield d
+        d += timedelta(days=1)
+
+
+# ======================================================
+# SNAPSHOT DE POSICIONAMIENTO (VENTANAS PREDEFINIDAS)
+# ======================================================
+def run_snapshot_posicionamiento(
+    fecha: date,
+    competidores: Optional[List[int]] = None,
+    ventanas: Optional[List[int]] = None,
+    batch_size: int = 1000,
+) -> None:
+    """
+    Calcula el posicionamiento a nivel SKU para cada ventana predefinida y
+    cada competidor, con `fecha` como fecha_actual, y lo deja en
+    `snapshot_posicionamiento`. Es idempotente: cada combinación se borra,
+    se reescribe y se registra en `snapshot_posicionamiento_run` en UNA
+    transacción, y la corrida solo se registra si quedaron len(df) filas
+    (si no, el loader sigue calculando en vivo).
+    """
+    fecha_str = fecha.strftime("%Y-%m-%d")
+    competidores = competidores if competidores is not None else _competidores()
+    ventanas = ventanas or VENTANAS_SNAPSHOT
+    clave = "fecha_actual = %s AND dias_ventana = %s AND id_competidor = %s"
+
+    for id_competidor in competidores:
+        for ventana in ventanas:
+            # Al primario: corre después de la carga diaria y la réplica puede ir atrasada
+            df = execute_mysql_query(
+                sql_posicionamiento_ventana(id_competidor, fecha_str, ventana),
+                host=HOST,
+            )
+            if df is None:
+                print(f"[ERROR] Snapshot {fecha_str} ventana={ventana} competidor={id_competidor}: consulta fallida")
+                continue
+
+            params_clave = (fecha_str, ventana, id_competidor)
+            statements: List[Tuple[str, Any]] = [
+                (f"DELETE FROM {SNAPSHOT_RUN_TABLE} WHERE {clave};", params_clave),
+                (f"DELETE FROM {SNAPSHOT_TABLE} WHERE {clave};", params_clave),
+            ]
+            if not df.empty:
+                cols = ["fecha_actual", "dias_ventana", "id_competidor", *df.columns]
+                insert_sql = (
+                    f"INSERT INTO {SNAPSHOT_TABLE} ({', '.join(cols)}) "
+                    f"VALUES ({', '.join(['%s'] * len(cols))});"
+                )
+                filas = [
+                    params_clave + fila
+                    for fila in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+                ]
+                statements += [
+                    (insert_sql, filas[i:i + batch_size]) for i in range(0, len(filas), batch_size)
+                ]
+            # La corrida se registra solo si la combinación quedó completa
+            statements.append((
+                f"INSERT INTO {SNAPSHOT_RUN_TABLE} "
+                f"(fecha_actual, dias_ventana, id_competidor, filas, generado_en) "
+                f"SELECT %s, %s, %s, %s, %s FROM DUAL "
+                f"WHERE (SELECT COUNT(*) FROM {SNAPSHOT_TABLE} WHERE {clave}) = %s;",
+                (*params_clave, len(df), datetime.now(), *params_clave, len(df)),
+            ))
+
+            res = execute_mysql_transaction(statements, loader="snapshot_posicionamiento")
+            if res is None:
+                print(f"[ERROR] Snapshot {fecha_str} ventana={ventana} competidor={id_competidor}: transacción fallida")
+            elif res[-1]["rowcount"] != 1:
+                print(
+                    f"[ERROR] Snapshot {fecha_str} ventana={ventana} competidor={id_competidor}: "
+                    f"filas insertadas != {len(df)}; sin registrar la corrida"
+                )
+
+
+# ======================================================
+# PRECIO CHIPER POR SKU/DÍA
+# ======================================================
+def run_chiper_sku_dia(fecha: date) -> bool:
+    """
+    Reduce ventas_chiper del día a una fila por SKU en `chiper_sku_dia`
+    (INSERT ... SELECT en el servidor). Idempotente: borra y reescribe el día
+    y lo registra en `chiper_sku_dia_run`, todo en una transacción.
+    Retorna True si la transacción se aplicó.
+    """
+    fecha_str = fecha.strftime("%Y-%m-%d")
+    res = execute_mysql_transaction([
+        (f"DELETE FROM {CHIPER_DIA_TABLE} WHERE fecha = %s;", (fecha_str,)),
+        (
+            f"INSERT INTO {CHIPER_DIA_TABLE} "
+            f"(fecha, id_sku, precio_bruto_dia, venta_neta_dia, unidades_dia, transacciones) "
+            f"{sql_chiper_sku_dia(fecha_str, fecha_str)};",
+            None,
+        ),
+        (
+            # ROW_COUNT(): filas del INSERT ... SELECT anterior (misma sesión)
+            f"INSERT INTO {CHIPER_DIA_RUN_TABLE} (fecha, filas, generado_en) "
+            f"VALUES (%s, ROW_COUNT(), %s) "
+            f"ON DUPLICATE KEY UPDATE filas = VALUES(filas), generado_en = VALUES(generado_en);",
+            (fecha_str, datetime.now()),
+        ),
+    ], loader="chiper_sku_dia")
+    if res is None:
+        print(f"[ERROR] chiper_sku_dia {fecha_str}: transacción fallida")
+        return False
+    print(f"[chiper-dia] {fecha_str}: {res[1]['rowcount']} SKUs")
+    return True
+
+
+# ======================================================
+# SKETCHES POR DÍA (REPRESENTATIVIDAD Y CUANTILES)
+# ======================================================
+def run_sketches_dia(fecha: date) -> bool:
+    """
+    Resume el día en sketches combinables (sketchHelper), por categoría:
+    HyperLogLog de los SKUs vendidos por Chiper, y por competidor
+    HyperLogLog de los SKUs con posicionamiento y t-digest del
+    posicionamiento SKU/día. Lee chiper_sku_dia y rechaza los días que el
+    job chiper-dia no registró en `chiper_sku_dia_run`.
+    Idempotente: borra y reescribe el día en `sketch_dia` y lo registra en
+    `sketch_dia_run`, todo en una transacción. Retorna True si se aplicó.
+    """
+    fecha_str = fecha.strftime("%Y-%m-%d")
+    # Lecturas al primario: el job acaba de escribir chiper_sku_dia y su corrida
+    df_run = execute_mysql_query(
+        f"SELECT 1 AS ok FROM {CHIPER_DIA_RUN_TABLE} WHERE fecha = %s;", (fecha_str,), host=HOST
+    )
+    if df_run is None or df_run.empty:
+        print(f"[ERROR] sketches {fecha_str}: el día no está en {CHIPER_DIA_RUN_TABLE} (correr chiper-dia)")
+        return False
+    df_chiper = execute_mysql_query(sql_sketch_skus_chiper_dia(), (fecha_str,), host=HOST)
+    df_pos = execute_mysql_query(
+        sql_sketch_posicionamiento_dia(), (fecha_str, fecha_str, fecha_str), host=HOST
+    )
+    if df_chiper is None or df_pos is None:
+        print(f"[ERROR] sketches {fecha_str}: consulta fallida")
+        return False
+
+    filas: List[Tuple[Any, ...]] = []
+    for id_cat, g in df_chiper.groupby("id_categoria", sort=True):
+        ids = g["id_sku"].to_numpy()
+        filas.append((fecha_str, SKETCH_HLL_CHIPER, 0, int(id_cat), len(ids),
+                      HyperLogLog.from_ids(ids).to_bytes()))
+
+    df_pos["posicionamiento"] = df_pos["posicionamiento"].astype(float)
+    df_pos = df_pos[df_pos["posicionamiento"].notna()]
+    for (id_comp, id_cat), g in df_pos.groupby(["id_competidor", "id_categoria"], sort=True):
+        ids = g["id_sku"].to_numpy()
+        filas.append((fecha_str, SKETCH_HLL_POSICIONAMIENTO, int(id_comp), int(id_cat), len(ids),
+                      HyperLogLog.from_ids(ids).to_bytes()))
+        filas.append((fecha_str, SKETCH_TDIGEST_POSICIONAMIENTO, int(id_comp), int(id_cat), len(ids),
+                      TDigest.from_values(g["posicionamiento"].to_numpy()).to_bytes()))
+
+    statements = [(f"DELETE FROM {SKETCH_DIA_TABLE} WHERE fecha = %s;", (fecha_str,))]
+    if filas:
+        statements.append((
+            f"INSERT INTO {SKETCH_DIA_TABLE} "
+            f"(fecha, tipo, id_competidor, id_categoria, n, datos) "
+            f"VALUES (%s, %s, %s, %s, %s, %s);",
+            filas,
+        ))
+    statements.append((
+        f"INSERT INTO {SKETCH_DIA_RUN_TABLE} (fecha, filas, generado_en) "
+        f"VALUES (%s, %s, %s) "
+        f"ON DUPLICATE KEY UPDATE filas = VALUES(filas), generado_en = VALUES(generado_en);",
+        (fecha_str, len(filas), datetime.now()),
+    ))
+    if execute_mysql_transaction(statements, loader="sketch_dia") is None:
+        print(f"[ERROR] sketches {fecha_str}: transacción fallida")
+        return False
+    print(f"[sketches] {fecha_str}: {len(filas)} sketches")
+    return True
+
+
+# ======================================================
+# CLI
+# ======================================================
+def _parse_date(s: str) -> date:
+    return datetime.strptime(s, "%Y-%m-%d").date()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Jobs batch de Pricing Chiper BI")
+    sub = parser.add_subparsers(dest="job", required=True)
+
+    p_snap = sub.add_parser("snapshot", help="Snapshot de posicionamiento para ventanas predefinidas")
+    p_snap.add_argument("--fecha", type=_parse_date, default=None, help="fecha_actual (por defecto hoy)")
+    p_snap.add_argument("--desde", type=_parse_date, default=None, help="inicio de backfill")
+    p_snap.add_argument("--hasta", type=_parse_date, default=None, help="fin de backfill")
+    p_snap.add_argument("--competidor", type=int, action="append", default=None)
+
+    p_dia = sub.add_parser("chiper-dia", help="Precio Chiper ponderado por SKU/día (chiper_sku_dia)")
+    p_dia.add_argument("--fecha", type=_parse_date, default=None, help="día a procesar (por defecto hoy)")
+    p_dia.add_argument("--desde", type=_parse_date, default=None, help="inicio de backfill")
+    p_dia.add_argument("--hasta", type=_parse_date, default=None, help="fin de backfill")
+    p_dia.add_argument("--sin-sketches", action="store_true", help="no regenera los sketches del día")
+
+    p_sk = sub.add_parser("sketches", help="Sketches por día: SKUs distintos y cuantiles de posicionamiento")
+    p_sk.add_argument("--fecha", type=_parse_date, default=None, help="día a procesar (por defecto hoy)")
+    p_sk.add_argument("--desde", type=_parse_date, default=None, help="inicio de backfill")
+    p_sk.add_argument("--hasta", type=_parse_date, default=None, help="fin de backfill")
+
+    p_score = sub.add_parser("scoring", help="Score robusto (mediana/MAD) de los precio_competidor recientes")
+    p_score.add_argument("--desde", type=_parse_date, default=None, help="repuntúa desde esta fecha")
+    p_score.add_argument("--hasta", type=_parse_date, default=None, help="fin del repuntaje (por defecto hoy)")
+    p_score.add_argument("--dias", type=int, default=DIAS_REPUNTAJE, help="días a repuntuar sin --desde")
+    p_score.add_argument("--reset", action="store_true", help="recalcula todos los scores desde cero")
+    p_score.add_argument("--chunk-rows", type=int, default=20_000)
+
+    args = parser.parse_args(argv)
+
+    if args.job == "snapshot":
+        ensure_snapshot_tables()
+        if args.desde:
+            fechas = list(_fechas(args.desde, args.hasta or args.desde))
+        else:
+            fechas = [args.fecha or date.today()]
+        for f in fechas:
+            run_snapshot_posicionamiento(f, competidores=args.competidor)
+
+    elif args.job == "chiper-dia":
+        ensure_chiper_dia_tables()
+        if not args.sin_sketches:
+            ensure_sketch_tables()
+        if args.desde:
+            fechas = list(_fechas(args.desde, args.hasta or args.desde))
+        else:
+            fechas = [args.fecha or date.today()]
+        for f in fechas:
+            # Los sketches se guardan junto al agregado diario del que salen
+            # (solo si el agregado del día quedó bien)
+            if run_chiper_sku_dia(f) and not args.sin_sketches:
+                run_sketches_dia(f)
+
+    elif args.job == "sketches":
+        ensure_sketch_tables()
+        if args.desde:
+            fechas = list(_fechas(args.desde, args.hasta or args.desde))
+        else:
+            fechas = [args.fecha or date.today()]
+        for f in fechas:
+            run_sketches_dia(f)
+
+    elif args.job == "scoring":
+        total = run_scoring(
+            reset=args.reset, desde=args.desde, hasta=args.hasta, dias=args.dias, chunk_rows=args.chunk_rows
+        )
+        print(f"[scoring] {total['filas']} registros puntuados en {total['chunks']} chunks")
+
+
+if __name__ == "__main__":
+    main()
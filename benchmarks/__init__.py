@@ -0,0 +1,12 @@
+"""
+Benchmarks de Pricing Chiper BI contra un MySQL local con datos sintéticos.
+
+    python -m benchmarks.run_queries --scale small --load
+    python -m benchmarks.run_queries --scale small --baseline benchmarks/results/<archivo>.json
+    python -m benchmarks.run_hit_list --scale small --dias 7,30,90
+    python -m benchmarks.run_loader --baseline benchmarks/results/<archivo>.json
+    python -m benchmarks.run_pages --levels 1,2,4,8,16 --duration 60
+
+La conexión se pasa por argumentos (--host/--user/--password/--database) y se
+aplica como variables CHIPER_*, que tienen prioridad sobre st.secrets.
+"""
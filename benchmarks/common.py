@@ -0,0 +1,177 @@
+"""Utilidades compartidas por los benchmarks: conexión, tiempos y resultados."""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+# ======================================================
+# CONEXIÓN (MySQL local)
+# ======================================================
+def add_connection_args(parser: argparse.ArgumentParser) -> None:
+    g = parser.add_argument_group("conexión MySQL local")
+    g.add_argument("--host", default="127.0.0.1:3306", help='"host" o "host:puerto"')
+    g.add_argument("--user", default="root")
+    g.add_argument("--password", default="")
+    g.add_argument("--database", default="chiper_bench")
+    g.add_argument(
+        "--force",
+        action="store_true",
+        help="permite bases cuyo nombre no contiene 'bench' ni 'test'",
+    )
+
+
+def configure_connection(args: argparse.Namespace) -> None:
+    """
+    Apunta mySQLHelper a la base local vía variables CHIPER_*. Debe llamarse
+    ANTES de importar mySQLHelper / dataLoaders.
+    """
+    db = args.database.lower()
+    if not args.force and "bench" not in db and "test" not in db:
+        raise SystemExit(
+            f"La base '{args.database}' no parece de pruebas (los benchmarks la recrean). "
+            f"Use un nombre con 'bench'/'test' o --force."
+        )
+    os.environ["CHIPER_HOST"] = args.host
+    os.environ["CHIPER_USER"] = args.user
+    os.environ["CHIPER_PASSWORD"] = args.password
+    os.environ["CHIPER_DATABASE"] = args.database
+    # Sin réplicas: todo contra la instancia local indicada
+    os.environ["CHIPER_REPLICA_HOSTS"] = ""
+
+
+def ensure_database(args: argparse.Namespace) -> None:
+    """Crea la base si no existe (conexión sin database)."""
+    import mysql.connector
+    from mySQLHelper import split_endpoint
+
+    host, port = split_endpoint(args.host)
+    cnx = mysql.connector.connect(host=host, port=port, user=args.user, password=args.password)
+    try:
+        cur = cnx.cursor()
+        cur.execute(f"CREATE DATABASE IF NOT EXISTS `{args.database}`")
+        cur.close()
+    finally:
+        cnx.close()
+
+
+# ======================================================
+# TIEMPOS
+# ======================================================
+def timed(fn: Callable[[], Any]) -> Tuple[Any, float]:
+    t0 = time.perf_counter()
+    value = fn()
+    return value, (time.perf_counter() - t0) * 1000.0
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    arr = np.asarray(samples_ms, dtype="float64")
+    if arr.size == 0:
+        return {}
+    return {
+        "n": int(arr.size),
+        "min_ms": float(arr.min()),
+        "median_ms": float(np.median(arr)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "mean_ms": float(arr.mean()),
+    }
+
+
+# ======================================================
+# RESULTADOS Y COMPARACIÓN
+# ======================================================
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except Exception:
+        return None
+
+
+def run_metadata(extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    meta = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "node": platform.node(),
+    }
+    meta.update(extra or {})
+    return meta
+
+
+def save_results(results: Dict[str, Any], prefix: str, out_dir: str = RESULTS_DIR) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(out_dir, f"{prefix}_{stamp}.json")
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(results, fh, indent=2, default=str, ensure_ascii=False)
+    return path
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def compare_results(
+    current: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    *,
+    metric: Callable[[Dict[str, Any]], Optional[float]],
+    tolerance: float,
+    higher_is_better: bool = False,
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Compara caso a caso `metric(caso)` contra el baseline.
+    Retorna (filas, hay_regresion). Una regresión es empeorar más que
+    `tolerance` (fracción, 0.2 = 20%).
+    """
+    rows = []
+    regression = False
+    for name, cur in current.items():
+        base = baseline.get(name)
+        cur_v = metric(cur)
+        base_v = metric(base) if base else None
+        if cur_v is None or not base_v:
+            rows.append({"case": name, "current": cur_v, "baseline": base_v, "change": None, "status": "nuevo"})
+            continue
+        change = (cur_v - base_v) / base_v
+        worse = -change if higher_is_better else change
+        status = "REGRESIÓN" if worse > tolerance else "ok"
+        regression = regression or status != "ok"
+        rows.append({"case": name, "current": cur_v, "baseline": base_v, "change": change, "status": status})
+    return rows, regression
+
+
+def print_table(rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        print("(sin filas)")
+        return
+    cols = list(rows[0].keys())
+    fmt_rows = []
+    for r in rows:
+        fmt = []
+        for c in cols:
+            v = r.get(c)
+            if isinstance(v, float):
+                fmt.append(f"{v:+.1%}" if c == "change" else f"{v:,.1f}")
+            else:
+                fmt.append("" if v is None else str(v))
+        fmt_rows.append(fmt)
+    widths = [max(len(c), *(len(fr[i]) for fr in fmt_rows)) for i, c in enumerate(cols)]
+    print("  ".join(c.ljust(w) for c, w in zip(cols, widths)))
+    for fr in fmt_rows:
+        print("  ".join(v.ljust(w) for v, w in zip(fr, widths)))
@@ -0,0 +1,342 @@
+"""
+Benchmark del Top 20 de Hit_List: consulta anterior (precios de competidor
+cruzados a nivel de registro dentro de daily_sku) contra la actual (ventas y
+precios reducidos por separado a SKU/día antes del cruce).
+
+    python -m benchmarks.run_hit_list --scale small --load
+    python -m benchmarks.run_hit_list --dias 7,30,90 --baseline benchmarks/results/hit_list_small_XXXX.json
+
+Por variante y ventana se mide:
+- tiempo de la consulta (mediana de --repeat corridas);
+- filas leídas por el motor: suma de los contadores Handler_read_* de la
+  sesión (diferencia antes/después de la consulta), más filas escritas en
+  tablas temporales (Handler_write) y filas ordenadas (Sort_rows);
+- exactitud: el ranking y la venta de cada SKU contra una referencia que
+  suma ventas_chiper directamente, sin cruces.
+"""
+import argparse
+import sys
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+from benchmarks.common import (
+    add_connection_args,
+    compare_results,
+    configure_connection,
+    ensure_database,
+    load_results,
+    print_table,
+    run_metadata,
+    save_results,
+    summarize,
+    timed,
+)
+from benchmarks.synthetic import FECHA_FIN_DEFAULT, SCALES
+
+CONTADORES_LECTURA = [
+    "Handler_read_first",
+    "Handler_read_key",
+    "Handler_read_last",
+    "Handler_read_next",
+    "Handler_read_prev",
+    "Handler_read_rnd",
+    "Handler_read_rnd_next",
+]
+CONTADORES_EXTRA = ["Handler_write", "Sort_rows", "Created_tmp_tables", "Created_tmp_disk_tables"]
+
+
+class Variante(NamedTuple):
+    name: str
+    sql: Callable[[str, str], str]
+    # True si el rango incluye el último día completo (fecha < hasta + 1 día)
+    dia_final_completo: bool
+
+
+# ======================================================
+# SQL
+# ======================================================
+def sql_top_20_legacy(dfrom_str: str, dto_str: str) -> str:
+    """dataLoaders.sql_top_20_ventas antes del cambio (cruce a nivel de registro)."""
+    query = f"""
+    WITH
+    params AS (
+      SELECT
+        CAST('{dfrom_str}' AS DATE) AS dfrom,
+        CAST('{dto_str}'   AS DATE) AS dto
+    ),
+    daily_sku AS (
+      SELECT 
+        DATE(v.fecha)                      AS date,
+        v.id_sku                           AS sku,
+        SUM(v.venta_neta)                  AS venta,
+        SUM(v.cantidad)                    AS unidades,
+
+        -- Precio bruto promedio del día (ponderado por unidades)
+        SUM(v.precio_bruto * v.cantidad) 
+          / NULLIF(SUM(v.cantidad), 0)     AS precio_bruto_prom_dia,
+
+        -- Margen total (front + back) del día, ponderado por venta
+        SUM( (v.front + v.back) * v.venta_neta )
+          / NULLIF(SUM(v.venta_neta), 0)   AS margen_front_back_prom_dia,
+
+        -- Precios competidor por día
+        AVG(pc.precio_lleno)               AS precio_lleno_dia,
+        AVG(pc.precio_descuento)           AS precio_descuento_dia
+      FROM ventas_chiper v
+      CROSS JOIN params p
+      LEFT JOIN precio_competidor pc
+        ON pc.id_sku = v.id_sku
+       AND DATE(pc.fecha) = DATE(v.fecha)
+       AND pc.id_competidor = 1          -- opcional / fijo por ahora
+      WHERE v.fecha >= p.dfrom
+        AND v.fecha <= p.dto
+      GROUP BY DATE(v.fecha), v.id_sku
+    )
+    SELECT
+        d.sku,
+        s.nombre                                    AS nombre_sku,
+        c.nombre                                    AS categoria,
+        mc.nombre                                   AS macro_categoria,
+        pvd.nombre                                  AS proveedor,
+
+        SUM(d.venta)                                AS venta_total_periodo,
+        SUM(d.unidades)                             AS unidades_total_periodo,
+
+        -- Precio bruto promedio ponderado por la venta de cada día
+        SUM(d.precio_bruto_prom_dia * d.venta)
+          / NULLIF(SUM(d.venta), 0)                 AS precio_bruto_prom_pond,
+
+        -- Margen (front + back) promedio ponderado por la venta de cada día
+        SUM(d.margen_front_back_prom_dia * d.venta)
+          / NULLIF(SUM(d.venta), 0)                 AS margen_front_back_prom_pond,
+
+        -- Precio lleno competidor promedio ponderado por venta Chiper
+        SUM(
+          CASE 
+            WHEN d.precio_lleno_dia IS NOT NULL 
+            THEN d.precio_lleno_dia * d.venta 
+          END
+        )
+          / NULLIF(
+              SUM(
+                CASE 
+                  WHEN d.precio_lleno_dia IS NOT NULL 
+                  THEN d.venta 
+                END
+              ),
+              0
+            )                                       AS precio_lleno_prom_pond,
+
+        -- Precio descuento competidor promedio ponderado
+        SUM(
+          CASE 
+            WHEN d.precio_descuento_dia IS NOT NULL 
+            THEN d.precio_descuento_dia * d.venta 
+          END
+        )
+          / NULLIF(
+              SUM(
+                CASE 
+                  WHEN d.precio_descuento_dia IS NOT NULL 
+                  THEN d.venta 
+                END
+              ),
+              0
+            )                                       AS precio_descuento_prom_pond
+    FROM daily_sku d
+    LEFT JOIN sku s
+        ON s.id = d.sku
+    LEFT JOIN categoria c
+        ON c.id = s.id_categoria
+    LEFT JOIN macro_categoria mc
+        ON mc.id = c.id_macro
+    LEFT JOIN proveedor pvd
+        ON pvd.id = s.id_proveedor
+    GROUP BY 
+        d.sku, s.nombre, c.nombre, mc.nombre, pvd.nombre
+    ORDER BY venta_total_periodo DESC
+      LIMIT 20;
+    """
+    return query
+
+
+def sql_referencia(dfrom_str: str, dto_str: str, dia_final_completo: bool) -> str:
+    """Top 20 por venta sumando ventas_chiper sin ningún cruce (valor esperado)."""
+    hasta = (
+        f"v.fecha < CAST('{dto_str}' AS DATE) + INTERVAL 1 DAY"
+        if dia_final_completo
+        else f"v.fecha <= CAST('{dto_str}' AS DATE)"
+    )
+    return f"""
+    SELECT v.id_sku AS sku, SUM(v.venta_neta) AS venta_total_periodo
+    FROM ventas_chiper v
+    WHERE v.fecha >= CAST('{dfrom_str}' AS DATE)
+      AND {hasta}
+    GROUP BY v.id_sku
+    ORDER BY venta_total_periodo DESC, v.id_sku
+    LIMIT 20;
+    """
+
+
+def build_variantes() -> List[Variante]:
+    from dataLoaders import sql_top_20_ventas
+
+    return [
+        Variante("antes", sql_top_20_legacy, False),
+        Variante("despues", sql_top_20_ventas, True),
+    ]
+
+
+# ======================================================
+# MEDICIÓN (conexión propia: los contadores son de sesión)
+# ======================================================
+def _connect(args: argparse.Namespace):
+    import mysql.connector
+    from mySQLHelper import split_endpoint
+
+    host, port = split_endpoint(args.host)
+    return mysql.connector.connect(
+        host=host, port=port, user=args.user, password=args.password, database=args.database,
+    )
+
+
+def _session_status(cur) -> Dict[str, int]:
+    cur.execute("SHOW SESSION STATUS WHERE Variable_name LIKE 'Handler_%' "
+                "OR Variable_name IN ('Sort_rows', 'Created_tmp_tables', 'Created_tmp_disk_tables');")
+    return {str(k): int(v) for k, v in cur.fetchall()}
+
+
+def _run(cur, sql: str) -> Tuple[List[Tuple[Any, ...]], List[str], Dict[str, int]]:
+    """Ejecuta `sql` y retorna (filas, columnas, delta de contadores de sesión)."""
+    antes = _session_status(cur)
+    cur.execute(sql)
+    filas = cur.fetchall()
+    columnas = [d[0] for d in cur.description]
+    despues = _session_status(cur)
+    delta = {k: despues.get(k, 0) - antes.get(k, 0) for k in CONTADORES_LECTURA + CONTADORES_EXTRA}
+    return filas, columnas, delta
+
+
+def _exactitud(filas, columnas, referencia) -> Dict[str, Any]:
+    i_sku = columnas.index("sku")
+    i_venta = columnas.index("venta_total_periodo")
+    obtenido = [(int(f[i_sku]), float(f[i_venta] or 0)) for f in filas]
+    esperado = {int(s): float(v or 0) for s, v in referencia}
+    desvios = [
+        abs(v - esperado[s]) / esperado[s]
+        for s, v in obtenido
+        if s in esperado and esperado[s]
+    ]
+    return {
+        "ranking_igual": [s for s, _ in obtenido] == [int(s) for s, _ in referencia],
+        "skus_en_comun": len({s for s, _ in obtenido} & set(esperado)),
+        # venta reportada / venta real - 1 (el cruce a nivel de registro la infla)
+        "inflacion_venta_max": max(desvios) if desvios else None,
+    }
+
+
+def run_variante(cur, variante: Variante, dfrom: str, dto: str, *, repeat: int, warmup: int) -> Dict[str, Any]:
+    sql = variante.sql(dfrom, dto)
+    muestras: List[float] = []
+    delta: Dict[str, int] = {}
+    filas, columnas = [], []
+    for i in range(warmup + repeat):
+        (filas, columnas, delta), ms = timed(lambda: _run(cur, sql))
+        if i >= warmup:
+            muestras.append(ms)
+
+    cur.execute(sql_referencia(dfrom, dto, variante.dia_final_completo))
+    referencia = cur.fetchall()
+    return {
+        "rows": len(filas),
+        "sql": summarize(muestras),
+        "filas_leidas": sum(delta.get(k, 0) for k in CONTADORES_LECTURA),
+        "contadores": delta,
+        **_exactitud(filas, columnas, referencia),
+    }
+
+
+# ======================================================
+# CLI
+# ======================================================
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark del Top 20 de Hit_List (antes/después)")
+    add_connection_args(parser)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--load", action="store_true", help="(re)genera y carga los datos sintéticos")
+    parser.add_argument("--dias", default="7,30", help="ventanas en días, separadas por coma")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--baseline", default=None, help="JSON de resultados previo para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="empeoramiento tolerado (0.2 = 20%%)")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    configure_connection(args)
+    if args.load:
+        ensure_database(args)
+
+    from benchmarks.synthetic import load_synthetic, read_meta
+
+    if args.load:
+        load_synthetic(args.scale, seed=args.seed)
+    meta = read_meta()
+    if meta is None:
+        print("La base no tiene datos sintéticos; ejecute con --load.")
+        return 2
+    fecha_fin = date.fromisoformat(meta.get("fecha_fin", FECHA_FIN_DEFAULT.isoformat()))
+
+    results: Dict[str, Dict[str, Any]] = {}
+    cnx = _connect(args)
+    try:
+        cur = cnx.cursor()
+        for dias in [int(x) for x in args.dias.split(",") if x.strip()]:
+            dfrom = (fecha_fin - timedelta(days=dias)).strftime("%Y-%m-%d")
+            dto = fecha_fin.strftime("%Y-%m-%d")
+            for variante in build_variantes():
+                name = f"top_20_{variante.name}_{dias}"
+                print(f"→ {name}")
+                results[name] = run_variante(cur, variante, dfrom, dto, repeat=args.repeat, warmup=args.warmup)
+        cur.close()
+    finally:
+        cnx.close()
+
+    print_table([
+        {
+            "case": name,
+            "sql_ms": r["sql"].get("median_ms"),
+            "filas_leidas": r["filas_leidas"],
+            "tmp_escritas": r["contadores"].get("Handler_write"),
+            "ranking_igual": r["ranking_igual"],
+            "inflacion_max": r["inflacion_venta_max"],
+        }
+        for name, r in results.items()
+    ])
+
+    payload = {
+        "meta": run_metadata({"benchmark": "hit_list", "data": meta, "repeat": args.repeat}),
+        "cases": results,
+    }
+    if not args.no_save:
+        path = save_results(payload, f"hit_list_{meta.get('scale', args.scale)}")
+        print(f"Resultados: {path}")
+
+    if args.baseline:
+        baseline = load_results(args.baseline)
+        if baseline.get("meta", {}).get("data", {}).get("scale") != meta.get("scale"):
+            print("[AVISO] El baseline es de otra escala; la comparación no es significativa.")
+        rows, regression = compare_results(
+            results,
+            baseline.get("cases", {}),
+            metric=lambda c: c.get("sql", {}).get("median_ms"),
+            tolerance=args.tolerance,
+        )
+        print_table(rows)
+        if regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
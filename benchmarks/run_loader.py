@@ -0,0 +1,254 @@
+"""
+Benchmark de MySQLBulkLoader: filas/s por escenario y costo del rescate de
+filas malas, con compuerta de regresión contra un baseline.
+
+    python -m benchmarks.run_loader
+    python -m benchmarks.run_loader --baseline benchmarks/results/loader_XXXX.json --tolerance 0.15
+
+Escenarios:
+- limpios: distintos anchos y volúmenes, con y sin optimizaciones inseguras;
+- "rango": valores fuera de rango en un DECIMAL (MySQL informa "at row N",
+  se usa el rescate guiado);
+- "nulo": NULL en columna NOT NULL (sin "at row N", se usa el fallback
+  divide-and-conquer).
+El costo del rescate se mide contra el escenario limpio de igual forma.
+"""
+import argparse
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from benchmarks.common import (
+    add_connection_args,
+    compare_results,
+    configure_connection,
+    ensure_database,
+    load_results,
+    print_table,
+    run_metadata,
+    save_results,
+    summarize,
+)
+
+TABLE = "bench_loader"
+
+
+class LoaderScenario(NamedTuple):
+    name: str
+    width: int
+    rows: int
+    bad_fraction: float = 0.0
+    bad_kind: Optional[str] = None  # "rango" | "nulo"
+    unsafe: bool = False
+    batch_size: int = 1000
+    # escenario limpio contra el que se mide el sobrecosto del rescate
+    reference: Optional[str] = None
+
+
+SCENARIOS: List[LoaderScenario] = [
+    LoaderScenario("limpio_w8_50k", width=8, rows=50_000),
+    LoaderScenario("limpio_w8_50k_unsafe", width=8, rows=50_000, unsafe=True),
+    LoaderScenario("limpio_w8_50k_batch5000", width=8, rows=50_000, batch_size=5000),
+    LoaderScenario("limpio_w32_50k", width=32, rows=50_000),
+    LoaderScenario("limpio_w8_200k", width=8, rows=200_000),
+    LoaderScenario("rango_0.01pct", 8, 50_000, 0.0001, "rango", reference="limpio_w8_50k"),
+    LoaderScenario("rango_0.1pct", 8, 50_000, 0.001, "rango", reference="limpio_w8_50k"),
+    LoaderScenario("rango_1pct", 8, 50_000, 0.01, "rango", reference="limpio_w8_50k"),
+    LoaderScenario("nulo_0.01pct", 8, 50_000, 0.0001, "nulo", reference="limpio_w8_50k"),
+    LoaderScenario("nulo_0.1pct", 8, 50_000, 0.001, "nulo", reference="limpio_w8_50k"),
+]
+
+
+# ======================================================
+# TABLA Y DATOS
+# ======================================================
+def _column_types(width: int) -> List[str]:
+    """c0 INT NOT NULL (blanco de "nulo"), c1 DECIMAL(10,2) (blanco de "rango"), luego alternados."""
+    tipos = ["INT NOT NULL", "DECIMAL(10,2) NULL"]
+    ciclo = ["INT NULL", "DECIMAL(10,2) NULL", "VARCHAR(32) NULL", "DATETIME NULL"]
+    for k in range(2, width - 1):
+        tipos.append(ciclo[k % len(ciclo)])
+    return tipos
+
+
+def ddl_for(width: int) -> str:
+    cols = ",\n        ".join(f"c{k} {t}" for k, t in enumerate(_column_types(width)))
+    return f"""
+    CREATE TABLE {TABLE} (
+        id BIGINT NOT NULL PRIMARY KEY,
+        {cols}
+    );
+    """
+
+
+def make_frame(sc: LoaderScenario, seed: int):
+    """DataFrame determinista de `sc.rows` filas y `sc.width` columnas (id incluido)."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng([seed, sc.width, sc.rows])
+    n = sc.rows
+    data: Dict[str, Any] = {"id": np.arange(1, n + 1, dtype="int64")}
+    for k, tipo in enumerate(_column_types(sc.width)):
+        if tipo.startswith("INT"):
+            data[f"c{k}"] = pd.array(rng.integers(0, 1_000_000, n), dtype="Int64")
+        elif tipo.startswith("DECIMAL"):
+            data[f"c{k}"] = np.round(rng.uniform(0, 100_000, n), 2)
+        elif tipo.startswith("VARCHAR"):
+            data[f"c{k}"] = [f"v{x:08d}" for x in rng.integers(0, 10**8, n)]
+        else:
+            data[f"c{k}"] = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 365 * 86400, n), unit="s")
+    df = pd.DataFrame(data)
+
+    n_bad = int(round(n * sc.bad_fraction))
+    if n_bad:
+        malas = rng.choice(n, n_bad, replace=False)
+        if sc.bad_kind == "rango":
+            df.loc[malas, "c1"] = 1e12
+        elif sc.bad_kind == "nulo":
+            df.loc[malas, "c0"] = pd.NA
+        else:
+            raise ValueError(f"bad_kind desconocido: {sc.bad_kind}")
+    return df, n_bad
+
+
+# ======================================================
+# EJECUCIÓN
+# ======================================================
+def run_scenario(sc: LoaderScenario, *, seed: int, repeat: int) -> Dict[str, Any]:
+    from mySQLHelper import execute_mysql_query, my_default_bulk_loader
+
+    df, n_bad = make_frame(sc, seed)
+    loader = my_default_bulk_loader()
+
+    execute_mysql_query(f"DROP TABLE IF EXISTS {TABLE};", fetch=False)
+    execute_mysql_query(ddl_for(sc.width), fetch=False)
+
+    elapsed_ms: List[float] = []
+    rescue_ms: List[float] = []
+    last: Dict[str, Any] = {}
+    for _ in range(repeat):
+        execute_mysql_query(f"TRUNCATE TABLE {TABLE};", fetch=False)
+        stats = loader.bulk_insert_df(
+            table_name=TABLE,
+            df=df,
+            batch_size=sc.batch_size,
+            use_unsafe_optimizations=sc.unsafe,
+        )
+        elapsed_ms.append(stats["elapsed_s"] * 1000.0)
+        rescue_ms.append(stats["rescue_s"] * 1000.0)
+        last = stats
+
+    ok = last["inserted"] == sc.rows - n_bad and last["failed"] == n_bad
+    elapsed = summarize(elapsed_ms)
+    return {
+        "scenario": sc._asdict(),
+        "bad_rows": n_bad,
+        "inserted": last["inserted"],
+        "failed": last["failed"],
+        "correct": ok,
+        "elapsed": elapsed,
+        "rows_per_s": sc.rows / (elapsed["median_ms"] / 1000.0) if elapsed["median_ms"] else None,
+        "rescue": {
+            **summarize(rescue_ms),
+            "attempts": last["rescue_attempts"],
+            "fallback_batches": last["fallback_batches"],
+            "batches_failed": last["batches_failed"],
+        },
+    }
+
+
+def add_overhead(results: Dict[str, Dict[str, Any]]) -> None:
+    """Sobrecosto vs. el escenario limpio de referencia (total y por fila mala)."""
+    for r in results.values():
+        ref = results.get(r["scenario"].get("reference") or "")
+        if not ref:
+            continue
+        extra_ms = r["elapsed"]["median_ms"] - ref["elapsed"]["median_ms"]
+        r["overhead"] = {
+            "extra_ms": extra_ms,
+            "pct": extra_ms / ref["elapsed"]["median_ms"],
+            "ms_per_bad_row": extra_ms / r["bad_rows"] if r["bad_rows"] else None,
+        }
+
+
+# ======================================================
+# CLI
+# ======================================================
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de MySQLBulkLoader")
+    add_connection_args(parser)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", action="append", default=None, help="nombre de escenario (repetible)")
+    parser.add_argument("--rows-factor", type=float, default=1.0, help="escala filas de todos los escenarios")
+    parser.add_argument("--baseline", default=None, help="JSON de resultados previo para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="caída de filas/s tolerada (0.15 = 15%%)")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    configure_connection(args)
+    ensure_database(args)
+
+    scenarios = [
+        sc._replace(rows=max(1, int(sc.rows * args.rows_factor)))
+        for sc in SCENARIOS
+        if not args.only or sc.name in args.only
+    ]
+    # las referencias se corren aunque no se pidan, para poder medir el sobrecosto
+    nombres = {sc.name for sc in scenarios}
+    for sc in list(scenarios):
+        if sc.reference and sc.reference not in nombres:
+            ref = next(s for s in SCENARIOS if s.name == sc.reference)
+            scenarios.insert(0, ref._replace(rows=max(1, int(ref.rows * args.rows_factor))))
+            nombres.add(ref.name)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for sc in scenarios:
+        print(f"→ {sc.name}")
+        results[sc.name] = run_scenario(sc, seed=args.seed, repeat=args.repeat)
+    add_overhead(results)
+
+    print_table([
+        {
+            "case": name,
+            "rows": r["scenario"]["rows"],
+            "bad": r["bad_rows"],
+            "rows_per_s": r["rows_per_s"],
+            "rescue_ms": r["rescue"].get("median_ms"),
+            "overhead": r.get("overhead", {}).get("pct"),
+            "correct": r["correct"],
+        }
+        for name, r in results.items()
+    ])
+
+    payload = {
+        "meta": run_metadata({"benchmark": "loader", "repeat": args.repeat, "rows_factor": args.rows_factor}),
+        "cases": results,
+    }
+    if not args.no_save:
+        path = save_results(payload, "loader")
+        print(f"Resultados: {path}")
+
+    failed = not all(r["correct"] for r in results.values())
+    if failed:
+        print("[ERROR] Algún escenario no insertó/descartó las filas esperadas.")
+
+    if args.baseline:
+        baseline = load_results(args.baseline)
+        if baseline.get("meta", {}).get("rows_factor") != args.rows_factor:
+            print("[AVISO] El baseline usa otro --rows-factor; la comparación no es significativa.")
+        rows, regression = compare_results(
+            results,
+            baseline.get("cases", {}),
+            metric=lambda c: c.get("rows_per_s"),
+            tolerance=args.tolerance,
+            higher_is_better=True,
+        )
+        print_table(rows)
+        failed = failed or regression
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,363 @@
+"""
+Simulación de analistas concurrentes: ejecuta las páginas reales en modo
+headless (streamlit.testing AppTest) desde varios hilos o procesos, con
+parámetros aleatorios, contra la base sintética local.
+
+    python -m benchmarks.run_pages --levels 1,2,4,8,16 --duration 60
+    python -m benchmarks.run_pages --mode process --levels 2,4,8 --fechas 3
+
+Modo "thread": todas las sesiones comparten proceso (y caché), como un único
+servidor Streamlit. Modo "process": cada sesión en su proceso (caché propia).
+
+Por nivel de concurrencia reporta renders/s, percentiles de latencia por
+página, conexiones a MySQL (Threads_connected) y RSS.
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, timedelta
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from benchmarks.common import (
+    add_connection_args,
+    configure_connection,
+    print_table,
+    run_metadata,
+    save_results,
+    summarize,
+)
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ======================================================
+# PÁGINAS Y PARÁMETROS ALEATORIOS
+# ======================================================
+def _widget(widgets, label_prefix: str):
+    for w in widgets:
+        if str(w.label).startswith(label_prefix):
+            return w
+    raise LookupError(f"No se encontró el widget '{label_prefix}'")
+
+
+def _fecha(rng: random.Random, fecha_fin: date, n_fechas: int) -> date:
+    return fecha_fin - timedelta(days=rng.randrange(n_fechas))
+
+
+def _params_posicionamiento(at, rng: random.Random, fecha_fin: date, n_fechas: int) -> None:
+    from dataLoaders import VENTANA_PRESETS
+
+    _widget(at.sidebar.selectbox, "Competidor").set_value(rng.choice([1, 2, 3]))
+    _widget(at.sidebar.date_input, "Fecha base").set_value(_fecha(rng, fecha_fin, n_fechas))
+    preset = rng.choice(list(VENTANA_PRESETS))
+    _widget(at.sidebar.selectbox, "Ventana de tiempo").set_value(preset)
+    at.run()
+    if VENTANA_PRESETS[preset] is None:
+        _widget(at.sidebar.number_input, "Ventana de días").set_value(rng.randint(1, 90))
+        at.run()
+
+
+def _params_posicionamiento_hoy(at, rng: random.Random, fecha_fin: date, n_fechas: int) -> None:
+    _widget(at.sidebar.selectbox, "Competidor").set_value(rng.choice([1, 2, 3]))
+    _widget(at.sidebar.date_input, "Fecha de análisis").set_value(_fecha(rng, fecha_fin, n_fechas))
+    at.run()
+
+
+def _params_hit_list(at, rng: random.Random, fecha_fin: date, n_fechas: int) -> None:
+    hasta = _fecha(rng, fecha_fin, n_fechas)
+    desde = hasta - timedelta(days=rng.choice([7, 14, 30]))
+    _widget(at.sidebar.date_input, "Rango de fechas").set_value((desde, hasta))
+    at.run()
+
+
+def _params_data_cleaner(at, rng: random.Random, fecha_fin: date, n_fechas: int) -> None:
+    hasta = _fecha(rng, fecha_fin, n_fechas)
+    _widget(at.sidebar.selectbox, "Competidor").set_value(rng.choice([0, 1, 2, 3]))
+    _widget(at.sidebar.date_input, "Rango de fechas").set_value((hasta - timedelta(days=30), hasta))
+    _widget(at.sidebar.number_input, "Umbral superior").set_value(rng.choice([1.5, 2.0, 3.0]))
+    at.run()
+
+
+class PageSpec(NamedTuple):
+    path: str
+    params: Callable[..., None]
+    weight: float
+
+
+PAGES: Dict[str, PageSpec] = {
+    "Posicionamiento": PageSpec("pages/Posicionamiento.py", _params_posicionamiento, 0.4),
+    "Posicionamiento_Hoy": PageSpec("pages/Posicionamiento_Hoy.py", _params_posicionamiento_hoy, 0.25),
+    "Hit_List": PageSpec("pages/Hit_List.py", _params_hit_list, 0.2),
+    "Data_Cleaner": PageSpec("pages/Data_Cleaner.py", _params_data_cleaner, 0.15),
+}
+
+
+# ======================================================
+# SESIÓN SIMULADA
+# ======================================================
+def _rss_peak_mb() -> float:
+    # ru_maxrss viene en KB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def session_loop(
+    worker_id: int,
+    *,
+    seed: int,
+    fecha_fin: date,
+    n_fechas: int,
+    deadline: float,
+    pages: List[str],
+    timeout: float,
+) -> Dict[str, Any]:
+    """
+    Una sesión de analista: abre páginas al azar (según peso), espera el
+    render inicial y luego cambia parámetros. Se mide cada fase por separado.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed * 10_007 + worker_id)
+    pesos = [PAGES[p].weight for p in pages]
+    samples: List[Dict[str, Any]] = []
+
+    while time.time() < deadline:
+        page = rng.choices(pages, weights=pesos)[0]
+        spec = PAGES[page]
+        sample: Dict[str, Any] = {"page": page, "worker": worker_id, "status": "ok"}
+        t0 = time.perf_counter()
+        try:
+            at = AppTest.from_file(os.path.join(REPO_ROOT, spec.path), default_timeout=timeout)
+            at.run()
+            t1 = time.perf_counter()
+            spec.params(at, rng, fecha_fin, n_fechas)
+            t2 = time.perf_counter()
+            sample["initial_ms"] = (t1 - t0) * 1000.0
+            sample["render_ms"] = (t2 - t1) * 1000.0
+            if len(at.exception):
+                sample["status"] = "exception"
+                sample["error"] = str(at.exception[0].value)[:300]
+            elif len(at.error):
+                # st.error de la página: sin datos, consulta cancelada, ...
+                sample["status"] = "st_error"
+                sample["error"] = str(at.error[0].value)[:300]
+        except Exception as e:
+            sample["status"] = "harness_error"
+            sample["error"] = f"{type(e).__name__}: {e}"[:300]
+            sample["render_ms"] = (time.perf_counter() - t0) * 1000.0
+        sample["ended_at"] = time.time()
+        samples.append(sample)
+
+    return {"worker": worker_id, "pid": os.getpid(), "rss_peak_mb": _rss_peak_mb(), "samples": samples}
+
+
+# ======================================================
+# MONITOR: CONEXIONES Y MEMORIA
+# ======================================================
+class Monitor:
+    """Muestrea Threads_connected del servidor y el RSS de este proceso (e hijos, con psutil)."""
+
+    def __init__(self, interval_s: float = 1.0):
+        self.interval_s = interval_s
+        self.samples: List[Dict[str, Any]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _connect(self):
+        import mysql.connector
+        from mySQLHelper import DATABASE, HOST, PASSWORD, USER, split_endpoint
+
+        host, port = split_endpoint(HOST)
+        return mysql.connector.connect(host=host, port=port, user=USER, password=PASSWORD, database=DATABASE)
+
+    def _rss_mb(self) -> Optional[float]:
+        if not PSUTIL_AVAILABLE:
+            return None
+        proc = psutil.Process()
+        total = proc.memory_info().rss
+        for child in proc.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / (1024 * 1024)
+
+    def _run(self) -> None:
+        cnx = self._connect()
+        try:
+            cur = cnx.cursor()
+            while not self._stop.is_set():
+                cur.execute("SHOW GLOBAL STATUS WHERE Variable_name IN ('Threads_connected', 'Threads_running')")
+                status = {k.lower(): int(v) for k, v in cur.fetchall()}
+                self.samples.append({
+                    "t": time.time(),
+                    # se descuenta la conexión del propio monitor
+                    "threads_connected": status.get("threads_connected", 0) - 1,
+                    "threads_running": status.get("threads_running", 0),
+                    "rss_mb": self._rss_mb(),
+                })
+                self._stop.wait(self.interval_s)
+            cur.close()
+        finally:
+            cnx.close()
+
+    def __enter__(self) -> "Monitor":
+        self._thread = threading.Thread(target=self._run, name="bench-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def summary(self) -> Dict[str, Any]:
+        conn = [s["threads_connected"] for s in self.samples]
+        rss = [s["rss_mb"] for s in self.samples if s["rss_mb"] is not None]
+        return {
+            "db_threads_connected_max": max(conn) if conn else None,
+            "db_threads_connected_mean": sum(conn) / len(conn) if conn else None,
+            "db_threads_running_max": max((s["threads_running"] for s in self.samples), default=None),
+            "rss_total_mb_max": max(rss) if rss else None,
+        }
+
+
+# ======================================================
+# NIVELES DE CONCURRENCIA
+# ======================================================
+def run_level(concurrency: int, args: argparse.Namespace, fecha_fin: date) -> Dict[str, Any]:
+    deadline = time.time() + args.duration
+    kwargs = dict(
+        seed=args.seed,
+        fecha_fin=fecha_fin,
+        n_fechas=args.fechas,
+        deadline=deadline,
+        pages=args.pages,
+        timeout=args.timeout,
+    )
+    if args.mode == "process":
+        executor = ProcessPoolExecutor(max_workers=concurrency, mp_context=get_context("spawn"))
+    else:
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sesion")
+
+    t0 = time.time()
+    with Monitor(args.sample_s) as monitor, executor:
+        futures = [executor.submit(session_loop, i, **kwargs) for i in range(concurrency)]
+        workers = [f.result() for f in futures]
+    elapsed = time.time() - t0
+
+    samples = [s for w in workers for s in w["samples"]]
+    ok = [s for s in samples if s["status"] == "ok"]
+    por_pagina = {}
+    for page in args.pages:
+        ms = [s["render_ms"] for s in ok if s["page"] == page]
+        por_pagina[page] = {
+            "renders": len(ms),
+            "errors": sum(1 for s in samples if s["page"] == page and s["status"] != "ok"),
+            "render": summarize(ms),
+            "initial": summarize([s["initial_ms"] for s in ok if s["page"] == page]),
+        }
+
+    errores: Dict[str, int] = {}
+    for s in samples:
+        if s["status"] != "ok":
+            errores[s["status"]] = errores.get(s["status"], 0) + 1
+
+    return {
+        "concurrency": concurrency,
+        "mode": args.mode,
+        "elapsed_s": elapsed,
+        "renders": len(ok),
+        "throughput_rps": len(ok) / elapsed if elapsed else None,
+        "errors": errores,
+        "error_examples": [s.get("error") for s in samples if s["status"] != "ok"][:5],
+        "render": summarize([s["render_ms"] for s in ok]),
+        "pages": por_pagina,
+        "workers_rss_peak_mb": sorted({w["pid"]: w["rss_peak_mb"] for w in workers}.values()),
+        "harness_rss_peak_mb": _rss_peak_mb(),
+        **monitor.summary(),
+    }
+
+
+# ======================================================
+# CLI
+# ======================================================
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Simulación de analistas concurrentes sobre las páginas")
+    add_connection_args(parser)
+    parser.add_argument("--levels", default="1,2,4,8", help="niveles de concurrencia, separados por coma")
+    parser.add_argument("--mode", choices=["thread", "process"], default="thread")
+    parser.add_argument("--duration", type=float, default=30.0, help="segundos por nivel")
+    parser.add_argument("--fechas", type=int, default=7, help="fechas distintas a sortear (menos = más aciertos de caché)")
+    parser.add_argument("--pages", default=",".join(PAGES), help="páginas a simular, separadas por coma")
+    parser.add_argument("--timeout", type=float, default=180.0, help="timeout por rerun (s)")
+    parser.add_argument("--sample-s", type=float, default=1.0, help="intervalo del monitor (s)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+    args.pages = [p.strip() for p in args.pages.split(",") if p.strip()]
+    desconocidas = [p for p in args.pages if p not in PAGES]
+    if desconocidas:
+        parser.error(f"Páginas desconocidas: {desconocidas}")
+
+    configure_connection(args)
+    # las páginas importan módulos de la raíz del repo
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+    from benchmarks.synthetic import read_meta
+
+    meta = read_meta()
+    if meta is None:
+        print("La base no tiene datos sintéticos; cárguelos con: python -m benchmarks.run_queries --load")
+        return 2
+    fecha_fin = date.fromisoformat(meta["fecha_fin"])
+    if not PSUTIL_AVAILABLE:
+        print("[AVISO] psutil no está instalado: sin muestreo de RSS en vivo (solo picos por proceso).")
+
+    levels = [int(x) for x in args.levels.split(",") if x.strip()]
+    results = []
+    for c in levels:
+        print(f"→ concurrencia {c} ({args.mode}, {args.duration:.0f} s)")
+        results.append(run_level(c, args, fecha_fin))
+
+    print_table([
+        {
+            "concurrency": r["concurrency"],
+            "renders": r["renders"],
+            "rps": r["throughput_rps"],
+            "p50_ms": r["render"].get("median_ms"),
+            "p95_ms": r["render"].get("p95_ms"),
+            "p99_ms": r["render"].get("p99_ms"),
+            "errors": sum(r["errors"].values()),
+            "db_conn_max": r["db_threads_connected_max"],
+            "rss_mb_max": r["rss_total_mb_max"] or max(r["workers_rss_peak_mb"] + [r["harness_rss_peak_mb"]]),
+        }
+        for r in results
+    ])
+
+    if not args.no_save:
+        payload = {
+            "meta": run_metadata({"benchmark": "pages", "data": meta, **{
+                k: getattr(args, k) for k in ("mode", "duration", "fechas", "pages", "seed")
+            }}),
+            "levels": results,
+        }
+        path = save_results(payload, f"pages_{args.mode}")
+        print(f"Resultados: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""
+Benchmark de las consultas de página (SQL + post-proceso pandas) sobre datos
+sintéticos en un MySQL local.
+
+    python -m benchmarks.run_queries --scale base --load
+    python -m benchmarks.run_queries --repeat 5 --baseline benchmarks/results/queries_base_XXXX.json
+
+Cada caso mide por separado el tiempo de la consulta (execute_mysql_query, sin
+caché de Streamlit, con los tipos compactos que usan los loaders) y el del
+post-proceso equivalente al de la página.
+"""
+import argparse
+import sys
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple
+
+from benchmarks.common import (
+    add_connection_args,
+    compare_results,
+    configure_connection,
+    ensure_database,
+    load_results,
+    print_table,
+    run_metadata,
+    save_results,
+    summarize,
+    timed,
+)
+from benchmarks.synthetic import FECHA_FIN_DEFAULT, SCALES
+
+
+class QueryCase(NamedTuple):
+    name: str
+    sql: Callable[[date], str]
+    post: Callable[[Any], Any]
+
+
+# ======================================================
+# POST-PROCESO (equivalente al de cada página)
+# ======================================================
+def _post_posicionamiento(df):
+    """pages/Posicionamiento.py: tipos, filtro 0.5–2, rollup ponderado y árbol."""
+    import pandas as pd
+    from aggregationHelper import weighted_rollup
+    from pivotHelper import build_tree_rows, category_key
+
+    df = df.copy()
+    for c in ["precio_chiper", "precio_lleno_competidor", "precio_descuento_competidor",
+              "venta_neta", "posicionamiento", "peso_venta"]:
+        df[c] = pd.to_numeric(df[c], errors="coerce")
+    df = df[(df["posicionamiento"] >= 0.5) & (df["posicionamiento"] <= 2)]
+    rollup = weighted_rollup(
+        df,
+        ["macro", "categoria"],
+        value_col="posicionamiento",
+        weight_col="peso_venta",
+        value_name="posicionamiento_pond",
+        sums={"venta_neta": "venta_categoria", "peso_venta": "peso_venta_categoria"},
+    )
+    # Se expanden las 3 primeras categorías, como un usuario abriendo el árbol
+    cats = rollup["categoria"].head(3)
+    expandidas = [category_key(m, c) for m, c in zip(cats["macro"], cats["categoria"])]
+    return build_tree_rows(rollup, df, expandidas, sku_limit=200)
+
+
+def _post_posicionamiento_dia(df):
+    """pages/Posicionamiento_Hoy.py: igual que la ventana, con peso calculado en pandas."""
+    import pandas as pd
+
+    df = df.copy()
+    df["fecha"] = pd.to_datetime(df["fecha"], errors="coerce").dt.date
+    df["venta_neta"] = pd.to_numeric(df["venta_neta"], errors="coerce")
+    total = df["venta_neta"].sum()
+    df["peso_venta"] = df["venta_neta"] / total if total else 0.0
+    return _post_posicionamiento(df)
+
+
+def _post_top_20(df):
+    import pandas as pd
+
+    df = df.copy()
+    for c in df.columns:
+        if c.endswith(("_periodo", "_pond")):
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+    return df.sort_values("venta_total_periodo", ascending=False)
+
+
+def _post_top_n(df):
+    """pages/Hit_List.py: cada agrupación filtrada del mismo resultado."""
+    from dataLoaders import TOP_N_GRUPOS, top_n_por_grupo
+
+    return {col: top_n_por_grupo(df, col, 50) for col in TOP_N_GRUPOS.values()}
+
+
+def _post_ratios(df):
+    """pages/Data_Cleaner.py: preparación del loader + un cambio de umbrales."""
+    import pandas as pd
+    from dataLoaders import filter_outliers
+
+    df = df.copy()
+    for c in ["precio_lleno", "precio_descuento", "precio_bruto_chiper",
+              "precio_competidor_efectivo", "ratio_posicionamiento"]:
+        df[c] = pd.to_numeric(df[c], errors="coerce")
+    df = df[df["ratio_posicionamiento"].notna()]
+    # Un registro de competidor por fila: el lado Chiper debe entrar por SKU/día
+    if not df["id"].is_unique:
+        raise ValueError("ratios_competidor: registros de precio_competidor duplicados (fan-out)")
+    df = df.sort_values("ratio_posicionamiento", kind="stable").reset_index(drop=True)
+    return filter_outliers(df, 2.0, 0.5)
+
+
+# ======================================================
+# CASOS
+# ======================================================
+def build_cases() -> List[QueryCase]:
+    from dataLoaders import (
+        VENTANAS_SNAPSHOT,
+        sql_posicionamiento_dia,
+        sql_posicionamiento_multiventana,
+        sql_posicionamiento_ventana,
+        sql_ratios_competidor,
+        sql_top_20_ventas,
+        sql_top_n_ventas,
+    )
+
+    def d(x: date) -> str:
+        return x.strftime("%Y-%m-%d")
+
+    cases = [
+        QueryCase(
+            f"posicionamiento_ventana_{v}",
+            (lambda v: lambda fin: sql_posicionamiento_ventana(1, d(fin), v))(v),
+            _post_posicionamiento,
+        )
+        for v in VENTANAS_SNAPSHOT
+    ]
+    cases += [
+        QueryCase(
+            "posicionamiento_multiventana",
+            lambda fin: sql_posicionamiento_multiventana(1, d(fin)),
+            lambda df: df,
+        ),
+        QueryCase("posicionamiento_dia", lambda fin: sql_posicionamiento_dia(1, d(fin)), _post_posicionamiento_dia),
+        QueryCase(
+            "top_20_ventas_30",
+            lambda fin: sql_top_20_ventas(d(fin - timedelta(days=30)), d(fin)),
+            _post_top_20,
+        ),
+        QueryCase(
+            "top_n_ventas_30",
+            lambda fin: sql_top_n_ventas(d(fin - timedelta(days=30)), d(fin), 100),
+            _post_top_n,
+        ),
+        QueryCase(
+            "top_n_ventas_comparado_30",
+            lambda fin: sql_top_n_ventas(
+                d(fin - timedelta(days=30)), d(fin), 100,
+                (d(fin - timedelta(days=61)), d(fin - timedelta(days=31))),
+            ),
+            _post_top_n,
+        ),
+        QueryCase(
+            "ratios_competidor_30",
+            lambda fin: sql_ratios_competidor(d(fin - timedelta(days=30)), d(fin), 0),
+            _post_ratios,
+        ),
+    ]
+    return cases
+
+
+def run_case(case: QueryCase, fecha_fin: date, *, repeat: int, warmup: int) -> Dict[str, Any]:
+    from cacheHelper import frame_bytes
+    from mySQLHelper import execute_mysql_query
+
+    sql = case.sql(fecha_fin)
+    sql_ms: List[float] = []
+    post_ms: List[float] = []
+    rows = nbytes = 0
+    for i in range(warmup + repeat):
+        df, t_sql = timed(lambda: execute_mysql_query(sql, loader=f"bench_{case.name}", compact=True))
+        if df is None:
+            return {"error": "consulta fallida"}
+        _, t_post = timed(lambda: case.post(df))
+        if i >= warmup:
+            sql_ms.append(t_sql)
+            post_ms.append(t_post)
+        rows, nbytes = len(df), frame_bytes(df)
+
+    total = [a + b for a, b in zip(sql_ms, post_ms)]
+    return {
+        "rows": rows,
+        "bytes": nbytes,
+        "sql": summarize(sql_ms),
+        "post": summarize(post_ms),
+        "total": summarize(total),
+    }
+
+
+# ======================================================
+# CLI
+# ======================================================
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de consultas de página sobre datos sintéticos")
+    add_connection_args(parser)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--load", action="store_true", help="(re)genera y carga los datos sintéticos")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--only", action="append", default=None, help="nombre de caso (repetible)")
+    parser.add_argument("--baseline", default=None, help="JSON de resultados previo para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="empeoramiento tolerado (0.2 = 20%%)")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    configure_connection(args)
+    if args.load:
+        ensure_database(args)
+
+    from benchmarks.synthetic import load_synthetic, read_meta
+
+    if args.load:
+        load_synthetic(args.scale, seed=args.seed)
+    meta = read_meta()
+    if meta is None:
+        print("La base no tiene datos sintéticos; ejecute con --load.")
+        return 2
+    fecha_fin = date.fromisoformat(meta.get("fecha_fin", FECHA_FIN_DEFAULT.isoformat()))
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for case in build_cases():
+        if args.only and case.name not in args.only:
+            continue
+        print(f"→ {case.name}")
+        results[case.name] = run_case(case, fecha_fin, repeat=args.repeat, warmup=args.warmup)
+
+    print_table([
+        {
+            "case": name,
+            "rows": r.get("rows"),
+            "sql_ms": r.get("sql", {}).get("median_ms"),
+            "post_ms": r.get("post", {}).get("median_ms"),
+            "total_ms": r.get("total", {}).get("median_ms"),
+        }
+        for name, r in results.items()
+    ])
+
+    payload = {
+        "meta": run_metadata({"benchmark": "queries", "data": meta, "repeat": args.repeat}),
+        "cases": results,
+    }
+    if not args.no_save:
+        path = save_results(payload, f"queries_{meta.get('scale', args.scale)}")
+        print(f"Resultados: {path}")
+
+    if args.baseline:
+        baseline = load_results(args.baseline)
+        if baseline.get("meta", {}).get("data", {}).get("scale") != meta.get("scale"):
+            print("[AVISO] El baseline es de otra escala; la comparación no es significativa.")
+        rows, regression = compare_results(
+            results,
+            baseline.get("cases", {}),
+            metric=lambda c: c.get("total", {}).get("median_ms"),
+            tolerance=args.tolerance,
+        )
+        print_table(rows)
+        if regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
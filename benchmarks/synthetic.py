@@ -0,0 +1,331 @@
+"""
+Generador determinista de datos sintéticos con el esquema que leen las páginas:
+sku / categoria / macro_categoria / proveedor / competidor / ventas_chiper /
+precio_competidor.
+
+Cada día de hechos usa su propia semilla (seed, tabla, día), así que el
+resultado no depende del tamaño de chunk con que se cargue.
+"""
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# ======================================================
+# ESCALAS
+# ======================================================
+@dataclass(frozen=True)
+class SyntheticScale:
+    n_skus: int
+    n_dias: int
+    n_competidores: int
+    n_macros: int = 12
+    n_categorias: int = 120
+    n_proveedores: int = 300
+    # probabilidad media de que un SKU venda en un día / de que un competidor lo publique
+    p_venta: float = 0.35
+    p_precio_competidor: float = 0.6
+    # fracción de precios de competidor con error de captura (x10 / x0.1)
+    p_outlier: float = 0.002
+
+
+SCALES: Dict[str, SyntheticScale] = {
+    "tiny": SyntheticScale(n_skus=500, n_dias=30, n_competidores=3),
+    "small": SyntheticScale(n_skus=2_000, n_dias=90, n_competidores=3),
+    "base": SyntheticScale(n_skus=10_000, n_dias=365, n_competidores=3),
+    "large": SyntheticScale(n_skus=30_000, n_dias=365, n_competidores=5),
+}
+
+# Fecha fija para que las corridas sean comparables entre sí
+FECHA_FIN_DEFAULT = date(2025, 6, 30)
+
+META_TABLE = "bench_meta"
+
+_TABLA_VENTAS = 1
+_TABLA_PRECIOS = 2
+
+# ======================================================
+# DDL
+# ======================================================
+DDL = [
+    """
+    CREATE TABLE macro_categoria (
+        id      INT          NOT NULL PRIMARY KEY,
+        nombre  VARCHAR(255) NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE categoria (
+        id        INT          NOT NULL PRIMARY KEY,
+        nombre    VARCHAR(255) NOT NULL,
+        id_macro  INT          NOT NULL,
+        KEY idx_categoria_macro (id_macro)
+    );
+    """,
+    """
+    CREATE TABLE proveedor (
+        id      INT          NOT NULL PRIMARY KEY,
+        nombre  VARCHAR(255) NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE competidor (
+        id      INT          NOT NULL PRIMARY KEY,
+        nombre  VARCHAR(255) NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE sku (
+        id            INT          NOT NULL PRIMARY KEY,
+        sku           VARCHAR(64)  NOT NULL,
+        nombre        VARCHAR(255) NOT NULL,
+        id_categoria  INT          NOT NULL,
+        id_proveedor  INT          NOT NULL,
+        KEY idx_sku_categoria (id_categoria),
+        KEY idx_sku_proveedor (id_proveedor)
+    );
+    """,
+    """
+    CREATE TABLE ventas_chiper (
+        id            BIGINT        NOT NULL PRIMARY KEY,
+        id_sku        INT           NOT NULL,
+        fecha         DATETIME      NOT NULL,
+        precio_bruto  DECIMAL(14,4) NULL,
+        venta_neta    DECIMAL(18,4) NULL,
+        cantidad      INT           NULL,
+        front         DECIMAL(8,4)  NULL,
+        back          DECIMAL(8,4)  NULL,
+        KEY idx_vc_fecha_sku (fecha, id_sku),
+        KEY idx_vc_sku_fecha (id_sku, fecha)
+    );
+    """,
+    """
+    CREATE TABLE precio_competidor (
+        id                BIGINT        NOT NULL PRIMARY KEY,
+        id_sku            INT           NOT NULL,
+        id_competidor     INT           NOT NULL,
+        fecha             DATETIME      NOT NULL,
+        precio_lleno      DECIMAL(14,4) NULL,
+        precio_descuento  DECIMAL(14,4) NULL,
+        KEY idx_pc_comp_fecha (id_competidor, fecha),
+        KEY idx_pc_sku_fecha (id_sku, fecha)
+    );
+    """,
+    f"""
+    CREATE TABLE {META_TABLE} (
+        clave  VARCHAR(64)  NOT NULL PRIMARY KEY,
+        valor  VARCHAR(255) NOT NULL
+    );
+    """,
+]
+
+TABLES = [
+    "macro_categoria",
+    "categoria",
+    "proveedor",
+    "competidor",
+    "sku",
+    "ventas_chiper",
+    "precio_competidor",
+    META_TABLE,
+]
+
+
+# ======================================================
+# DIMENSIONES
+# ======================================================
+def generate_dimensions(scale: SyntheticScale, seed: int) -> Dict[str, pd.DataFrame]:
+    """Tablas de dimensión + atributos por SKU que usan los hechos (precio base, propensión)."""
+    rng = np.random.default_rng([seed, 0])
+
+    macros = pd.DataFrame({
+        "id": np.arange(1, scale.n_macros + 1),
+        "nombre": [f"Macro {i:02d}" for i in range(1, scale.n_macros + 1)],
+    })
+    categorias = pd.DataFrame({
+        "id": np.arange(1, scale.n_categorias + 1),
+        "nombre": [f"Categoria {i:03d}" for i in range(1, scale.n_categorias + 1)],
+        "id_macro": rng.integers(1, scale.n_macros + 1, scale.n_categorias),
+    })
+    proveedores = pd.DataFrame({
+        "id": np.arange(1, scale.n_proveedores + 1),
+        "nombre": [f"Proveedor {i:03d}" for i in range(1, scale.n_proveedores + 1)],
+    })
+    competidores = pd.DataFrame({
+        "id": np.arange(1, scale.n_competidores + 1),
+        "nombre": [f"Competidor {i}" for i in range(1, scale.n_competidores + 1)],
+    })
+
+    ids = np.arange(1, scale.n_skus + 1)
+    # Categorías con tamaños desiguales (Zipf suave), como en el catálogo real
+    pesos_cat = 1.0 / np.arange(1, scale.n_categorias + 1) ** 0.8
+    skus = pd.DataFrame({
+        "id": ids,
+        "sku": [f"SKU{i:07d}" for i in ids],
+        "nombre": [f"Producto {i}" for i in ids],
+        "id_categoria": rng.choice(
+            np.arange(1, scale.n_categorias + 1), scale.n_skus, p=pesos_cat / pesos_cat.sum()
+        ),
+        "id_proveedor": rng.integers(1, scale.n_proveedores + 1, scale.n_skus),
+    })
+
+    atributos = {
+        "precio_base": np.round(rng.lognormal(mean=8.5, sigma=0.9, size=scale.n_skus), 0),
+        "p_venta": np.clip(rng.beta(2.0, 2.0 / scale.p_venta - 2.0, scale.n_skus), 0.01, 0.99),
+        "tx_media": rng.gamma(1.5, 1.5, scale.n_skus),
+        "margen_front": rng.uniform(0.03, 0.15, scale.n_skus),
+        "margen_back": rng.uniform(0.0, 0.05, scale.n_skus),
+        # nivel de precio de cada competidor respecto a Chiper
+        "nivel_competidor": rng.normal(1.0, 0.05, (scale.n_competidores, scale.n_skus)),
+    }
+
+    return {
+        "macro_categoria": macros,
+        "categoria": categorias,
+        "proveedor": proveedores,
+        "competidor": competidores,
+        "sku": skus,
+        "_atributos": atributos,
+    }
+
+
+# ======================================================
+# HECHOS (un día por semilla)
+# ======================================================
+def _dias(scale: SyntheticScale, fecha_fin: date) -> List[date]:
+    inicio = fecha_fin - timedelta(days=scale.n_dias - 1)
+    return [inicio + timedelta(days=i) for i in range(scale.n_dias)]
+
+
+def _horas_del_dia(rng: np.random.Generator, dia: date, n: int) -> pd.DatetimeIndex:
+    """
+    Timestamps con hora del día, como en producción (fecha es DATETIME): las
+    consultas deben agrupar por DATE(fecha) y no por el valor crudo. Se
+    sortea al final para no alterar el resto de la secuencia del día.
+    """
+    segundos = rng.integers(0, 86_400, n)
+    return pd.Timestamp(dia) + pd.to_timedelta(segundos, unit="s")
+
+
+def _ventas_dia(scale: SyntheticScale, atr: Dict[str, np.ndarray], seed: int, idx_dia: int, dia: date) -> pd.DataFrame:
+    rng = np.random.default_rng([seed, _TABLA_VENTAS, idx_dia])
+    vende = rng.random(scale.n_skus) < atr["p_venta"]
+    pos = np.flatnonzero(vende)
+    n_tx = rng.poisson(atr["tx_media"][pos]) + 1
+    pos = np.repeat(pos, n_tx)
+
+    n = pos.size
+    precio = np.round(atr["precio_base"][pos] * rng.normal(1.0, 0.03, n), 0)
+    cantidad = rng.geometric(0.3, n)
+    return pd.DataFrame({
+        "id_sku": pos + 1,
+        "fecha": _horas_del_dia(rng, dia, n),
+        "precio_bruto": precio,
+        "venta_neta": np.round(precio * cantidad / 1.19, 2),
+        "cantidad": cantidad,
+        "front": np.round(atr["margen_front"][pos], 4),
+        "back": np.round(atr["margen_back"][pos], 4),
+    })
+
+
+def _precios_dia(scale: SyntheticScale, atr: Dict[str, np.ndarray], seed: int, idx_dia: int, dia: date) -> pd.DataFrame:
+    rng = np.random.default_rng([seed, _TABLA_PRECIOS, idx_dia])
+    publica = rng.random((scale.n_competidores, scale.n_skus)) < scale.p_precio_competidor
+    comp_idx, sku_idx = np.nonzero(publica)
+
+    n = sku_idx.size
+    lleno = atr["precio_base"][sku_idx] * atr["nivel_competidor"][comp_idx, sku_idx] * rng.normal(1.0, 0.04, n)
+    errores = rng.random(n) < scale.p_outlier
+    lleno[errores] *= np.where(rng.random(errores.sum()) < 0.5, 10.0, 0.1)
+    lleno = np.round(lleno, 0)
+
+    descuento = np.where(rng.random(n) < 0.2, np.round(lleno * rng.uniform(0.8, 0.95, n), 0), np.nan)
+    return pd.DataFrame({
+        "id_sku": sku_idx + 1,
+        "id_competidor": comp_idx + 1,
+        "fecha": _horas_del_dia(rng, dia, n),
+        "precio_lleno": lleno,
+        "precio_descuento": descuento,
+    })
+
+
+def iter_hechos(
+    tabla: str,
+    scale: SyntheticScale,
+    dims: Dict[str, pd.DataFrame],
+    *,
+    seed: int,
+    fecha_fin: date = FECHA_FIN_DEFAULT,
+    dias_por_chunk: int = 7,
+) -> Iterator[pd.DataFrame]:
+    """Genera `ventas_chiper` o `precio_competidor` en chunks de días, con ids consecutivos."""
+    gen = {"ventas_chiper": _ventas_dia, "precio_competidor": _precios_dia}[tabla]
+    atr = dims["_atributos"]
+    dias = _dias(scale, fecha_fin)
+    next_id = 1
+    for i in range(0, len(dias), dias_por_chunk):
+        chunk = pd.concat(
+            [gen(scale, atr, seed, i + j, d) for j, d in enumerate(dias[i:i + dias_por_chunk])],
+            ignore_index=True,
+        )
+        chunk.insert(0, "id", np.arange(next_id, next_id + len(chunk), dtype="int64"))
+        next_id += len(chunk)
+        yield chunk
+
+
+# ======================================================
+# CARGA A MySQL
+# ======================================================
+def load_synthetic(
+    scale_name: str,
+    *,
+    seed: int = 42,
+    fecha_fin: date = FECHA_FIN_DEFAULT,
+    batch_size: int = 5000,
+) -> Dict[str, int]:
+    """
+    Recrea el esquema en la base configurada (CHIPER_*) y lo llena con
+    MySQLBulkLoader. Retorna filas cargadas por tabla.
+    """
+    from mySQLHelper import DATABASE, execute_mysql_query, my_default_bulk_loader
+
+    scale = SCALES[scale_name]
+    for t in TABLES:
+        execute_mysql_query(f"DROP TABLE IF EXISTS {t};", fetch=False)
+    for ddl in DDL:
+        execute_mysql_query(ddl, fetch=False)
+
+    loader = my_default_bulk_loader()
+    dims = generate_dimensions(scale, seed)
+    filas: Dict[str, int] = {}
+
+    for t in ["macro_categoria", "categoria", "proveedor", "competidor", "sku"]:
+        loader.bulk_insert_df(table_name=t, df=dims[t], batch_size=batch_size, use_unsafe_optimizations=True)
+        filas[t] = len(dims[t])
+
+    for t in ["ventas_chiper", "precio_competidor"]:
+        filas[t] = 0
+        for chunk in iter_hechos(t, scale, dims, seed=seed, fecha_fin=fecha_fin):
+            loader.bulk_insert_df(table_name=t, df=chunk, batch_size=batch_size, use_unsafe_optimizations=True)
+            filas[t] += len(chunk)
+
+    meta = {"scale": scale_name, "seed": seed, "fecha_fin": fecha_fin.isoformat(), **asdict(scale)}
+    loader.bulk_insert_df(
+        table_name=META_TABLE,
+        df=pd.DataFrame({"clave": list(meta), "valor": [str(v) for v in meta.values()]}),
+    )
+    execute_mysql_query(f"ANALYZE TABLE {', '.join(TABLES)};")
+    print(f"Datos sintéticos '{scale_name}' cargados en {DATABASE}: {filas}")
+    return filas
+
+
+def read_meta() -> Optional[Dict[str, str]]:
+    """Metadatos de la última carga sintética (None si la base no tiene datos de benchmark)."""
+    from mySQLHelper import execute_mysql_query
+
+    df = execute_mysql_query(f"SELECT clave, valor FROM {META_TABLE};")
+    if df is None or df.empty:
+        return None
+    return dict(zip(df["clave"], df["valor"]))
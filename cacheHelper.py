@@ -0,0 +1,340 @@
+"""
+Loaders cacheados con estadísticas, para diagnóstico desde la página de
+Configuración:
+- llamadas / cache miss (tasa de aciertos) por loader;
+- memoria retenida por cada entrada cacheada (y por loader);
+- presupuesto de memoria por worker (CACHE_MAX_MB): al excederse se
+  descartan las entradas usadas hace más tiempo, de cualquier loader,
+  hasta volver bajo el límite (se desaloja por bytes, no por cantidad);
+- purga y "calentamiento" (precarga con parámetros por defecto);
+- invalidación entre procesos: publish_invalidation() incrementa una
+  generación en MySQL (tabla cache_generacion) y cada proceso la revisa
+  a lo sumo cada CACHE_SYNC_S segundos al llamar un loader; si cambió,
+  limpia sus loaders y corre los hooks registrados (p.ej. el cubo).
+
+Cada loader queda: conteo -> st.cache_data -> single-flight -> función.
+"""
+import functools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+import streamlit as st
+
+from mySQLHelper import HOST, QueryCancelledError, _setting, execute_mysql_query, execute_mysql_transaction
+from singleFlight import canonical_key, single_flight
+
+# 0 = sin límite
+CACHE_MAX_BYTES = int(float(_setting("CACHE_MAX_MB", 0)) * 1024 * 1024)
+# Cada cuánto un proceso revisa si otro publicó una invalidación
+CACHE_SYNC_S = float(_setting("CACHE_SYNC_S", 15))
+
+GENERACION_TABLE = "cache_generacion"
+
+
+def _reintentar_si_reemplazada(error: BaseException) -> bool:
+    """
+    Si la consulta compartida fue cancelada por un rerun de la sesión líder,
+    las demás sesiones que esperaban no heredan el error: reintentan.
+    """
+    return isinstance(error, QueryCancelledError) and error.reason == "superseded"
+
+
+def frame_bytes(value: Any) -> int:
+    """Bytes que ocupa un resultado (DataFrame con deep=True; 0 para otros)."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    return 0
+
+
+class _Entry:
+    __slots__ = ("loader", "args", "kwargs", "bytes", "hits", "created", "last_used")
+
+    def __init__(self, loader: "CachedLoader", args: tuple, kwargs: dict, nbytes: int):
+        self.loader = loader
+        self.args = args
+        self.kwargs = kwargs
+        self.bytes = nbytes
+        self.hits = 0
+        self.created = self.last_used = time.time()
+
+
+# clave canónica -> entrada, de la menos a la más recientemente usada (todos los loaders)
+_entries: "OrderedDict[str, _Entry]" = OrderedDict()
+_entries_lock = threading.Lock()
+_evictions = {"entries": 0, "bytes": 0}
+
+
+def _enforce_budget(keep: Optional[str] = None) -> None:
+    """Desaloja entradas LRU hasta quedar bajo CACHE_MAX_BYTES (nunca `keep`)."""
+    if not CACHE_MAX_BYTES:
+        return
+    victims: List[Tuple[str, _Entry]] = []
+    with _entries_lock:
+        total = sum(e.bytes for e in _entries.values())
+        for key in list(_entries):
+            if total <= CACHE_MAX_BYTES:
+                break
+            if key == keep:
+                continue
+            entry = _entries.pop(key)
+            total -= entry.bytes
+            victims.append((key, entry))
+            _evictions["entries"] += 1
+            _evictions["bytes"] += entry.bytes
+    for key, entry in victims:
+        entry.loader._evict(key, entry)
+
+
+class CachedLoader:
+    """Envoltorio de un loader con st.cache_data + single-flight + estadísticas."""
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable,
+        *,
+        warm_kwargs: Optional[Callable[[], Dict[str, Any]]] = None,
+        **cache_kwargs,
+    ):
+        self.name = name
+        self.warm_kwargs = warm_kwargs
+        self._fn = fn
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._misses = 0
+        self._keys: set = set()
+
+        shared = single_flight(name, retry_followers_on=_reintentar_si_reemplazada)(fn)
+
+        @functools.wraps(fn)
+        def _on_miss(*args, **kwargs):
+            with self._lock:
+                self._misses += 1
+            result = shared(*args, **kwargs)
+            key = canonical_key(name, fn, args, kwargs)
+            with _entries_lock:
+                _entries[key] = _Entry(self, args, kwargs, frame_bytes(result))
+                _entries.move_to_end(key)
+            with self._lock:
+                self._keys.add(key)
+            return result
+
+        self._cached = st.cache_data(**cache_kwargs)(_on_miss)
+        functools.update_wrapper(self, fn)
+
+    def __call__(self, *args, **kwargs):
+        sync_invalidations()
+        with self._lock:
+            self._calls += 1
+        key = canonical_key(self.name, self._fn, args, kwargs)
+        with _entries_lock:
+            entry = _entries.get(key)
+            if entry is not None:
+                entry.hits += 1
+                entry.last_used = time.time()
+                _entries.move_to_end(key)
+        result = self._cached(*args, **kwargs)
+        _enforce_budget(keep=key)
+        return result
+
+    def _evict(self, key: str, entry: _Entry) -> None:
+        with self._lock:
+            self._keys.discard(key)
+        try:
+            # Streamlit >= 1.34 permite borrar una sola entrada
+            self._cached.clear(*entry.args, **entry.kwargs)
+        except TypeError:
+            self.clear()
+
+    def clear(self) -> None:
+        self._cached.clear()
+        with self._lock:
+            keys, self._keys = self._keys, set()
+        with _entries_lock:
+            for key in keys:
+                _entries.pop(key, None)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Memoria y uso de cada entrada retenida por este loader."""
+        now = time.time()
+        with _entries_lock:
+            return [
+                {
+                    "loader": self.name,
+                    "params": ", ".join(
+                        [repr(a) for a in e.args] + [f"{k}={v!r}" for k, v in e.kwargs.items()]
+                    ),
+                    "bytes": e.bytes,
+                    "hits": e.hits,
+                    "edad_s": now - e.created,
+                    "sin_uso_s": now - e.last_used,
+                }
+                for e in _entries.values()
+                if e.loader is self
+            ]
+
+    def warm(self) -> bool:
+        """Precarga la entrada de parámetros por defecto. False si no hay defaults."""
+        if self.warm_kwargs is None:
+            return False
+        self(**self.warm_kwargs())
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls, misses = self._calls, self._misses
+        with _entries_lock:
+            sizes = [e.bytes for e in _entries.values() if e.loader is self]
+        entries, total_bytes = len(sizes), sum(sizes)
+        return {
+            "loader": self.name,
+            "calls": calls,
+            "misses": misses,
+            "hit_rate": (calls - misses) / calls if calls else None,
+            "entries": entries,
+            "bytes": total_bytes,
+        }
+
+
+# nombre -> CachedLoader (se llena al importar dataLoaders)
+LOADERS: Dict[str, CachedLoader] = {}
+
+
+def cached_loader(
+    name: str,
+    *,
+    warm_kwargs: Optional[Callable[[], Dict[str, Any]]] = None,
+    show_spinner: bool = True,
+    **cache_kwargs,
+) -> Callable[[Callable], CachedLoader]:
+    """
+    Decorador para loaders de página:
+
+        @cached_loader("posicionamiento_dia", warm_kwargs=lambda: {...})
+        def load_posicionamiento_dia(...): ...
+    """
+    def decorator(fn: Callable) -> CachedLoader:
+        loader = CachedLoader(
+            name,
+            fn,
+            warm_kwargs=warm_kwargs,
+            show_spinner=show_spinner,
+            **cache_kwargs,
+        )
+        LOADERS[name] = loader
+        return loader
+
+    return decorator
+
+
+def get_cache_stats() -> List[Dict[str, Any]]:
+    return [loader.stats() for loader in LOADERS.values()]
+
+
+def get_cache_entries() -> List[Dict[str, Any]]:
+    """Todas las entradas retenidas, de la más pesada a la más liviana."""
+    rows = [row for loader in LOADERS.values() for row in loader.entries()]
+    return sorted(rows, key=lambda r: r["bytes"], reverse=True)
+
+
+def get_cache_budget() -> Dict[str, Any]:
+    with _entries_lock:
+        used = sum(e.bytes for e in _entries.values())
+        evictions = dict(_evictions)
+    return {
+        "max_bytes": CACHE_MAX_BYTES or None,
+        "used_bytes": used,
+        "evicted_entries": evictions["entries"],
+        "evicted_bytes": evictions["bytes"],
+    }
+
+
+# ======================================================
+# INVALIDACIÓN ENTRE PROCESOS
+# ======================================================
+DDL_GENERACION = f"""
+CREATE TABLE IF NOT EXISTS {GENERACION_TABLE} (
+    nombre           VARCHAR(64)  NOT NULL PRIMARY KEY,
+    generacion       BIGINT       NOT NULL,
+    actualizado_en   DATETIME     NOT NULL
+);
+"""
+
+_invalidation_hooks: List[Callable[[], None]] = []
+_sync_lock = threading.Lock()
+_sync = {"vistas": None, "chequeo": 0.0, "tabla_ok": False}
+
+
+def on_invalidation(hook: Callable[[], None]) -> None:
+    """Registra algo más que limpiar al invalidar (además de los loaders)."""
+    _invalidation_hooks.append(hook)
+
+
+def _invalidate_local() -> None:
+    for loader in LOADERS.values():
+        loader.clear()
+    for hook in _invalidation_hooks:
+        try:
+            hook()
+        except Exception as e:
+            print(f"[CACHE] hook de invalidación: {e}")
+
+
+def _read_generations() -> Optional[Dict[str, int]]:
+    """Generaciones publicadas (del primario: deben verse apenas se publican)."""
+    if not _sync["tabla_ok"]:
+        execute_mysql_query(DDL_GENERACION, fetch=False)
+        _sync["tabla_ok"] = True
+    df = execute_mysql_query(f"SELECT nombre, generacion FROM {GENERACION_TABLE};", host=HOST)
+    if df is None:
+        return None
+    return {str(n): int(g) for n, g in zip(df["nombre"], df["generacion"])}
+
+
+def sync_invalidations(force: bool = False) -> bool:
+    """
+    Si otro proceso publicó una invalidación desde el último chequeo, limpia
+    este. Consulta MySQL a lo sumo cada CACHE_SYNC_S segundos; el primer
+    chequeo del proceso solo toma la línea base. True si invalidó.
+    """
+    now = time.time()
+    with _sync_lock:
+        if not force and now - _sync["chequeo"] < CACHE_SYNC_S:
+            return False
+        _sync["chequeo"] = now
+        generaciones = _read_generations()
+        if generaciones is None:
+            return False
+        vistas, _sync["vistas"] = _sync["vistas"], generaciones
+    if vistas is None or generaciones == vistas:
+        return False
+    _invalidate_local()
+    return True
+
+
+def publish_invalidation(nombre: str) -> bool:
+    """
+    Invalida los loaders (y hooks) de este proceso y publica la invalidación
+    `nombre` (p.ej. "precio_competidor") para los demás, que la aplican en
+    su próximo chequeo (hasta CACHE_SYNC_S segundos). False si no se pudo
+    publicar: los otros procesos siguen con sus cachés hasta que expiren.
+    """
+    res = execute_mysql_transaction(
+        [(
+            f"INSERT INTO {GENERACION_TABLE} (nombre, generacion, actualizado_en) VALUES (%s, 1, NOW()) "
+            f"ON DUPLICATE KEY UPDATE generacion = generacion + 1, actualizado_en = NOW();",
+            (nombre,),
+        )],
+        loader="cache_invalidacion",
+    )
+    # Línea base con la generación propia (no vuelve a limpiar este proceso);
+    # lo publicado por otros antes de leerla queda cubierto por la limpieza de abajo
+    with _sync_lock:
+        generaciones = _read_generations()
+        if generaciones is not None:
+            _sync["vistas"], _sync["chequeo"] = generaciones, time.time()
+    _invalidate_local()
+    return res is not None
@@ -0,0 +1,1446 @@
+from datetime import date, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from mySQLHelper import QuerySpec, execute_mysql_query, run_queries_concurrently
+from cacheHelper import cached_loader
+from outlierScoring import SCORE_TABLE
+
+# ======================================================
+# VENTANAS PREDEFINIDAS (con snapshot nocturno)
+# ======================================================
+VENTANA_PRESETS = {
+    "Últimos 5 días": 5,
+    "Última semana (7 días)": 7,
+    "Últimas 2 semanas (14 días)": 14,
+    "Últimas 3 semanas (21 días)": 21,
+    "Último mes (30 días)": 30,
+    "Últimos 3 meses (90 días)": 90,
+    "Personalizado": None,
+}
+
+VENTANAS_SNAPSHOT = sorted(v for v in VENTANA_PRESETS.values() if v is not None)
+
+# Presupuesto de tiempo por consulta de página (MAX_EXECUTION_TIME, ms)
+MAX_EXECUTION_MS_PAGINA = 120_000
+
+SNAPSHOT_TABLE = "snapshot_posicionamiento"
+SNAPSHOT_RUN_TABLE = "snapshot_posicionamiento_run"
+
+# Precio Chiper reducido a una fila por SKU/día (job batchJobs.py chiper-dia)
+CHIPER_DIA_TABLE = "chiper_sku_dia"
+CHIPER_DIA_RUN_TABLE = "chiper_sku_dia_run"
+
+# Sketches por día (job batchJobs.py sketches, ver sketchHelper)
+SKETCH_DIA_TABLE = "sketch_dia"
+SKETCH_DIA_RUN_TABLE = "sketch_dia_run"
+SKETCH_HLL_CHIPER = "hll_chiper"        # SKUs vendidos por Chiper (id_competidor = 0)
+SKETCH_HLL_POSICIONAMIENTO = "hll_pos"  # SKUs con posicionamiento frente al competidor
+SKETCH_TDIGEST_POSICIONAMIENTO = "tdigest_pos"  # posicionamiento SKU/día
+SKETCH_CUANTILES = (0.10, 0.50, 0.90)
+
+# Rankings de Hit_List: agrupación -> columna de posición en sql_top_n_ventas
+TOP_N_GRUPOS = {
+    "Global": "rank_global",
+    "Macro categoría": "rank_macro_categoria",
+    "Categoría": "rank_categoria",
+    "Proveedor": "rank_proveedor",
+}
+# Columna de posición -> expresión de partición (None = sin partición)
+_RANK_PARTICIONES = {
+    "rank_global": None,
+    "rank_macro_categoria": "mc.id",
+    "rank_categoria": "c.id",
+    "rank_proveedor": "pvd.id",
+}
+# Columna de posición -> columna de etiqueta del grupo
+TOP_N_COLUMNA_GRUPO = {
+    "rank_macro_categoria": "macro_categoria",
+    "rank_categoria": "categoria",
+    "rank_proveedor": "proveedor",
+}
+TOP_N_MAX = 500
+# Modos de comparación de Hit_List
+COMPARAR_PERIODO_ANTERIOR = "Periodo anterior"
+COMPARAR_ANIO_ANTERIOR = "Mismo periodo del año anterior"
+# N que se consulta (y cachea): el primer escalón >= N pedido
+TOP_N_ESCALONES = (20, 50, 100, 200, TOP_N_MAX)
+
+SNAPSHOT_COLUMNS = [
+    "id_sku",
+    "sku",
+    "macro",
+    "categoria",
+    "proveedor",
+    "nombre",
+    "precio_chiper",
+    "precio_lleno_competidor",
+    "precio_descuento_competidor",
+    "venta_neta",
+    "posicionamiento",
+    "peso_venta",
+    "total_skus_chiper",
+]
+
+
+# ======================================================
+# SQL: POSICIONAMIENTO POR VENTANA (NIVEL SKU)
+# ======================================================
+def sql_posicionamiento_ventana(
+    id_competidor: int,
+    fecha_str: str,
+    ventana: int,
+    con_total: bool = True,
+) -> str:
+    """
+    Consulta de ventana (competidor + Chiper) a nivel de SKU.
+    La usan la página Posicionamiento (ventanas personalizadas) y el job
+    nocturno de snapshots (ventanas predefinidas).
+
+    Con con_total=False no calcula total_skus_chiper (queda NULL), para
+    pedirlo en paralelo con sql_total_skus_chiper.
+    """
+    if con_total:
+        cte_total = """
+    -- 5) Total de SKUs de Chiper en la ventana (para KPI de representatividad)
+    chiper_skus AS (
+      SELECT COUNT(DISTINCT bc.id_sku) AS total_skus_chiper
+      FROM base_chiper bc
+    ),
+"""
+        col_total = "cs.total_skus_chiper"
+        join_total = "CROSS JOIN chiper_skus cs"
+    else:
+        cte_total = ""
+        col_total = "CAST(NULL AS SIGNED) AS total_skus_chiper"
+        join_total = ""
+
+    query = f"""
+    WITH
+    params AS (
+      SELECT
+        {id_competidor}             AS id_competidor,
+        CAST('{fecha_str}' AS DATE) AS fecha_actual,
+        {ventana}                   AS dias_ventana
+    ),
+
+    -- 1) Base de precios de competidor
+    base_competidor AS (
+      SELECT
+          pc.id_sku,
+          pc.id_competidor,
+          DATE(pc.fecha)     AS fecha,
+          pc.precio_lleno,
+          pc.precio_descuento,
+          CASE
+            WHEN pc.precio_lleno IS NULL
+                 AND pc.precio_descuento IS NULL THEN NULL
+            WHEN pc.precio_lleno IS NULL THEN pc.precio_descuento
+            WHEN pc.precio_descuento IS NULL THEN pc.precio_lleno
+            ELSE LEAST(pc.precio_lleno, pc.precio_descuento)
+          END AS precio_competidor_min_dia
+      FROM precio_competidor pc
+      JOIN params p
+      WHERE
+          (p.id_competidor IS NULL OR pc.id_competidor = p.id_competidor)
+          AND DATE(pc.fecha) >= DATE_SUB(p.fecha_actual, INTERVAL p.dias_ventana DAY)
+          AND DATE(pc.fecha) <= p.fecha_actual
+          AND (pc.precio_lleno IS NOT NULL OR pc.precio_descuento IS NOT NULL)
+    ),
+
+    -- 2) Agregado de precios competidor por ventana
+    agg_competidor AS (
+      SELECT
+          p.fecha_actual             AS fecha_actual,
+          p.dias_ventana             AS dias_ventana,
+          bc.id_competidor,
+          bc.id_sku,
+          AVG(bc.precio_lleno)              AS precio_lleno_prom_ventana,
+          AVG(bc.precio_descuento)          AS precio_descuento_prom_ventana,
+          AVG(bc.precio_competidor_min_dia) AS precio_competidor_min_prom_ventana
+      FROM base_competidor bc
+      CROSS JOIN params p
+      GROUP BY
+          p.fecha_actual,
+          p.dias_ventana,
+          bc.id_competidor,
+          bc.id_sku
+    ),
+
+    -- 3) Base de ventas Chiper
+    base_chiper AS (
+      SELECT
+          vc.id_sku,
+          DATE(vc.fecha)   AS fecha,
+          vc.precio_bruto,
+          vc.venta_neta
+      FROM ventas_chiper vc
+      JOIN params p
+      WHERE
+          DATE(vc.fecha) >= DATE_SUB(p.fecha_actual, INTERVAL p.dias_ventana DAY)
+          AND DATE(vc.fecha) <= p.fecha_actual
+          AND vc.precio_bruto IS NOT NULL
+    ),
+
+    -- 4) Agregado de Chiper por ventana
+    agg_chiper AS (
+      SELECT
+          p.fecha_actual       AS fecha_actual,
+          p.dias_ventana       AS dias_ventana,
+          bc.id_sku,
+          SUM(bc.venta_neta)   AS sum_venta_neta,
+          AVG(bc.precio_bruto) AS precio_chiper_prom_ventana
+      FROM base_chiper bc
+      CROSS JOIN params p
+      GROUP BY
+          p.fecha_actual,
+          p.dias_ventana,
+          bc.id_sku
+    ),
+{cte_total}
+    -- 6) Join competidor + Chiper + info de SKU/categoría/macro/proveedor
+    joined AS (
+      SELECT
+          ac.fecha_actual,
+          ac.dias_ventana,
+          ac.id_competidor,
+          ac.id_sku,
+          s.sku,
+          mc.nombre AS macro,
+          c.nombre  AS categoria,
+          pr.nombre AS proveedor,
+          s.nombre  AS nombre,
+          ac.precio_lleno_prom_ventana,
+          ac.precio_descuento_prom_ventana,
+          ac.precio_competidor_min_prom_ventana,
+          ach.sum_venta_neta,
+          ach.precio_chiper_prom_ventana
+      FROM agg_competidor ac
+      JOIN sku s
+        ON s.id = ac.id_sku
+      LEFT JOIN categoria c
+        ON c.id = s.id_categoria
+      LEFT JOIN macro_categoria mc
+        ON mc.id = c.id_macro
+      LEFT JOIN proveedor pr
+        ON pr.id = s.id_proveedor
+      LEFT JOIN agg_chiper ach
+        ON ach.id_sku = ac.id_sku
+        AND ach.fecha_actual = ac.fecha_actual
+        AND ach.dias_ventana = ac.dias_ventana
+    ),
+
+    -- 7) Cálculos de posicionamiento y peso de venta
+    final AS (
+      SELECT
+          j.*,
+          {col_total},
+
+          j.precio_competidor_min_prom_ventana AS precio_competidor_min,
+
+          CASE
+            WHEN j.precio_chiper_prom_ventana IS NULL THEN NULL
+            WHEN j.precio_competidor_min_prom_ventana IS NULL THEN NULL
+            WHEN j.precio_competidor_min_prom_ventana = 0 THEN NULL
+            ELSE j.precio_chiper_prom_ventana / j.precio_competidor_min_prom_ventana
+          END AS posicionamiento,
+
+          CASE
+            WHEN SUM(j.sum_venta_neta) OVER () = 0 THEN NULL
+            ELSE j.sum_venta_neta / SUM(j.sum_venta_neta) OVER ()
+          END AS peso_venta
+
+      FROM joined j
+      {join_total}
+    )
+
+    SELECT
+        id_sku,
+        sku,
+        macro,
+        categoria,
+        proveedor,
+        nombre,
+        precio_chiper_prom_ventana    AS precio_chiper,
+        precio_lleno_prom_ventana     AS precio_lleno_competidor,
+        precio_descuento_prom_ventana AS precio_descuento_competidor,
+        sum_venta_neta                AS venta_neta,
+        posicionamiento,
+        peso_venta,
+        total_skus_chiper
+    FROM final
+    ORDER BY
+        id_sku;
+    """
+    return query
+
+
+def sql_total_skus_chiper(fecha_str: str, ventana: int) -> str:
+    """SKUs distintos vendidos por Chiper en la ventana (KPI de representatividad)."""
+    return f"""
+    SELECT COUNT(DISTINCT vc.id_sku) AS total_skus_chiper
+    FROM ventas_chiper vc
+    WHERE
+        DATE(vc.fecha) >= DATE_SUB(CAST('{fecha_str}' AS DATE), INTERVAL {ventana} DAY)
+        AND DATE(vc.fecha) <= CAST('{fecha_str}' AS DATE)
+        AND vc.precio_bruto IS NOT NULL;
+    """
+
+
+def sql_posicionamiento_multiventana(
+    id_competidor: int,
+    fecha_str: str,
+    ventanas: Sequence[int] = tuple(VENTANAS_SNAPSHOT),
+) -> str:
+    """
+    Posicionamiento a nivel SKU para varias ventanas a la vez, en un solo
+    recorrido del rango de la ventana más larga: cada agregado es
+    condicional (CASE WHEN fecha >= corte_k). Una fila por SKU con
+    precio de competidor en la ventana más larga y, por ventana k, las
+    columnas precio_chiper_k, venta_neta_k, posicionamiento_k, peso_venta_k
+    y total_skus_chiper_k, con la misma semántica que
+    sql_posicionamiento_ventana(..., k).
+    """
+    ventanas = sorted({int(v) for v in ventanas})
+    fecha = f"CAST('{fecha_str}' AS DATE)"
+
+    def corte(k: int) -> str:
+        return f"DATE_SUB({fecha}, INTERVAL {k} DAY)"
+
+    def por_ventana(plantilla: str) -> str:
+        return ",\n".join(plantilla.format(k=k, corte=corte(k)) for k in ventanas)
+
+    query = f"""
+    WITH
+    -- 1) Precios de competidor del rango más largo
+    base_competidor AS (
+      SELECT
+          pc.id_sku,
+          DATE(pc.fecha)     AS fecha,
+          CASE
+            WHEN pc.precio_lleno IS NULL
+                 AND pc.precio_descuento IS NULL THEN NULL
+            WHEN pc.precio_lleno IS NULL THEN pc.precio_descuento
+            WHEN pc.precio_descuento IS NULL THEN pc.precio_lleno
+            ELSE LEAST(pc.precio_lleno, pc.precio_descuento)
+          END AS precio_competidor_min_dia
+      FROM precio_competidor pc
+      WHERE
+          pc.id_competidor = {int(id_competidor)}
+          AND pc.fecha >= {corte(ventanas[-1])}
+          AND pc.fecha <  DATE_ADD({fecha}, INTERVAL 1 DAY)
+          AND (pc.precio_lleno IS NOT NULL OR pc.precio_descuento IS NOT NULL)
+    ),
+
+    -- 2) Promedio por SKU y ventana (AVG ignora los NULL del CASE)
+    agg_competidor AS (
+      SELECT
+          bc.id_sku,
+{por_ventana("          AVG(CASE WHEN bc.fecha >= {corte} THEN bc.precio_competidor_min_dia END) AS comp_min_{k}")}
+      FROM base_competidor bc
+      GROUP BY bc.id_sku
+    ),
+
+    -- 3) Ventas Chiper del rango más largo
+    base_chiper AS (
+      SELECT
+          vc.id_sku,
+          DATE(vc.fecha)   AS fecha,
+          vc.precio_bruto,
+          vc.venta_neta
+      FROM ventas_chiper vc
+      WHERE
+          vc.fecha >= {corte(ventanas[-1])}
+          AND vc.fecha <  DATE_ADD({fecha}, INTERVAL 1 DAY)
+          AND vc.precio_bruto IS NOT NULL
+    ),
+
+    agg_chiper AS (
+      SELECT
+          bc.id_sku,
+{por_ventana("          SUM(CASE WHEN bc.fecha >= {corte} THEN bc.venta_neta END)   AS venta_{k}")},
+{por_ventana("          AVG(CASE WHEN bc.fecha >= {corte} THEN bc.precio_bruto END) AS precio_chiper_{k}")}
+      FROM base_chiper bc
+      GROUP BY bc.id_sku
+    ),
+
+    -- 4) SKUs distintos de Chiper por ventana (representatividad)
+    chiper_skus AS (
+      SELECT
+{por_ventana("          COUNT(DISTINCT CASE WHEN bc.fecha >= {corte} THEN bc.id_sku END) AS total_skus_chiper_{k}")}
+      FROM base_chiper bc
+    ),
+
+    -- 5) Un SKU entra en la ventana k solo si tiene precio de competidor en ella
+    joined AS (
+      SELECT
+          ac.id_sku,
+          s.sku,
+          mc.nombre AS macro,
+          c.nombre  AS categoria,
+          pr.nombre AS proveedor,
+          s.nombre  AS nombre,
+{por_ventana("          ac.comp_min_{k}")},
+{por_ventana("          CASE WHEN ac.comp_min_{k} IS NOT NULL THEN ach.venta_{k} END         AS venta_neta_{k}")},
+{por_ventana("          CASE WHEN ac.comp_min_{k} IS NOT NULL THEN ach.precio_chiper_{k} END AS precio_chiper_{k}")}
+      FROM agg_competidor ac
+      JOIN sku s
+        ON s.id = ac.id_sku
+      LEFT JOIN categoria c
+        ON c.id = s.id_categoria
+      LEFT JOIN macro_categoria mc
+        ON mc.id = c.id_macro
+      LEFT JOIN proveedor pr
+        ON pr.id = s.id_proveedor
+      LEFT JOIN agg_chiper ach
+        ON ach.id_sku = ac.id_sku
+    )
+
+    SELECT
+        j.id_sku,
+        j.sku,
+        j.macro,
+        j.categoria,
+        j.proveedor,
+        j.nombre,
+{por_ventana("        j.precio_chiper_{k}")},
+{por_ventana("        j.venta_neta_{k}")},
+{por_ventana("        j.precio_chiper_{k} / NULLIF(j.comp_min_{k}, 0)                  AS posicionamiento_{k}")},
+{por_ventana("        j.venta_neta_{k} / NULLIF(SUM(j.venta_neta_{k}) OVER (), 0)      AS peso_venta_{k}")},
+{por_ventana("        cs.total_skus_chiper_{k}")}
+    FROM joined j
+    CROSS JOIN chiper_skus cs
+    ORDER BY
+        j.id_sku;
+    """
+    return query
+
+
+def sql_posicionamiento_dia(
+    id_competidor: int,
+    fecha_str: str,
+) -> str:
+    """SQL del posicionamiento de un solo día a nivel SKU."""
+    query = f"""
+    WITH
+    params AS (
+      SELECT
+        {id_competidor}             AS id_competidor,
+        CAST('{fecha_str}' AS DATE) AS fecha_ref
+    ),
+
+    -- 1) Base de precios de competidor (solo ese día)
+    base_competidor AS (
+      SELECT
+          pc.id_sku,
+          pc.id_competidor,
+          DATE(pc.fecha)     AS fecha,
+          pc.precio_lleno,
+          pc.precio_descuento,
+          CASE
+            WHEN pc.precio_lleno IS NULL
+                 AND pc.precio_descuento IS NULL THEN NULL
+            WHEN pc.precio_lleno IS NULL THEN pc.precio_descuento
+            WHEN pc.precio_descuento IS NULL THEN pc.precio_lleno
+            ELSE LEAST(pc.precio_lleno, pc.precio_descuento)
+          END AS precio_competidor_min_dia
+      FROM precio_competidor pc
+      JOIN params p
+        ON (p.id_competidor IS NULL OR pc.id_competidor = p.id_competidor)
+      WHERE
+          DATE(pc.fecha) = p.fecha_ref
+          AND (pc.precio_lleno IS NOT NULL OR pc.precio_descuento IS NOT NULL)
+    ),
+
+    -- 2) Agregado competidor por SKU en el día
+    agg_competidor_dia AS (
+      SELECT
+          bc.id_sku,
+          bc.id_competidor,
+          bc.fecha,
+          AVG(bc.precio_lleno)              AS precio_lleno_dia,
+          AVG(bc.precio_descuento)          AS precio_descuento_dia,
+          AVG(bc.precio_competidor_min_dia) AS precio_competidor_min_dia
+      FROM base_competidor bc
+      GROUP BY
+          bc.id_sku,
+          bc.id_competidor,
+          bc.fecha
+    ),
+
+    -- 3) Base de ventas Chiper para ese día
+    base_chiper AS (
+      SELECT
+          vc.id_sku,
+          DATE(vc.fecha)   AS fecha,
+          vc.precio_bruto,
+          vc.venta_neta
+      FROM ventas_chiper vc
+      JOIN params p
+      WHERE
+          DATE(vc.fecha) = p.fecha_ref
+          AND vc.precio_bruto IS NOT NULL
+    ),
+
+    -- 4) Agregado Chiper por SKU en el día
+    agg_chiper_dia AS (
+      SELECT
+          bc.id_sku,
+          bc.fecha,
+          SUM(bc.venta_neta)   AS venta_neta_dia,
+          AVG(bc.precio_bruto) AS precio_chiper_dia
+      FROM base_chiper bc
+      GROUP BY
+          bc.id_sku,
+          bc.fecha
+    ),
+
+    -- 5) Join competidor + Chiper + info de SKU/categoría/macro/proveedor
+    joined AS (
+      SELECT
+          acd.fecha,
+          acd.id_sku,
+          s.sku,
+          mc.nombre AS macro,
+          c.nombre  AS categoria,
+          pr.nombre AS proveedor,
+          s.nombre  AS nombre,
+          acd.precio_lleno_dia,
+          acd.precio_descuento_dia,
+          acd.precio_competidor_min_dia,
+          achd.venta_neta_dia,
+          achd.precio_chiper_dia
+      FROM agg_competidor_dia acd
+      JOIN agg_chiper_dia achd
+        ON acd.id_sku = achd.id_sku
+       AND acd.fecha  = achd.fecha
+      JOIN sku s
+        ON s.id = acd.id_sku
+      LEFT JOIN categoria c
+        ON c.id = s.id_categoria
+      LEFT JOIN macro_categoria mc
+        ON mc.id = c.id_macro
+      LEFT JOIN proveedor pr
+        ON pr.id = s.id_proveedor
+    ),
+
+    -- 6) Cálculo de posicionamiento diario
+    final AS (
+      SELECT
+          j.*,
+          CASE
+            WHEN j.precio_chiper_dia IS NULL THEN NULL
+            WHEN j.precio_competidor_min_dia IS NULL THEN NULL
+            WHEN j.precio_competidor_min_dia = 0 THEN NULL
+            ELSE j.precio_chiper_dia / j.precio_competidor_min_dia
+          END AS posicionamiento
+      FROM joined j
+    )
+
+    SELECT
+        fecha,
+        sku,
+        macro,
+        categoria,
+        proveedor,
+        nombre,
+        precio_chiper_dia            AS precio_chiper,
+        precio_lleno_dia             AS precio_lleno_competidor,
+        precio_descuento_dia         AS precio_descuento_competidor,
+        venta_neta_dia               AS venta_neta,
+        posicionamiento
+    FROM final
+    ORDER BY
+        sku;
+    """
+    return query
+
+
+# ======================================================
+# SQL: RANKINGS DE VENTA (HIT LIST)
+# ======================================================
+def _filtro_rangos(col: str, rangos: List[Tuple[str, str]]) -> str:
+    """Rangos de días [desde, hasta] como predicado sargable sobre `col` (DATETIME)."""
+    return "\n         OR ".join(
+        f"({col} >= '{desde}' AND {col} < DATE_ADD('{hasta}', INTERVAL 1 DAY))"
+        for desde, hasta in rangos
+    )
+
+
+def _agregados_periodo(cond: Optional[str] = None, sufijo: str = "") -> str:
+    """
+    Agregados por SKU de sku_periodo. Con `cond` (predicado sobre d.date)
+    cada suma es condicional: así varios periodos salen del mismo recorrido.
+    """
+    y = "" if cond is None else f" AND {cond}"
+    venta = "d.venta" if cond is None else f"CASE WHEN {cond} THEN d.venta END"
+    unidades = "d.unidades" if cond is None else f"CASE WHEN {cond} THEN d.unidades END"
+    return f"""
+        SUM({venta})                                AS venta_total_periodo{sufijo},
+        SUM({unidades})                             AS unidades_total_periodo{sufijo},
+
+        -- Precio bruto promedio ponderado por la venta de cada día
+        SUM(d.precio_bruto_prom_dia * {venta})
+          / NULLIF(SUM({venta}), 0)                 AS precio_bruto_prom_pond{sufijo},
+
+        -- Margen (front + back) promedio ponderado por la venta de cada día
+        SUM(d.margen_front_back_prom_dia * {venta})
+          / NULLIF(SUM({venta}), 0)                 AS margen_front_back_prom_pond{sufijo},
+
+        -- Precio lleno competidor promedio ponderado por venta Chiper
+        SUM(
+          CASE
+            WHEN cd.precio_lleno_dia IS NOT NULL{y}
+            THEN cd.precio_lleno_dia * d.venta
+          END
+        )
+          / NULLIF(
+              SUM(
+                CASE
+                  WHEN cd.precio_lleno_dia IS NOT NULL{y}
+                  THEN d.venta
+                END
+              ),
+              0
+            )                                       AS precio_lleno_prom_pond{sufijo},
+
+        -- Precio descuento competidor promedio ponderado
+        SUM(
+          CASE
+            WHEN cd.precio_descuento_dia IS NOT NULL{y}
+            THEN cd.precio_descuento_dia * d.venta
+          END
+        )
+          / NULLIF(
+              SUM(
+                CASE
+                  WHEN cd.precio_descuento_dia IS NOT NULL{y}
+                  THEN d.venta
+                END
+              ),
+              0
+            )                                       AS precio_descuento_prom_pond{sufijo}"""
+
+
+def _ctes_venta_sku_periodo(
+    dfrom_str: str,
+    dto_str: str,
+    anterior: Optional[Tuple[str, str]] = None,
+) -> str:
+    """
+    CTEs daily_sku / comp_dia / sku_periodo: una fila por SKU con la venta
+    del periodo y sus promedios ponderados.
+
+    Ventas y precios de competidor se reducen por separado a una fila por
+    SKU/día y recién entonces se cruzan: cada venta se suma una sola vez
+    (el cruce a nivel de registro la repetía por cada precio de competidor
+    del día) y los rankings se calculan sobre los agregados diarios.
+
+    Con `anterior` = (desde, hasta) se leen ambos rangos en el mismo
+    recorrido y sku_periodo agrega además las columnas `*_anterior`.
+    """
+    rangos = [(dfrom_str, dto_str)] + ([anterior] if anterior else [])
+    if anterior:
+        agregados = (
+            _agregados_periodo(f"d.date BETWEEN '{dfrom_str}' AND '{dto_str}'") + ","
+            + _agregados_periodo(f"d.date BETWEEN '{anterior[0]}' AND '{anterior[1]}'", "_anterior")
+        )
+    else:
+        agregados = _agregados_periodo()
+    return f"""
+    daily_sku AS (
+      SELECT
+        DATE(v.fecha)                      AS date,
+        v.id_sku                           AS sku,
+        SUM(v.venta_neta)                  AS venta,
+        SUM(v.cantidad)                    AS unidades,
+
+        -- Precio bruto promedio del día (ponderado por unidades)
+        SUM(v.precio_bruto * v.cantidad)
+          / NULLIF(SUM(v.cantidad), 0)     AS precio_bruto_prom_dia,
+
+        -- Margen total (front + back) del día, ponderado por venta
+        SUM( (v.front + v.back) * v.venta_neta )
+          / NULLIF(SUM(v.venta_neta), 0)   AS margen_front_back_prom_dia
+      FROM ventas_chiper v
+      WHERE {_filtro_rangos("v.fecha", rangos)}
+      GROUP BY DATE(v.fecha), v.id_sku
+    ),
+    comp_dia AS (
+      -- Un precio de competidor por SKU/día
+      SELECT
+        DATE(pc.fecha)                     AS date,
+        pc.id_sku                          AS sku,
+        AVG(pc.precio_lleno)               AS precio_lleno_dia,
+        AVG(pc.precio_descuento)           AS precio_descuento_dia
+      FROM precio_competidor pc
+      WHERE pc.id_competidor = 1          -- opcional / fijo por ahora
+        AND ({_filtro_rangos("pc.fecha", rangos)})
+      GROUP BY DATE(pc.fecha), pc.id_sku
+    ),
+    sku_periodo AS (
+      SELECT
+        d.sku,{agregados}
+      FROM daily_sku d
+      LEFT JOIN comp_dia cd
+          ON cd.sku  = d.sku
+         AND cd.date = d.date
+      GROUP BY d.sku
+    )"""
+
+
+_COLUMNAS_RANKING = """
+        r.sku,
+        s.nombre                                    AS nombre_sku,
+        c.nombre                                    AS categoria,
+        mc.nombre                                   AS macro_categoria,
+        pvd.nombre                                  AS proveedor,
+        r.venta_total_periodo,
+        r.unidades_total_periodo,
+        r.precio_bruto_prom_pond,
+        r.margen_front_back_prom_pond,
+        r.precio_lleno_prom_pond,
+        r.precio_descuento_prom_pond"""
+
+# Métricas por SKU de sku_periodo (con sufijo _anterior en modo comparación)
+_METRICAS_PERIODO = [
+    "venta_total_periodo",
+    "unidades_total_periodo",
+    "precio_bruto_prom_pond",
+    "margen_front_back_prom_pond",
+    "precio_lleno_prom_pond",
+    "precio_descuento_prom_pond",
+]
+
+_JOINS_DIMENSIONES = """
+    LEFT JOIN sku s
+        ON s.id = r.sku
+    LEFT JOIN categoria c
+        ON c.id = s.id_categoria
+    LEFT JOIN macro_categoria mc
+        ON mc.id = c.id_macro
+    LEFT JOIN proveedor pvd
+        ON pvd.id = s.id_proveedor"""
+
+
+def sql_top_20_ventas(dfrom_str: str, dto_str: str) -> str:
+    """
+    SQL del Top 20 productos por venta neta del periodo. Las dimensiones se
+    unen solo a los 20 SKUs ganadores. Ya no lo usa ninguna página (Hit_List
+    usa sql_top_n_ventas); queda como referencia de los benchmarks.
+    """
+    query = f"""
+    WITH
+    {_ctes_venta_sku_periodo(dfrom_str, dto_str)},
+    ranking AS (
+      SELECT *
+      FROM sku_periodo
+      ORDER BY venta_total_periodo DESC, sku
+      LIMIT 20
+    )
+    SELECT{_COLUMNAS_RANKING}
+    FROM ranking r{_JOINS_DIMENSIONES}
+    ORDER BY r.venta_total_periodo DESC, r.sku;
+    """
+    return query
+
+
+def sql_top_n_ventas(
+    dfrom_str: str,
+    dto_str: str,
+    n: int,
+    anterior: Optional[Tuple[str, str]] = None,
+) -> str:
+    """
+    Top N por venta neta global y dentro de cada macro_categoria, categoria
+    y proveedor, en una sola consulta: un ROW_NUMBER() por agrupación sobre
+    sku_periodo. Devuelve cada SKU que entra en al menos uno de los rankings,
+    con su posición en todos (rank_*), para filtrar en memoria cualquier
+    agrupación y cualquier N <= n.
+
+    Con `anterior` = (desde, hasta) ambos periodos salen del mismo recorrido
+    (agregación condicional): se agregan las métricas `*_anterior`, la
+    posición en el periodo anterior (rank_*_anterior, NULL si no vendió) y
+    la variación de venta.
+    """
+    n = int(n)
+    rankings = [("", "r.venta_total_periodo")]
+    if anterior:
+        rankings.append(("_anterior", "r.venta_total_periodo_anterior"))
+    rank_cols = []
+    for sufijo, venta in rankings:
+        for col, part in _RANK_PARTICIONES.items():
+            over = (
+                f"OVER ({'' if part is None else f'PARTITION BY {part} '}"
+                f"ORDER BY {venta} DESC, r.sku)"
+            )
+            # Los SKUs sin venta en el periodo quedan al final (NULL en DESC) y sin posición
+            rank_cols.append(
+                f"        CASE WHEN {venta} IS NOT NULL THEN ROW_NUMBER() {over} END AS {col}{sufijo}"
+                if anterior
+                else f"        ROW_NUMBER() {over} AS {col}{sufijo}"
+            )
+    columnas = _COLUMNAS_RANKING
+    if anterior:
+        columnas += ",\n" + ",\n".join(
+            f"        r.{c}_anterior" for c in _METRICAS_PERIODO
+        ) + """,
+        r.venta_total_periodo - COALESCE(r.venta_total_periodo_anterior, 0)
+                                                    AS delta_venta,
+        r.venta_total_periodo / NULLIF(r.venta_total_periodo_anterior, 0) - 1
+                                                    AS delta_venta_pct"""
+    rank_cols = ",\n".join(rank_cols)
+    en_algun_top = " OR ".join(f"{col} <= {n}" for col in _RANK_PARTICIONES)
+    query = f"""
+    WITH
+    {_ctes_venta_sku_periodo(dfrom_str, dto_str, anterior)},
+    ranked AS (
+      SELECT{columnas},
+{rank_cols}
+      FROM sku_periodo r{_JOINS_DIMENSIONES}
+    )
+    SELECT *
+    FROM ranked
+    WHERE ({en_algun_top})
+      AND venta_total_periodo IS NOT NULL
+    ORDER BY rank_global;
+    """
+    return query
+
+
+def periodo_comparacion(dfrom: date, dto: date, modo: str) -> Tuple[date, date]:
+    """
+    Rango contra el que se compara [dfrom, dto]: el periodo inmediatamente
+    anterior de igual largo, o el mismo periodo del año anterior.
+    """
+    if modo == COMPARAR_ANIO_ANTERIOR:
+        def _un_anio_antes(d: date) -> date:
+            try:
+                return d.replace(year=d.year - 1)
+            except ValueError:  # 29 de febrero
+                return d.replace(year=d.year - 1, day=28)
+        return _un_anio_antes(dfrom), _un_anio_antes(dto)
+    largo = (dto - dfrom).days + 1
+    return dfrom - timedelta(days=largo), dfrom - timedelta(days=1)
+
+
+# ======================================================
+# SQL: PRECIO CHIPER POR DÍA Y OUTLIERS
+# ======================================================
+def sql_chiper_sku_dia(fecha_desde_str: str, fecha_hasta_str: str) -> str:
+    """
+    Una fila por (fecha, id_sku) de ventas_chiper: precio bruto ponderado por
+    unidades (promedio simple si no hay unidades), venta y transacciones.
+    Alimenta la tabla chiper_sku_dia y, si el día aún no está, se usa en vivo.
+    """
+    return f"""
+    SELECT
+        DATE(vc.fecha)         AS fecha,
+        vc.id_sku,
+        COALESCE(
+            SUM(vc.precio_bruto * vc.cantidad) / NULLIF(SUM(vc.cantidad), 0),
+            AVG(vc.precio_bruto)
+        )                      AS precio_bruto_dia,
+        SUM(vc.venta_neta)     AS venta_neta_dia,
+        SUM(vc.cantidad)       AS unidades_dia,
+        COUNT(*)               AS transacciones
+    FROM ventas_chiper AS vc
+    WHERE
+        vc.precio_bruto IS NOT NULL
+        AND vc.fecha >= '{fecha_desde_str}'
+        AND vc.fecha <  DATE_ADD('{fecha_hasta_str}', INTERVAL 1 DAY)
+    GROUP BY DATE(vc.fecha), vc.id_sku
+    """
+
+
+def sql_ratios_competidor(
+    fecha_desde_str: str,
+    fecha_hasta_str: str,
+    id_competidor_opt: int,
+    *,
+    usar_rollup: bool = False,
+) -> str:
+    """
+    SQL de TODOS los registros de precio_competidor del rango con su ratio
+    precio_chiper / precio_competidor (sin umbrales: se aplican en memoria,
+    ver filter_outliers). El ratio se calcula una sola vez por fila y el
+    rango de fechas es sargable sobre pc.fecha.
+
+    El lado Chiper entra ya reducido a un precio por SKU/día: desde
+    chiper_sku_dia si `usar_rollup` (el job cubre el rango) o agregado en
+    vivo; así cada registro de competidor aparece una sola vez.
+    """
+    where_extra = ""
+    if id_competidor_opt != 0:
+        where_extra += f" AND pc.id_competidor = {id_competidor_opt}\n"
+
+    if usar_rollup:
+        chiper_dia = f"""
+        SELECT fecha, id_sku, precio_bruto_dia
+        FROM {CHIPER_DIA_TABLE}
+        WHERE fecha >= '{fecha_desde_str}'
+          AND fecha <  DATE_ADD('{fecha_hasta_str}', INTERVAL 1 DAY)
+        """
+    else:
+        chiper_dia = sql_chiper_sku_dia(fecha_desde_str, fecha_hasta_str)
+
+    query = f"""
+    SELECT
+        r.*,
+        r.precio_bruto_chiper / r.precio_competidor_efectivo AS ratio_posicionamiento
+    FROM (
+        SELECT
+            pc.id,
+            pc.id_competidor,
+            c.nombre AS nombre_competidor,
+            pc.id_sku,
+            s.sku,
+            s.nombre AS nombre_sku,
+            pc.fecha,
+            pc.precio_lleno,
+            pc.precio_descuento,
+            cd.precio_bruto_dia AS precio_bruto_chiper,
+            COALESCE(pc.precio_descuento, pc.precio_lleno) AS precio_competidor_efectivo
+        FROM precio_competidor AS pc
+        JOIN competidor AS c
+            ON c.id = pc.id_competidor
+        JOIN sku AS s
+            ON s.id = pc.id_sku
+        JOIN ({chiper_dia}) AS cd
+            ON cd.id_sku = pc.id_sku
+           AND cd.fecha  = DATE(pc.fecha)
+        WHERE
+            cd.precio_bruto_dia IS NOT NULL
+            AND pc.fecha >= '{fecha_desde_str}'
+            AND pc.fecha <  DATE_ADD('{fecha_hasta_str}', INTERVAL 1 DAY)
+            {where_extra}
+    ) AS r
+    WHERE r.precio_competidor_efectivo > 0;
+    """
+    return query
+
+
+def sql_scores_competidor(
+    fecha_desde_str: str,
+    fecha_hasta_str: str,
+    id_competidor_opt: int,
+) -> str:
+    """
+    SQL de los registros ya puntuados (outlierScoring) del rango, con el
+    mismo detalle que sql_ratios_competidor. El JOIN con precio_competidor
+    descarta scores de registros ya eliminados o en cuarentena.
+    """
+    where_extra = ""
+    if id_competidor_opt != 0:
+        where_extra += f" AND sc.id_competidor = {id_competidor_opt}\n"
+
+    return f"""
+    SELECT
+        pc.id,
+        pc.id_competidor,
+        c.nombre AS nombre_competidor,
+        pc.id_sku,
+        s.sku,
+        s.nombre AS nombre_sku,
+        pc.fecha,
+        pc.precio_lleno,
+        pc.precio_descuento,
+        sc.precio AS precio_competidor_efectivo,
+        sc.mediana AS mediana_ventana,
+        sc.mad AS mad_ventana,
+        sc.n_ventana,
+        sc.score
+    FROM {SCORE_TABLE} AS sc
+    JOIN precio_competidor AS pc
+        ON pc.id = sc.id
+    JOIN competidor AS c
+        ON c.id = pc.id_competidor
+    JOIN sku AS s
+        ON s.id = pc.id_sku
+    WHERE
+        sc.score IS NOT NULL
+        AND sc.fecha >= '{fecha_desde_str}'
+        AND sc.fecha <= '{fecha_hasta_str}'
+        {where_extra}
+    """
+
+
+# ======================================================
+# SQL: SKETCHES POR DÍA
+# ======================================================
+def sql_sketch_skus_chiper_dia() -> str:
+    """SKUs con precio Chiper del día (desde chiper_sku_dia) y su categoría."""
+    return f"""
+    SELECT
+        cd.id_sku,
+        COALESCE(s.id_categoria, 0) AS id_categoria
+    FROM {CHIPER_DIA_TABLE} AS cd
+    LEFT JOIN sku AS s
+        ON s.id = cd.id_sku
+    WHERE
+        cd.fecha = %s
+        AND cd.precio_bruto_dia IS NOT NULL;
+    """
+
+
+def sql_sketch_posicionamiento_dia() -> str:
+    """
+    Posicionamiento SKU/día frente a cada competidor: precio Chiper del día
+    (chiper_sku_dia, ponderado por unidades; la página usa AVG(precio_bruto))
+    sobre el promedio del precio mínimo del competidor (LEAST(lleno,
+    descuento)) en el día. Parámetros: (fecha, fecha, fecha).
+    """
+    return f"""
+    SELECT
+        pc.id_competidor,
+        cd.id_sku,
+        COALESCE(s.id_categoria, 0) AS id_categoria,
+        MAX(cd.precio_bruto_dia) / NULLIF(AVG(
+            LEAST(
+                COALESCE(pc.precio_lleno, pc.precio_descuento),
+                COALESCE(pc.precio_descuento, pc.precio_lleno)
+            )
+        ), 0) AS posicionamiento
+    FROM precio_competidor AS pc
+    JOIN {CHIPER_DIA_TABLE} AS cd
+        ON cd.id_sku = pc.id_sku
+       AND cd.fecha  = %s
+    LEFT JOIN sku AS s
+        ON s.id = cd.id_sku
+    WHERE
+        pc.fecha >= %s
+        AND pc.fecha <  DATE_ADD(%s, INTERVAL 1 DAY)
+        AND (pc.precio_lleno IS NOT NULL OR pc.precio_descuento IS NOT NULL)
+        AND cd.precio_bruto_dia IS NOT NULL
+    GROUP BY
+        pc.id_competidor,
+        cd.id_sku,
+        s.id_categoria;
+    """
+
+
+def sql_sketches_ventana(fecha_str: str, ventana: int) -> str:
+    """
+    Sketches de Chiper y del competidor para los días de la ventana (mismo
+    rango que sql_total_skus_chiper), con la categoría y su macro.
+    Parámetro: (id_competidor,).
+    """
+    return f"""
+    SELECT
+        sd.tipo,
+        sd.id_categoria,
+        mc.nombre AS macro,
+        c.nombre  AS categoria,
+        sd.datos
+    FROM {SKETCH_DIA_TABLE} AS sd
+    LEFT JOIN categoria AS c
+        ON c.id = sd.id_categoria
+    LEFT JOIN macro_categoria AS mc
+        ON mc.id = c.id_macro
+    WHERE
+        sd.fecha >= DATE_SUB(CAST('{fecha_str}' AS DATE), INTERVAL {int(ventana)} DAY)
+        AND sd.fecha <= CAST('{fecha_str}' AS DATE)
+        AND (
+            (sd.tipo = '{SKETCH_HLL_CHIPER}' AND sd.id_competidor = 0)
+            OR (sd.tipo IN ('{SKETCH_HLL_POSICIONAMIENTO}', '{SKETCH_TDIGEST_POSICIONAMIENTO}')
+                AND sd.id_competidor = %s)
+        );
+    """
+
+
+def sql_snapshot_posicionamiento() -> str:
+    """Lectura del snapshot nocturno para (fecha_actual, dias_ventana, id_competidor)."""
+    cols = ",\n        ".join(SNAPSHOT_COLUMNS)
+    return f"""
+    SELECT
+        {cols}
+    FROM {SNAPSHOT_TABLE}
+    WHERE
+        fecha_actual = %s
+        AND dias_ventana = %s
+        AND id_competidor = %s
+    ORDER BY
+        id_sku;
+    """
+
+
+def _snapshot_disponible(id_competidor: int, fecha_str: str, ventana: int) -> bool:
+    """True si el job nocturno ya dejó snapshot para esos parámetros (aunque tenga 0 filas)."""
+    df_run = execute_mysql_query(
+        f"""
+        SELECT 1 AS ok
+        FROM {SNAPSHOT_RUN_TABLE}
+        WHERE fecha_actual = %s AND dias_ventana = %s AND id_competidor = %s
+        LIMIT 1;
+        """,
+        (fecha_str, ventana, id_competidor),
+    )
+    return df_run is not None and not df_run.empty
+
+
+def _rollup_chiper_disponible(fecha_desde_str: str, fecha_hasta_str: str) -> bool:
+    """True si el job chiper-dia ya procesó todos los días del rango."""
+    dias = (date.fromisoformat(fecha_hasta_str) - date.fromisoformat(fecha_desde_str)).days + 1
+    df_run = execute_mysql_query(
+        f"""
+        SELECT COUNT(*) AS dias
+        FROM {CHIPER_DIA_RUN_TABLE}
+        WHERE fecha BETWEEN %s AND %s;
+        """,
+        (fecha_desde_str, fecha_hasta_str),
+    )
+    return df_run is not None and not df_run.empty and int(df_run["dias"].iloc[0]) >= dias
+
+
+def _sketches_disponibles(fecha_str: str, ventana: int) -> bool:
+    """True si el job de sketches ya procesó todos los días de la ventana."""
+    df_run = execute_mysql_query(
+        f"""
+        SELECT COUNT(*) AS dias
+        FROM {SKETCH_DIA_RUN_TABLE}
+        WHERE fecha BETWEEN DATE_SUB(%s, INTERVAL %s DAY) AND %s;
+        """,
+        (fecha_str, int(ventana), fecha_str),
+    )
+    return df_run is not None and not df_run.empty and int(df_run["dias"].iloc[0]) >= ventana + 1
+
+
+def combinar_sketches(df_sketches: pd.DataFrame) -> pd.DataFrame:
+    """
+    Combina los sketches diarios de una ventana (filas de sql_sketches_ventana)
+    en una fila por categoría más una fila "total": SKUs distintos estimados
+    de Chiper y con posicionamiento, representatividad, SKU-días y cuantiles
+    SKETCH_CUANTILES del posicionamiento SKU/día (p10, p50, p90).
+    """
+    from sketchHelper import HyperLogLog, TDigest
+
+    cols_q = [f"p{round(q * 100)}" for q in SKETCH_CUANTILES]
+    hll_chiper, hll_pos, digests = {}, {}, {}
+    nombres = {}
+    for tipo, id_cat, macro, categoria, datos in df_sketches[
+        ["tipo", "id_categoria", "macro", "categoria", "datos"]
+    ].itertuples(index=False):
+        id_cat = int(id_cat)
+        nombres.setdefault(id_cat, (macro, categoria))
+        if tipo == SKETCH_TDIGEST_POSICIONAMIENTO:
+            digests.setdefault(id_cat, []).append(TDigest.from_bytes(datos))
+            continue
+        destino = hll_chiper if tipo == SKETCH_HLL_CHIPER else hll_pos
+        hll = HyperLogLog.from_bytes(datos)
+        if id_cat in destino:
+            destino[id_cat].merge(hll)
+        else:
+            destino[id_cat] = hll
+
+    def fila(nivel, macro, categoria, h_chiper, h_pos, td):
+        skus_chiper = h_chiper.estimate() if h_chiper is not None else 0.0
+        skus_pos = h_pos.estimate() if h_pos is not None else 0.0
+        out = {
+            "nivel": nivel,
+            "macro": macro,
+            "categoria": categoria,
+            "skus_chiper_est": skus_chiper,
+            "skus_posicionamiento_est": skus_pos,
+            "representatividad": min(skus_pos / skus_chiper, 1.0) if skus_chiper else np.nan,
+            "sku_dias": td.n,
+        }
+        out.update({c: td.quantile(q) for c, q in zip(cols_q, SKETCH_CUANTILES)})
+        return out
+
+    filas = []
+    digests_cat = {}
+    for id_cat in sorted(set(hll_chiper) | set(hll_pos) | set(digests)):
+        digests_cat[id_cat] = TDigest.merge_all(digests.get(id_cat, []))
+        macro, categoria = nombres[id_cat]
+        filas.append(fila(
+            "categoria", macro, categoria,
+            hll_chiper.get(id_cat), hll_pos.get(id_cat), digests_cat[id_cat],
+        ))
+    filas.insert(0, fila(
+        "total", None, None,
+        HyperLogLog.merge_all(hll_chiper.values()),
+        HyperLogLog.merge_all(hll_pos.values()),
+        TDigest.merge_all(digests_cat.values()),
+    ))
+    return pd.DataFrame(filas)
+
+
+# ======================================================
+# LOADERS CACHEADOS
+# ======================================================
+def _hoy() -> str:
+    return date.today().strftime("%Y-%m-%d")
+
+
+def _hace_dias(n: int) -> str:
+    return (date.today() - timedelta(days=n)).strftime("%Y-%m-%d")
+
+
+@cached_loader(
+    "posicionamiento_categoria",
+    warm_kwargs=lambda: {"id_competidor": 1, "fecha_str": _hoy(), "ventana": 30},
+)
+def load_posicionamiento_categoria(
+    id_competidor: int,
+    fecha_str: str,
+    ventana: int,
+) -> pd.DataFrame:
+    """
+    Devuelve un DataFrame a nivel de SKU para la ventana pedida.
+
+    Si la ventana es una de las predefinidas y el job nocturno ya generó el
+    snapshot, se lee de `snapshot_posicionamiento`; si no (ventana
+    personalizada o snapshot aún no generado) se calcula en vivo.
+    """
+    if ventana in VENTANAS_SNAPSHOT and _snapshot_disponible(id_competidor, fecha_str, ventana):
+        df = execute_mysql_query(
+            sql_snapshot_posicionamiento(),
+            (fecha_str, ventana, id_competidor),
+            loader="posicionamiento_categoria",
+            max_execution_ms=MAX_EXECUTION_MS_PAGINA,
+            compact=True,
+        )
+        if df is not None:
+            return df
+
+    # En vivo: filas SKU y total de SKUs Chiper en paralelo (latencia = la mayor).
+    # Con sketches de todos los días el total sale de combinar los HyperLogLog
+    # diarios (estimado) en vez del COUNT(DISTINCT) sobre la ventana
+    usar_sketches = _sketches_disponibles(fecha_str, ventana)
+    if usar_sketches:
+        total_spec = QuerySpec(
+            sql_sketches_ventana(fecha_str, ventana),
+            (0,),
+            loader="posicionamiento_categoria_sketches",
+            max_execution_ms=MAX_EXECUTION_MS_PAGINA,
+        )
+    else:
+        total_spec = QuerySpec(
+            sql_total_skus_chiper(fecha_str, ventana),
+            loader="posicionamiento_categoria_total",
+            max_execution_ms=MAX_EXECUTION_MS_PAGINA,
+        )
+    res = run_queries_concurrently({
+        "skus": QuerySpec(
+            sql_posicionamiento_ventana(id_competidor, fecha_str, ventana, con_total=False),
+            loader="posicionamiento_categoria",
+            max_execution_ms=MAX_EXECUTION_MS_PAGINA,
+            compact=True,
+        ),
+        "total": total_spec,
+    })
+    df = res["skus"]
+    df_total = res["total"]
+    if usar_sketches and df_total is not None:
+        df_total = combinar_sketches(df_total).rename(columns={"skus_chiper_est": "total_skus_chiper"})
+        df_total["total_skus_chiper"] = df_total["total_skus_chiper"].round().astype(int)
+    if df is not None and df_total is not None and not df_total.empty:
+        df["total_skus_chiper"] = df_total["total_skus_chiper"].iloc[0]
+        df["total_skus_estimado"] = usar_sketches
+    return df
+
+
+@cached_loader(
+    "posicionamiento_dia",
+    warm_kwargs=lambda: {"id_competidor": 1, "fecha_str": _hoy()},
+)
+def load_posicionamiento_dia(
+    id_competidor: int,
+    fecha_str: str,
+) -> pd.DataFrame:
+    """
+    Devuelve un DataFrame a nivel SKU para un solo día:
+    - precios diarios competidor y Chiper
+    - venta_neta diaria
+    - posicionamiento diario
+    Solo incluye SKUs con datos de competidor y Chiper (para poder calcular posicionamiento).
+    """
+    return execute_mysql_query(
+        sql_posicionamiento_dia(id_competidor, fecha_str),
+        loader="posicionamiento_dia",
+        max_execution_ms=MAX_EXECUTION_MS_PAGINA,
+        compact=True,
+    )
+
+
+@cached_loader(
+    "posicionamiento_multiventana",
+    warm_kwargs=lambda: {"id_competidor": 1, "fecha_str": _hoy()},
+)
+def load_posicionamiento_multiventana(id_competidor: int, fecha_str: str) -> pd.DataFrame:
+    """
+    Todas las ventanas predefinidas (VENTANAS_SNAPSHOT) lado a lado, a nivel
+    SKU, al costo de la ventana más larga (ver sql_posicionamiento_multiventana).
+    """
+    return execute_mysql_query(
+        sql_posicionamiento_multiventana(id_competidor, fecha_str),
+        loader="posicionamiento_multiventana",
+        max_execution_ms=MAX_EXECUTION_MS_PAGINA,
+        compact=True,
+    )
+
+
+@cached_loader(
+    "sketches_posicionamiento",
+    warm_kwargs=lambda: {"id_competidor": 1, "fecha_str": _hoy(), "ventana": 30},
+)
+def load_sketches_posicionamiento(
+    id_competidor: int,
+    fecha_str: str,
+    ventana: int,
+) -> pd.DataFrame:
+    """
+    Representatividad y cuantiles del posicionamiento por categoría para la
+    ventana, combinando los sketches diarios (ver combinar_sketches): el
+    costo depende de días × categorías, no de las filas de la ventana.
+    None si el job de sketches no cubre todos los días.
+    """
+    if not _sketches_disponibles(fecha_str, ventana):
+        return None
+    df = execute_mysql_query(
+        sql_sketches_ventana(fecha_str, ventana),
+        (int(id_competidor),),
+        loader="sketches_posicionamiento",
+        max_execution_ms=MAX_EXECUTION_MS_PAGINA,
+    )
+    if df is None:
+        return None
+    return combinar_sketches(df)
+
+
+@cached_loader(
+    "top_n_ventas",
+    warm_kwargs=lambda: {"dfrom_str": _hace_dias(30), "dto_str": _hoy(), "n": TOP_N_ESCALONES[0]},
+)
+def load_top_n_ventas(
+    dfrom_str: str,
+    dto_str: str,
+    n: int,
+    anterior_desde_str: Optional[str] = None,
+    anterior_hasta_str: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Top `n` global y por macro_categoria, categoria y proveedor (una sola
+    consulta, ver sql_top_n_ventas). La página pide `top_n_escalon(N)` y
+    filtra con top_n_por_grupo: cambiar de agrupación o bajar N no consulta.
+    Con el rango anterior agrega las columnas de comparación.
+    """
+    anterior = (anterior_desde_str, anterior_hasta_str) if anterior_desde_str else None
+    return execute_mysql_query(
+        sql_top_n_ventas(dfrom_str, dto_str, n, anterior),
+        loader="top_n_ventas",
+        max_execution_ms=MAX_EXECUTION_MS_PAGINA,
+        compact=True,
+    )
+
+
+@cached_loader(
+    "ratios_competidor",
+    warm_kwargs=lambda: {
+        "fecha_desde_str": _hace_dias(30),
+        "fecha_hasta_str": _hoy(),
+        "id_competidor_opt": 0,
+    },
+)
+def load_ratios_competidor(
+    fecha_desde_str: str,
+    fecha_hasta_str: str,
+    id_competidor_opt: int,
+) -> pd.DataFrame:
+    """
+    Tabla de ratios por registro de precio_competidor para (rango, competidor),
+    en tipos compactos y ordenada por ratio ascendente: los umbrales no son
+    parte de la clave de caché y se aplican con filter_outliers.
+    """
+    usar_rollup = _rollup_chiper_disponible(fecha_desde_str, fecha_hasta_str)
+    df = execute_mysql_query(
+        sql_ratios_competidor(fecha_desde_str, fecha_hasta_str, id_competidor_opt, usar_rollup=usar_rollup),
+        loader="ratios_competidor",
+        max_execution_ms=MAX_EXECUTION_MS_PAGINA,
+        compact=True,
+    )
+    if df is None:
+        return None
+    for col in [
+        "precio_lleno",
+        "precio_descuento",
+        "precio_bruto_chiper",
+        "precio_competidor_efectivo",
+        "ratio_posicionamiento",
+    ]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df = df[df["ratio_posicionamiento"].notna()]
+    return df.sort_values("ratio_posicionamiento", kind="stable").reset_index(drop=True)
+
+
+@cached_loader(
+    "scores_competidor",
+    warm_kwargs=lambda: {
+        "fecha_desde_str": _hace_dias(30),
+        "fecha_hasta_str": _hoy(),
+        "id_competidor_opt": 0,
+    },
+)
+def load_scores_competidor(
+    fecha_desde_str: str,
+    fecha_hasta_str: str,
+    id_competidor_opt: int,
+) -> pd.DataFrame:
+    """
+    Registros con score robusto precalculado (batchJobs.py scoring) para
+    (rango, competidor), compactos y ordenados por score ascendente: el
+    umbral |score| se aplica en memoria con filter_outliers(col="score").
+    """
+    df = execute_mysql_query(
+        sql_scores_competidor(fecha_desde_str, fecha_hasta_str, id_competidor_opt),
+        loader="scores_competidor",
+        max_execution_ms=MAX_EXECUTION_MS_PAGINA,
+        compact=True,
+    )
+    if df is None:
+        return None
+    for col in ["precio_lleno", "precio_descuento", "precio_competidor_efectivo",
+                "mediana_ventana", "mad_ventana", "score"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df.sort_values("score", kind="stable").reset_index(drop=True)
+
+
+def filter_outliers(
+    df_sorted: pd.DataFrame,
+    umbral_sup: float,
+    umbral_inf: float,
+    *,
+    col: str = "ratio_posicionamiento",
+) -> pd.DataFrame:
+    """
+    Registros con `col` > umbral_sup o < umbral_inf, de mayor a menor.
+
+    `df_sorted` viene ordenado por `col` (load_ratios_competidor,
+    load_scores_competidor), así que cada umbral es una búsqueda binaria y
+    el resultado son dos rebanadas.
+    """
+    r = df_sorted[col].to_numpy()
+    lo = int(np.searchsorted(r, umbral_inf, side="left"))
+    hi = max(int(np.searchsorted(r, umbral_sup, side="right")), lo)
+    return pd.concat([df_sorted.iloc[hi:][::-1], df_sorted.iloc[:lo][::-1]])
+
+
+def top_n_escalon(n: int) -> int:
+    """Primer escalón de TOP_N_ESCALONES que cubre `n` (acota las entradas de caché)."""
+    n = max(1, min(int(n), TOP_N_MAX))
+    return next(e for e in TOP_N_ESCALONES if e >= n)
+
+
+def top_n_por_grupo(df_top: pd.DataFrame, rank_col: str, n: int) -> pd.DataFrame:
+    """
+    Filas de load_top_n_ventas dentro del Top `n` de la agrupación `rank_col`
+    (ver TOP_N_GRUPOS), ordenadas por grupo y posición. En modo comparación
+    agrega `cambio_posicion` (positivo = subió; NULL = no vendía antes).
+    """
+    grupo = [TOP_N_COLUMNA_GRUPO[rank_col]] if rank_col in TOP_N_COLUMNA_GRUPO else []
+    df = df_top[df_top[rank_col] <= n]
+    if f"{rank_col}_anterior" in df.columns:
+        df = df.assign(cambio_posicion=df[f"{rank_col}_anterior"] - df[rank_col])
+    return df.sort_values(grupo + [rank_col], kind="stable")
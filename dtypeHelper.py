@@ -0,0 +1,125 @@
+"""
+Compactación de tipos para los DataFrames que se guardan en caché.
+
+MySQL entrega etiquetas como `object` (str), DECIMAL como objetos Decimal e
+ids como int64 (o float64 si hay NULL). Para un frame de SKUs × días que se
+retiene por combinación de parámetros eso es mucha RAM por worker. Aquí:
+- etiquetas repetidas (macro, categoria, proveedor, nombre...) -> category;
+- Decimal / float64 -> float64; solo las columnas de razones
+  (posicionamiento, peso, ratio, ...: FLOAT32_PATRONES) pasan a float32, y
+  solo si el redondeo no mueve el valor más de media unidad del último
+  decimal. Montos, precios y unidades quedan en float64: las páginas los
+  suman y en float32 los totales de 1e8–1e10 pierden precisión;
+- enteros e ids (aunque vengan como float por los NULL) -> Int32/Int64
+  nullable.
+
+Las fechas, booleanos y columnas de texto con casi todos los valores
+distintos se dejan como están.
+"""
+from decimal import Decimal
+from typing import Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+# Fracción máxima de valores distintos para pasar una columna de texto a category
+CATEGORY_MAX_RATIO = 0.5
+# Precisión que debe conservar un float al pasar a float32 (2 = centavos)
+FLOAT32_DECIMALS = 2
+# Columnas (por subcadena del nombre) que pueden pasar a float32: razones
+# acotadas, nunca montos que se suman
+FLOAT32_PATRONES = ("posicionamiento", "peso", "ratio", "pct", "score", "representatividad")
+
+_INT32_MIN, _INT32_MAX = np.iinfo("int32").min, np.iinfo("int32").max
+
+
+def _is_id(col: str) -> bool:
+    c = str(col).lower()
+    return c == "id" or c.startswith("id_") or c.endswith("_id")
+
+
+def _admite_float32(col: str) -> bool:
+    c = str(col).lower()
+    return any(p in c for p in FLOAT32_PATRONES)
+
+
+def _first_valid(s: pd.Series):
+    idx = s.first_valid_index()
+    return None if idx is None else s.loc[idx]
+
+
+def _to_nullable_int(s: pd.Series) -> pd.Series:
+    valid = s.dropna()
+    if valid.empty:
+        return s.astype("Int32")
+    lo, hi = valid.min(), valid.max()
+    dtype = "Int32" if _INT32_MIN <= lo and hi <= _INT32_MAX else "Int64"
+    return s.astype(dtype)
+
+
+def _compact_float(s: pd.Series, col: str, decimals: int) -> pd.Series:
+    x = s.to_numpy(dtype="float64")
+    finite = np.isfinite(x)
+
+    if _is_id(col) and np.array_equal(x[finite], np.round(x[finite])):
+        return _to_nullable_int(s)
+    if not _admite_float32(col):
+        return s
+
+    with np.errstate(over="ignore"):
+        x32 = x.astype("float32")
+    diff = np.abs(x32[finite].astype("float64") - x[finite])
+    if diff.size == 0 or diff.max() <= 0.5 * 10.0 ** (-decimals):
+        return pd.Series(x32, index=s.index, name=s.name)
+    return s
+
+
+def compact_frame(
+    df: pd.DataFrame,
+    *,
+    category_max_ratio: float = CATEGORY_MAX_RATIO,
+    float32_decimals: int = FLOAT32_DECIMALS,
+    exclude: Iterable[str] = (),
+) -> pd.DataFrame:
+    """
+    Devuelve `df` con tipos compactos (no modifica el original).
+
+    `exclude` deja columnas intactas (p.ej. un monto que deba sumarse con
+    precisión completa aunque hoy quepa en float32).
+    """
+    if df is None or df.empty or df.columns.has_duplicates:
+        return df
+
+    exclude = set(exclude)
+    out: Dict[str, pd.Series] = {}
+    n = len(df)
+    for col in df.columns:
+        s = df[col]
+        if col in exclude:
+            out[col] = s
+            continue
+
+        if s.dtype == object:
+            sample = _first_valid(s)
+            if isinstance(sample, (Decimal, int, float)) and not isinstance(sample, bool):
+                s = pd.to_numeric(s, errors="coerce")
+            elif isinstance(sample, str):
+                if s.nunique(dropna=True) <= category_max_ratio * n:
+                    s = s.astype("category")
+                out[col] = s
+                continue
+            else:
+                # fechas, bytes, mezclas: sin cambios
+                out[col] = s
+                continue
+
+        if pd.api.types.is_bool_dtype(s.dtype):
+            out[col] = s
+        elif pd.api.types.is_integer_dtype(s.dtype):
+            out[col] = _to_nullable_int(s)
+        elif pd.api.types.is_float_dtype(s.dtype):
+            out[col] = _compact_float(s, col, float32_decimals)
+        else:
+            out[col] = s
+
+    return pd.DataFrame(out, index=df.index)
@@ -0,0 +1,293 @@
+"""
+Exportación de resultados de página a CSV / Parquet / XLSX, por chunks.
+
+El archivo se escribe a disco a medida que llegan los bloques, ya sea desde
+la caché (un DataFrame que la página ya tiene, recorrido con `frame_chunks`)
+o directamente desde MySQL (`mySQLHelper.iter_mysql_query`). Nunca se arma
+una segunda copia completa del resultado:
+- CSV: un `to_csv` por chunk, con encabezado solo en el primero;
+- Parquet: un row group por chunk (pyarrow.ParquetWriter);
+- XLSX: xlsxwriter en modo constant_memory (fila a fila).
+
+Uso en una página:
+
+    render_export(
+        lambda: frame_chunks(df_detalle),
+        key="export_detalle",
+        file_stem=f"posicionamiento_{fecha_str}",
+        signature=(id_competidor, fecha_str, ventana),
+    )
+"""
+import glob
+import io
+import os
+import tempfile
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, BinaryIO, Callable, Dict, Hashable, Iterable, Iterator, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from mysql.connector import Error as MySQLError
+
+from mySQLHelper import QueryCancelledError
+
+# Parquet (opcional)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# XLSX en modo streaming (opcional)
+try:
+    import xlsxwriter
+    XLSXWRITER_AVAILABLE = True
+except ImportError:
+    XLSXWRITER_AVAILABLE = False
+
+CHUNK_ROWS = 50_000
+# Límite de filas por hoja de Excel (incluye el encabezado)
+XLSX_MAX_ROWS = 1_048_576
+EXPORT_PREFIX = "chiper_export_"
+# Archivos temporales de exportación más viejos que esto se borran
+EXPORT_TTL_S = 6 * 3600
+
+
+def frame_chunks(df: pd.DataFrame, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Recorre un DataFrame ya en memoria en bloques de `chunk_rows` filas."""
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+# ======================================================
+# ESCRITORES
+# ======================================================
+def write_csv(chunks: Iterable[pd.DataFrame], fh: BinaryIO) -> int:
+    """CSV UTF-8 con BOM (Excel lo abre con tildes correctas). Retorna filas escritas."""
+    text = io.TextIOWrapper(fh, encoding="utf-8-sig", newline="")
+    rows = 0
+    try:
+        for chunk in chunks:
+            chunk.to_csv(text, header=rows == 0, index=False)
+            rows += len(chunk)
+        text.flush()
+    finally:
+        text.detach()
+    return rows
+
+
+def _parquet_schema(table: "pa.Table") -> "pa.Schema":
+    # Una columna toda NULL en el primer chunk llega como tipo null; se abre a string
+    fields = [
+        pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+        for f in table.schema
+    ]
+    return pa.schema(fields)
+
+
+def write_parquet(chunks: Iterable[pd.DataFrame], fh: BinaryIO) -> int:
+    """Un row group por chunk, con el esquema fijado por el primero."""
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("Exportar a Parquet requiere pyarrow.")
+    writer = None
+    rows = 0
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(fh, _parquet_schema(table))
+            if not table.schema.equals(writer.schema):
+                table = table.cast(writer.schema)
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def _cell(value: Any) -> Any:
+    """Valor nativo que xlsxwriter sabe escribir (None = celda vacía)."""
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, (str, int, float, Decimal, datetime, date)):
+        return value
+    return str(value)
+
+
+def write_xlsx(chunks: Iterable[pd.DataFrame], fh: BinaryIO, *, sheet_name: str = "datos") -> int:
+    """
+    XLSX fila a fila con constant_memory: la memoria no crece con las filas.
+    Al llegar al límite de Excel se continúa en una hoja nueva.
+    """
+    if not XLSXWRITER_AVAILABLE:
+        raise RuntimeError("Exportar a Excel requiere xlsxwriter.")
+    workbook = xlsxwriter.Workbook(fh, {
+        "constant_memory": True,
+        "default_date_format": "yyyy-mm-dd",
+        "strings_to_numbers": False,
+        "strings_to_formulas": False,
+        "strings_to_urls": False,
+    })
+    rows = 0
+    sheet = None
+    sheet_n = 0
+    row_idx = XLSX_MAX_ROWS
+    try:
+        for chunk in chunks:
+            header = [str(c) for c in chunk.columns]
+            for values in chunk.itertuples(index=False, name=None):
+                if row_idx >= XLSX_MAX_ROWS:
+                    sheet_n += 1
+                    sheet = workbook.add_worksheet(sheet_name if sheet_n == 1 else f"{sheet_name}_{sheet_n}")
+                    sheet.write_row(0, 0, header)
+                    row_idx = 1
+                sheet.write_row(row_idx, 0, [_cell(v) for v in values])
+                row_idx += 1
+            rows += len(chunk)
+        if sheet is None:
+            workbook.add_worksheet(sheet_name)
+    finally:
+        workbook.close()
+    return rows
+
+
+class ExportFormat(NamedTuple):
+    extension: str
+    mime: str
+    writer: Callable[[Iterable[pd.DataFrame], BinaryIO], int]
+
+
+def available_formats() -> Dict[str, ExportFormat]:
+    formats = {"CSV": ExportFormat("csv", "text/csv", write_csv)}
+    if PYARROW_AVAILABLE:
+        formats["Parquet"] = ExportFormat("parquet", "application/vnd.apache.parquet", write_parquet)
+    if XLSXWRITER_AVAILABLE:
+        formats["Excel (XLSX)"] = ExportFormat(
+            "xlsx",
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            write_xlsx,
+        )
+    return formats
+
+
+# ======================================================
+# ARCHIVOS TEMPORALES
+# ======================================================
+def _purge_old_exports() -> None:
+    limite = time.time() - EXPORT_TTL_S
+    for path in glob.glob(os.path.join(tempfile.gettempdir(), f"{EXPORT_PREFIX}*")):
+        try:
+            if os.path.getmtime(path) < limite:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def export_to_file(chunks: Iterable[pd.DataFrame], fmt: ExportFormat) -> Dict[str, Any]:
+    """Escribe los chunks a un archivo temporal. Retorna path, filas, bytes y segundos."""
+    _purge_old_exports()
+    t0 = time.perf_counter()
+    fd, path = tempfile.mkstemp(prefix=EXPORT_PREFIX, suffix=f".{fmt.extension}")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            rows = fmt.writer(chunks, fh)
+    except BaseException:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    return {
+        "path": path,
+        "rows": rows,
+        "bytes": os.path.getsize(path),
+        "seconds": time.perf_counter() - t0,
+    }
+
+
+# ======================================================
+# UI
+# ======================================================
+def render_export(
+    chunks_factory: Callable[[], Iterable[pd.DataFrame]],
+    *,
+    key: str,
+    file_stem: str,
+    signature: Hashable = None,
+    label: str = "Exportar",
+) -> None:
+    """
+    Selector de formato + "Preparar archivo" + botón de descarga.
+
+    El archivo solo se genera al pedirlo (no en cada rerun). `signature`
+    identifica los parámetros con que se generó: si cambian, el archivo
+    anterior deja de ofrecerse. Si la consulta de origen se cancela o falla
+    (iter_mysql_query relanza los errores) se muestra el error y no se
+    ofrece ningún archivo.
+    """
+    formats = available_formats()
+    state_key = f"{key}__archivo"
+    prev: Optional[Dict[str, Any]] = st.session_state.get(state_key)
+
+    c_fmt, c_prep, c_down = st.columns([2, 1, 1])
+    with c_fmt:
+        nombre_fmt = st.selectbox(f"{label}: formato", list(formats), key=f"{key}__fmt")
+    fmt = formats[nombre_fmt]
+
+    with c_prep:
+        st.write("")
+        preparar = st.button("Preparar archivo", key=f"{key}__prep")
+    if preparar:
+        if prev and os.path.exists(prev["path"]):
+            try:
+                os.remove(prev["path"])
+            except OSError:
+                pass
+        st.session_state.pop(state_key, None)
+        prev = None
+        try:
+            with st.spinner("Generando archivo..."):
+                info = export_to_file(chunks_factory(), fmt)
+        except QueryCancelledError as e:
+            st.error(f"La exportación fue cancelada ({e.reason}). Intente de nuevo o acote los parámetros.")
+        except MySQLError as e:
+            st.error(f"No se pudo generar el archivo: error de MySQL ({e}).")
+        else:
+            prev = {**info, "formato": nombre_fmt, "signature": signature}
+            st.session_state[state_key] = prev
+
+    vigente = (
+        prev is not None
+        and prev["formato"] == nombre_fmt
+        and prev["signature"] == signature
+        and os.path.exists(prev["path"])
+    )
+    with c_down:
+        st.write("")
+        if vigente:
+            with open(prev["path"], "rb") as fh:
+                st.download_button(
+                    "Descargar",
+                    data=fh,
+                    file_name=f"{file_stem}.{fmt.extension}",
+                    mime=fmt.mime,
+                    key=f"{key}__down",
+                )
+        else:
+            st.button("Descargar", key=f"{key}__down", disabled=True)
+    if vigente:
+        st.caption(
+            f"{prev['rows']:,} filas · {prev['bytes'] / (1024 * 1024):,.1f} MB · "
+            f"generado en {prev['seconds']:.1f} s"
+        )
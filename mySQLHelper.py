@@ -1,17 +1,79 @@
 import mysql.connector
 from mysql.connector import Error
-from typing import Iterable, List, Tuple, Dict, Optional, Callable, Any
+from typing import Iterable, Iterator, List, Tuple, Dict, Optional, Callable, Any, NamedTuple, Union
 import pandas as pd
 import numpy as np
 from tornado.httputil import parse_body_arguments
 from tqdm import tqdm
+import asyncio
+import json
+import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 import streamlit as st
 
-HOST = st.secrets["HOST"]
-USER = st.secrets["USER"]
-PASSWORD = st.secrets["PASSWORD"]
-DATABASE = st.secrets["DATABASE"]
+from dtypeHelper import compact_frame
+
+# API asyncio del conector (mysql-connector-python >= 9.x)
+try:
+    from mysql.connector import aio as mysql_aio
+    AIO_AVAILABLE = True
+except ImportError:
+    AIO_AVAILABLE = False
+
+from perfLog import (
+    SpanTimer,
+    configure_slow_query_log,
+    explain_enabled,
+    query_fingerprint,
+    record_event,
+    slow_query_threshold_ms,
+)
+
+_REQUIRED = object()
+
+
+def _setting(name: str, default: Any = _REQUIRED) -> Any:
+    """
+    Lee un parámetro de configuración. La variable de entorno CHIPER_<NAME>
+    tiene prioridad sobre st.secrets (así benchmarks y jobs pueden apuntar a
+    una base local sin tocar secrets.toml).
+    """
+    env = os.environ.get(f"CHIPER_{name}")
+    if env is not None:
+        return env
+    try:
+        return st.secrets[name]
+    except Exception:
+        if default is _REQUIRED:
+            raise
+        return default
+
+
+HOST = _setting("HOST")
+USER = _setting("USER")
+PASSWORD = _setting("PASSWORD")
+DATABASE = _setting("DATABASE")
+
+# Réplicas de lectura (opcionales): lista (o texto separado por comas) de "host" o "host:puerto"
+REPLICA_HOSTS = _setting("REPLICA_HOSTS", [])
+if isinstance(REPLICA_HOSTS, str):
+    REPLICA_HOSTS = [h.strip() for h in REPLICA_HOSTS.split(",") if h.strip()]
+else:
+    REPLICA_HOSTS = list(REPLICA_HOSTS)
+MAX_REPLICA_LAG_S = float(_setting("MAX_REPLICA_LAG_S", 30))
+# Tabla de heartbeat (estilo pt-heartbeat); si no se define se usa SHOW REPLICA STATUS
+REPLICA_HEARTBEAT_TABLE = _setting("REPLICA_HEARTBEAT_TABLE", None)
+
+# Slow-query log (JSONL rotativo) y captura automática de EXPLAIN
+configure_slow_query_log(
+    path=_setting("SLOW_QUERY_LOG", "slow_query_log.jsonl"),
+    threshold_ms=float(_setting("SLOW_QUERY_MS", 2000)),
+    explain=str(_setting("SLOW_QUERY_EXPLAIN", False)).lower() in ("1", "true", "yes"),
+)
 
 class MySQLBulkLoader:
     """
@@ -99,10 +161,13 @@ class MySQLBulkLoader:
         """
         good_rows_inserted = 0
         bad_rows_info: List[Dict[str, Any]] = []
+        attempts = 0
+        used_fallback = False
         # pending contiene pares (idx_local_en_batch, fila_tuple)
         pending = list(enumerate(batch))
 
         while pending:
+            attempts += 1
             try:
                 cursor.executemany(insert_sql, [row for (_, row) in pending])
                 connection.commit()
@@ -120,6 +185,7 @@ class MySQLBulkLoader:
                 m = re.search(r"at row (\d+)", str(e_batch))
                 if not m:
                     # fallback binario si no hay pista de fila
+                    used_fallback = True
                     pending = self._divide_and_conquer_fallback(
                         cursor=cursor,
                         connection=connection,
@@ -135,6 +201,7 @@ class MySQLBulkLoader:
 
                 if not (0 <= bad_idx_in_pending < len(pending)):
                     # índice inválido -> fallback binario
+                    used_fallback = True
                     pending = self._divide_and_conquer_fallback(
                         cursor=cursor,
                         connection=connection,
@@ -160,6 +227,8 @@ class MySQLBulkLoader:
         return {
             "good_rows_inserted": good_rows_inserted,
             "bad_rows_info": bad_rows_info,
+            "attempts": attempts,
+            "used_fallback": used_fallback,
         }
 
     def _divide_and_conquer_fallback(
@@ -232,6 +301,10 @@ class MySQLBulkLoader:
         batches_failed = 0
         bad_rows_global: List[Dict[str, Any]] = []
         running_row_start = 0
+        # costo del rescate (para benchmarks)
+        rescue_attempts = 0
+        fallback_batches = 0
+        rescue_s = 0.0
 
         for raw_batch in batch_iterable:
             prepared_batch = self._prepare_batch_rows(raw_batch, coerce_na_to_none)
@@ -256,6 +329,7 @@ class MySQLBulkLoader:
                     pass
 
                 # intento de rescate guiado
+                t_rescue = time.perf_counter()
                 rescue = self._rescue_batch_guided_by_error(
                     cursor=cursor,
                     connection=connection,
@@ -263,6 +337,9 @@ class MySQLBulkLoader:
                     batch=prepared_batch,
                     global_start_index=batch_start_idx,
                 )
+                rescue_s += time.perf_counter() - t_rescue
+                rescue_attempts += rescue["attempts"]
+                fallback_batches += int(rescue["used_fallback"])
 
                 good_n = rescue["good_rows_inserted"]
                 bad_list = rescue["bad_rows_info"]
@@ -294,6 +371,9 @@ class MySQLBulkLoader:
             "batches_ok": batches_ok,
             "batches_failed": batches_failed,
             "bad_rows": bad_rows_global,
+            "rescue_attempts": rescue_attempts,
+            "fallback_batches": fallback_batches,
+            "rescue_s": rescue_s,
         }
 
     # ---------- API pública ----------
@@ -392,6 +472,7 @@ class MySQLBulkLoader:
                 )
 
         stats = None
+        t_start = time.perf_counter()
 
         try:
             self._set_optimizations(cur, use_unsafe_optimizations)
@@ -437,7 +518,12 @@ class MySQLBulkLoader:
                 except Exception:
                     pass
 
-            self._set_optimizations(cur, use_unsafe_optimizations)
+            # restaurar chequeos de la sesión
+            if use_unsafe_optimizations:
+                try:
+                    self._set_optimizations(cur, False)
+                except Exception:
+                    pass
 
             try:
                 cur.close()
@@ -463,24 +549,439 @@ class MySQLBulkLoader:
         print(f"Tasa de éxito                : {success_pct:.4f}%")
         print(f"Batches OK / con error       : {stats['batches_ok']} / {stats['batches_failed']}")
 
+        stats["elapsed_s"] = time.perf_counter() - t_start
+        return stats
+
+def split_endpoint(endpoint: str, default_port: int = 3306) -> Tuple[str, int]:
+    """ "host:puerto" -> (host, puerto). Sin puerto usa default_port."""
+    host, sep, port = str(endpoint).rpartition(":")
+    if sep and port.isdigit():
+        return host, int(port)
+    return str(endpoint), default_port
+
+
 def my_default_bulk_loader() -> MySQLBulkLoader:
+    # Las escrituras van siempre al primario
+    host, port = split_endpoint(HOST)
     return MySQLBulkLoader(
-        host=HOST,
+        host=host,
         user=USER,
         password=PASSWORD,
         database=DATABASE,
+        port=port,
     )
 
+# ======================================================
+#   RUTEO A RÉPLICAS DE LECTURA
+# ======================================================
+DDL_HEARTBEAT = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id  TINYINT     NOT NULL PRIMARY KEY,
+    ts  DATETIME(6) NOT NULL
+);
+"""
+
+
+class ReplicaRouter:
+    """
+    Elige el endpoint de cada consulta:
+    - Escrituras -> primario.
+    - Lecturas  -> réplicas en round-robin, saltando las que tienen lag mayor
+      a `max_lag_s` o no responden. Si ninguna está sana, primario.
+
+    El lag se mide con la tabla de heartbeat (si se configura) o con
+    SHOW REPLICA STATUS, y se cachea `check_interval_s` segundos por réplica.
+    """
+
+    def __init__(
+        self,
+        primary: str,
+        replicas: Iterable[str],
+        *,
+        user: str,
+        password: str,
+        database: str,
+        max_lag_s: float = 30.0,
+        heartbeat_table: Optional[str] = None,
+        check_interval_s: float = 10.0,
+        connect_timeout: int = 3,
+    ):
+        self.primary = split_endpoint(primary)
+        self.replicas = [split_endpoint(r) for r in replicas]
+        self._auth = {"user": user, "password": password, "database": database}
+        self.max_lag_s = max_lag_s
+        self.heartbeat_table = heartbeat_table
+        self.check_interval_s = check_interval_s
+        self.connect_timeout = connect_timeout
+
+        self._lock = threading.Lock()
+        self._rr = 0
+        # endpoint -> (lag_s | None, checked_at)
+        self._lag_cache: Dict[Tuple[str, int], Tuple[Optional[float], float]] = {}
+
+    # ---------- Medición de lag ----------
+    def _measure_lag(self, endpoint: Tuple[str, int]) -> Optional[float]:
+        """Lag en segundos, o None si la réplica no responde / no replica."""
+        cnx = None
+        try:
+            cnx = mysql.connector.connect(
+                host=endpoint[0],
+                port=endpoint[1],
+                connection_timeout=self.connect_timeout,
+                **self._auth,
+            )
+            cur = cnx.cursor(dictionary=True)
+
+            if self.heartbeat_table:
+                cur.execute(
+                    f"SELECT TIMESTAMPDIFF(MICROSECOND, MAX(ts), UTC_TIMESTAMP(6)) / 1000000 AS lag_s "
+                    f"FROM {self.heartbeat_table}"
+                )
+                row = cur.fetchone()
+                lag = row["lag_s"] if row else None
+                return float(lag) if lag is not None else None
+
+            try:
+                cur.execute("SHOW REPLICA STATUS")
+            except Error:
+                cur.execute("SHOW SLAVE STATUS")  # MySQL < 8.0.22
+            row = cur.fetchone()
+            if not row:
+                return None
+            lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+            return float(lag) if lag is not None else None
+
+        except Error:
+            return None
+        finally:
+            if cnx:
+                try:
+                    cnx.close()
+                except Exception:
+                    pass
+
+    def replica_lag(self, endpoint: Tuple[str, int]) -> Optional[float]:
+        now = time.time()
+        with self._lock:
+            cached = self._lag_cache.get(endpoint)
+        if cached is not None and now - cached[1] < self.check_interval_s:
+            return cached[0]
+
+        lag = self._measure_lag(endpoint)
+        with self._lock:
+            self._lag_cache[endpoint] = (lag, now)
+        return lag
+
+    def _healthy(self, endpoint: Tuple[str, int]) -> bool:
+        lag = self.replica_lag(endpoint)
+        return lag is not None and lag <= self.max_lag_s
+
+    # ---------- Ruteo ----------
+    def endpoint_for(self, *, read: bool) -> Tuple[str, int]:
+        if not read or not self.replicas:
+            return self.primary
+
+        with self._lock:
+            start = self._rr
+            self._rr = (self._rr + 1) % len(self.replicas)
+
+        for i in range(len(self.replicas)):
+            candidate = self.replicas[(start + i) % len(self.replicas)]
+            if self._healthy(candidate):
+                return candidate
+
+        return self.primary
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Estado de cada réplica (para diagnóstico)."""
+        out = []
+        for ep in self.replicas:
+            lag = self.replica_lag(ep)
+            out.append({
+                "endpoint": f"{ep[0]}:{ep[1]}",
+                "lag_s": lag,
+                "healthy": lag is not None and lag <= self.max_lag_s,
+            })
+        return out
+
+
+_default_router = ReplicaRouter(
+    HOST,
+    REPLICA_HOSTS,
+    user=USER,
+    password=PASSWORD,
+    database=DATABASE,
+    max_lag_s=MAX_REPLICA_LAG_S,
+    heartbeat_table=REPLICA_HEARTBEAT_TABLE,
+)
+
+
+def get_replica_router() -> ReplicaRouter:
+    return _default_router
+
+
+def write_heartbeat(table: Optional[str] = None) -> None:
+    """
+    Actualiza la fila de heartbeat en el primario (llamar periódicamente,
+    p.ej. desde un cron o al final de cada carga).
+    """
+    table = table or REPLICA_HEARTBEAT_TABLE or "heartbeat"
+    execute_mysql_query(DDL_HEARTBEAT.format(table=table), fetch=False)
+    execute_mysql_query(
+        f"INSERT INTO {table} (id, ts) VALUES (1, UTC_TIMESTAMP(6)) "
+        f"ON DUPLICATE KEY UPDATE ts = VALUES(ts);",
+        fetch=False,
+    )
+
+# ======================================================
+#   CONSULTAS EN VUELO, TIMEOUTS Y CANCELACIÓN
+# ======================================================
+# Códigos de error MySQL
+ER_QUERY_INTERRUPTED = 1317         # KILL QUERY
+ER_QUERY_TIMEOUT = 3024             # MAX_EXECUTION_TIME excedido
+
+
+class QueryCancelledError(Exception):
+    """
+    La consulta no terminó: fue reemplazada por un rerun más nuevo del mismo
+    loader (reason="superseded") o excedió su presupuesto MAX_EXECUTION_TIME
+    (reason="timeout").
+
+    Se lanza en vez de devolver None para que st.cache_data NO guarde el
+    resultado de una consulta cancelada.
+    """
+
+    def __init__(self, message: str, *, reason: str, loader: Optional[str] = None):
+        super().__init__(message)
+        self.reason = reason
+        self.loader = loader
+
+
+_inflight_lock = threading.Lock()
+# (session_id, loader, spec_key) -> {"connection_id", "host", "port", "user", "password", "database", "started"}
+# spec_key: nombre de la consulta dentro de un gather_queries (None fuera de él), para
+# que dos QuerySpec del mismo loader en un mismo gather no se cancelen entre sí
+InflightKey = Tuple[str, str, Optional[str]]
+_inflight: Dict[InflightKey, Dict[str, Any]] = {}
+# connection_id de consultas que matamos por haber sido reemplazadas
+_superseded_ids: set = set()
+
+_query_counters: Dict[str, int] = {
+    "executed": 0,
+    "errors": 0,
+    "timeouts": 0,
+    "cancelled_superseded": 0,
+    "kill_sent": 0,
+    "kill_failed": 0,
+}
+
+
+def _count(name: str, n: int = 1) -> None:
+    with _inflight_lock:
+        _query_counters[name] = _query_counters.get(name, 0) + n
+
+
+def get_query_counters() -> Dict[str, int]:
+    """Contadores de consultas (ejecutadas, errores, timeouts, canceladas) del proceso."""
+    with _inflight_lock:
+        return dict(_query_counters)
+
+
+def get_inflight_queries() -> List[Dict[str, Any]]:
+    """Consultas en vuelo por sesión/loader (sin credenciales)."""
+    now = time.time()
+    with _inflight_lock:
+        return [
+            {
+                "session_id": sid,
+                "loader": loader if spec_key is None else f"{loader}[{spec_key}]",
+                "connection_id": info["connection_id"],
+                "host": f"{info['host']}:{info['port']}",
+                "running_s": now - info["started"],
+            }
+            for (sid, loader, spec_key), info in _inflight.items()
+        ]
+
+
+def _current_session_id() -> Optional[str]:
+    """Id de la sesión Streamlit del hilo actual (None fuera de una sesión)."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        return ctx.session_id if ctx is not None else None
+    except Exception:
+        return None
+
+
+def _kill_query(info: Dict[str, Any]) -> None:
+    """Envía KILL QUERY por una conexión aparte. Nunca lanza."""
+    killer = None
+    try:
+        killer = mysql.connector.connect(
+            host=info["host"],
+            port=info["port"],
+            user=info["user"],
+            password=info["password"],
+            database=info["database"],
+            connection_timeout=5,
+        )
+        kcur = killer.cursor()
+        kcur.execute(f"KILL QUERY {int(info['connection_id'])}")
+        kcur.close()
+        _count("kill_sent")
+    except Error as e:
+        # La consulta pudo terminar justo antes; no es grave.
+        _count("kill_failed")
+        print(f"[WARN] KILL QUERY {info.get('connection_id')} -> {e}")
+    finally:
+        if killer:
+            try:
+                killer.close()
+            except Exception:
+                pass
+
+
+def _register_inflight(key: InflightKey, info: Dict[str, Any]) -> None:
+    """Registra la consulta y cancela la anterior de la misma (sesión, loader, spec), si sigue viva."""
+    with _inflight_lock:
+        previous = _inflight.get(key)
+        _inflight[key] = info
+        if previous is not None:
+            _superseded_ids.add(previous["connection_id"])
+
+    if previous is not None:
+        _kill_query(previous)
+
+
+def _unregister_inflight(key: InflightKey, connection_id: int) -> None:
+    with _inflight_lock:
+        current = _inflight.get(key)
+        if current is not None and current["connection_id"] == connection_id:
+            del _inflight[key]
+
+
+def _capture_explain(
+    query: str,
+    params: Optional[Tuple[Any, ...]],
+    *,
+    host: str,
+    port: int,
+    user: str,
+    password: str,
+    database: str,
+) -> Optional[Any]:
+    """EXPLAIN FORMAT=JSON de una consulta de lectura lenta. Nunca lanza."""
+    if not query.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    cnx = None
+    try:
+        cnx = mysql.connector.connect(
+            host=host, port=port, user=user, password=password, database=database,
+            connection_timeout=5,
+        )
+        cur = cnx.cursor()
+        cur.execute("EXPLAIN FORMAT=JSON " + query.strip().rstrip(";"), params or ())
+        row = cur.fetchone()
+        cur.close()
+        if not row:
+            return None
+        try:
+            return json.loads(row[0])
+        except (TypeError, ValueError):
+            return row[0]
+    except Error as e:
+        return {"error": str(e)}
+    finally:
+        if cnx:
+            try:
+                cnx.close()
+            except Exception:
+                pass
+
+
+def _handle_query_error(
+    e: Error,
+    event: Dict[str, Any],
+    *,
+    connection_id: Optional[int],
+    loader: Optional[str],
+    max_execution_ms: Optional[int],
+) -> None:
+    """
+    Clasifica un error de MySQL en `event`. Lanza QueryCancelledError si fue
+    timeout o reemplazo por rerun; en otro caso lo cuenta y lo imprime.
+    """
+    errno = getattr(e, "errno", None)
+    event["status"] = "error"
+    event["error"] = str(e)
+
+    if errno == ER_QUERY_TIMEOUT:
+        event["status"] = "timeout"
+        _count("timeouts")
+        raise QueryCancelledError(
+            f"La consulta excedió el presupuesto de {max_execution_ms} ms",
+            reason="timeout",
+            loader=loader,
+        ) from e
+
+    if errno == ER_QUERY_INTERRUPTED and connection_id is not None:
+        with _inflight_lock:
+            superseded = connection_id in _superseded_ids
+            _superseded_ids.discard(connection_id)
+        if superseded:
+            event["status"] = "superseded"
+            _count("cancelled_superseded")
+            raise QueryCancelledError(
+                "La consulta fue cancelada por un rerun más reciente",
+                reason="superseded",
+                loader=loader,
+            ) from e
+
+    _count("errors")
+    print(f"[ERROR] MySQL -> {e}")
+
+
+def _close_event(
+    event: Dict[str, Any],
+    timer: SpanTimer,
+    query: str,
+    params: Optional[Tuple[Any, ...]],
+    *,
+    explain: bool,
+    host: str,
+    port: int,
+    user: str,
+    password: str,
+    database: str,
+) -> None:
+    """Completa tiempos (y SQL/EXPLAIN si fue lenta o falló) y registra el evento."""
+    event["total_ms"] = timer.total_ms
+    event["spans_ms"] = timer.spans
+    slow = event["total_ms"] >= slow_query_threshold_ms()
+    if slow or event["status"] != "ok":
+        event["query"] = query[:4000]
+        event["params"] = repr(params)[:1000] if params is not None else None
+        if slow and event["status"] == "ok" and explain and explain_enabled():
+            event["explain"] = _capture_explain(
+                query, params,
+                host=host, port=port, user=user, password=password, database=database,
+            )
+    record_event(event)
+
+
 def execute_mysql_query(
     query: str,
     params: Optional[Tuple[Any, ...]] = None,
     *,
-    host: str = HOST,
+    host: Optional[str] = None,
     user: str = USER,
     password: str = PASSWORD,
     database: str = DATABASE,
     fetch: bool = True,
     many: bool = False,
+    loader: Optional[str] = None,
+    max_execution_ms: Optional[int] = None,
+    compact: bool = False,
 ) -> Optional[pd.DataFrame]:
     """
     Ejecuta una consulta SQL sobre MySQL y devuelve los resultados (si fetch=True).
@@ -491,46 +992,211 @@ def execute_mysql_query(
         Sentencia SQL (puede incluir placeholders %s).
     params : tuple | None
         Parámetros a insertar en la consulta.
-    host, user, password, database : str
+    host : str | None
+        Endpoint "host" o "host:puerto". Si es None se rutea: lecturas
+        (fetch=True) a una réplica sana, escrituras al primario.
+    user, password, database : str
         Configuración de conexión (por defecto, pricing_prod).
     fetch : bool
         Si es True, devuelve los resultados de SELECT; si False, solo ejecuta.
     many : bool
         Si es True, usa executemany (para múltiples filas con el mismo query).
+    loader : str | None
+        Nombre del loader que llama. Si se indica y hay sesión Streamlit, la
+        consulta queda registrada como "en vuelo" para esa sesión; si un
+        rerun posterior vuelve a llamar al mismo loader, la anterior se
+        cancela con KILL QUERY.
+    max_execution_ms : int | None
+        Presupuesto de tiempo (MAX_EXECUTION_TIME de la sesión, solo aplica
+        a SELECT). Al excederse se lanza QueryCancelledError(reason="timeout").
+    compact : bool
+        Si es True, el DataFrame se arma con tipos compactos (category,
+        float32 solo en razones, Int32 nullable; ver dtypeHelper.compact_frame). Pensado
+        para resultados que se retienen en caché.
+
+    Cada llamada se mide por etapas (connect, execute, fetch, dataframe) con
+    filas y bytes, y alimenta los percentiles por `loader` (perfLog). Si
+    supera SLOW_QUERY_MS o falla, se escribe al slow-query log, con EXPLAIN
+    si SLOW_QUERY_EXPLAIN está activo.
 
     Retorna
     -------
     list[tuple] | None
         Resultados de la consulta si fetch=True, o None si no corresponde.
+
+    Lanza
+    -----
+    QueryCancelledError
+        Si la consulta fue reemplazada por un rerun o excedió su presupuesto.
     """
     cnx = None
     cur = None
+    inflight_key = None
+    connection_id = None
+
+    timer = SpanTimer()
+    event: Dict[str, Any] = {
+        "name": loader or "anon",
+        "kind": "query",
+        "status": "ok",
+        "fingerprint": query_fingerprint(query),
+        "rows": None,
+        "bytes": None,
+    }
+
+    if host is None:
+        host_name, port = _default_router.endpoint_for(read=fetch and not many)
+    else:
+        host_name, port = split_endpoint(host)
+    event["endpoint"] = f"{host_name}:{port}"
 
     try:
-        cnx = mysql.connector.connect(
-            host=host, user=user, password=password, database=database
-        )
+        with timer.span("connect"):
+            cnx = mysql.connector.connect(
+                host=host_name, port=port, user=user, password=password, database=database
+            )
         cur = cnx.cursor()
-
-        if many and isinstance(params, list):
-            cur.executemany(query, params)
-        else:
-            cur.execute(query, params or ())
+        connection_id = cnx.connection_id
+
+        if max_execution_ms:
+            cur.execute("SET SESSION MAX_EXECUTION_TIME = %s", (int(max_execution_ms),))
+
+        session_id = _current_session_id() if loader else None
+        if session_id is not None:
+            inflight_key = (session_id, loader, None)
+            _register_inflight(inflight_key, {
+                "connection_id": connection_id,
+                "host": host_name,
+                "port": port,
+                "user": user,
+                "password": password,
+                "database": database,
+                "started": time.time(),
+            })
+
+        with timer.span("execute"):
+            if many and isinstance(params, list):
+                cur.executemany(query, params)
+            else:
+                cur.execute(query, params or ())
 
         if fetch:
-            rows = cur.fetchall()
-            cols = [desc[0] for desc in cur.description] if cur.description else []
-            df = pd.DataFrame(rows, columns=cols)
+            with timer.span("fetch"):
+                rows = cur.fetchall()
+            with timer.span("dataframe"):
+                cols = [desc[0] for desc in cur.description] if cur.description else []
+                df = pd.DataFrame(rows, columns=cols)
+                if compact:
+                    df = compact_frame(df)
+            event["rows"] = len(df)
+            event["bytes"] = int(df.memory_usage(deep=True).sum())
+            _count("executed")
             return df
         else:
-            cnx.commit()
+            with timer.span("commit"):
+                cnx.commit()
+            event["rows"] = cur.rowcount
+            _count("executed")
             return None
 
     except Error as e:
-        print(f"[ERROR] MySQL -> {e}")
+        _handle_query_error(e, event, connection_id=connection_id, loader=loader,
+                            max_execution_ms=max_execution_ms)
+        return None
+
+    finally:
+        _close_event(
+            event, timer, query, params,
+            explain=fetch and not many, host=host_name, port=port, user=user, password=password, database=database,
+        )
+
+        if inflight_key is not None and connection_id is not None:
+            _unregister_inflight(inflight_key, connection_id)
+            with _inflight_lock:
+                _superseded_ids.discard(connection_id)
+        if cur:
+            try:
+                cur.close()
+            except Exception:
+                pass
+        if cnx:
+            try:
+                cnx.close()
+            except Exception:
+                pass
+
+
+def execute_mysql_transaction(
+    statements: List[Tuple[str, Union[None, Tuple[Any, ...], List[Tuple[Any, ...]]]]],
+    *,
+    host: Optional[str] = None,
+    user: str = USER,
+    password: str = PASSWORD,
+    database: str = DATABASE,
+    loader: Optional[str] = None,
+) -> Optional[List[Dict[str, Optional[int]]]]:
+    """
+    Ejecuta varias sentencias de escritura en UNA transacción (misma
+    conexión; commit al final, rollback si alguna falla). Si los params de
+    una sentencia son una lista de tuplas, se usa executemany.
+
+    Retorna una lista con {"rowcount", "lastrowid"} por sentencia, o None
+    si la transacción falló (el error queda en el slow-query log).
+    """
+    cnx = None
+    cur = None
+    timer = SpanTimer()
+    query = ";\n".join(q for q, _ in statements)
+    event: Dict[str, Any] = {
+        "name": loader or "anon",
+        "kind": "transaction",
+        "status": "ok",
+        "fingerprint": query_fingerprint(query),
+        "rows": None,
+        "bytes": None,
+    }
+
+    if host is None:
+        host_name, port = _default_router.endpoint_for(read=False)
+    else:
+        host_name, port = split_endpoint(host)
+    event["endpoint"] = f"{host_name}:{port}"
+
+    try:
+        with timer.span("connect"):
+            cnx = mysql.connector.connect(
+                host=host_name, port=port, user=user, password=password, database=database
+            )
+        cur = cnx.cursor()
+        results: List[Dict[str, Optional[int]]] = []
+        with timer.span("execute"):
+            cnx.start_transaction()
+            for stmt, params in statements:
+                if isinstance(params, list):
+                    cur.executemany(stmt, params)
+                else:
+                    cur.execute(stmt, params or ())
+                results.append({"rowcount": cur.rowcount, "lastrowid": cur.lastrowid})
+        with timer.span("commit"):
+            cnx.commit()
+        event["rows"] = sum(max(r["rowcount"] or 0, 0) for r in results)
+        _count("executed")
+        return results
+
+    except Error as e:
+        if cnx is not None:
+            try:
+                cnx.rollback()
+            except Exception:
+                pass
+        _handle_query_error(e, event, connection_id=None, loader=loader, max_execution_ms=None)
         return None
 
     finally:
+        _close_event(
+            event, timer, query, None,
+            explain=False, host=host_name, port=port, user=user, password=password, database=database,
+        )
         if cur:
             try:
                 cur.close()
@@ -541,3 +1207,374 @@ def execute_mysql_query(
                 cnx.close()
             except Exception:
                 pass
+
+
+def iter_mysql_query(
+    query: str,
+    params: Optional[Tuple[Any, ...]] = None,
+    *,
+    chunk_rows: int = 50_000,
+    host: Optional[str] = None,
+    user: str = USER,
+    password: str = PASSWORD,
+    database: str = DATABASE,
+    loader: Optional[str] = None,
+    max_execution_ms: Optional[int] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Lectura en streaming: ejecuta `query` con un cursor sin buffer y entrega
+    DataFrames de hasta `chunk_rows` filas (fetchmany), sin armar nunca el
+    resultado completo en memoria. Pensado para exportaciones grandes.
+
+    Misma instrumentación que execute_mysql_query (spans, slow-query log,
+    registro en vuelo por `loader`). A diferencia de esta, un error de MySQL
+    se relanza: un archivo exportado a medias no debe pasar por completo.
+
+        for chunk in iter_mysql_query(sql, chunk_rows=20_000):
+            writer.write(chunk)
+    """
+    cnx = None
+    cur = None
+    inflight_key = None
+    connection_id = None
+
+    timer = SpanTimer()
+    event: Dict[str, Any] = {
+        "name": loader or "anon",
+        "kind": "stream",
+        "status": "ok",
+        "fingerprint": query_fingerprint(query),
+        "rows": 0,
+        "bytes": 0,
+        "chunks": 0,
+    }
+
+    if host is None:
+        host_name, port = _default_router.endpoint_for(read=True)
+    else:
+        host_name, port = split_endpoint(host)
+    event["endpoint"] = f"{host_name}:{port}"
+
+    try:
+        with timer.span("connect"):
+            cnx = mysql.connector.connect(
+                host=host_name, port=port, user=user, password=password, database=database
+            )
+        cur = cnx.cursor()
+        connection_id = cnx.connection_id
+
+        if max_execution_ms:
+            cur.execute("SET SESSION MAX_EXECUTION_TIME = %s", (int(max_execution_ms),))
+
+        session_id = _current_session_id() if loader else None
+        if session_id is not None:
+            inflight_key = (session_id, loader, None)
+            _register_inflight(inflight_key, {
+                "connection_id": connection_id,
+                "host": host_name,
+                "port": port,
+                "user": user,
+                "password": password,
+                "database": database,
+                "started": time.time(),
+            })
+
+        with timer.span("execute"):
+            cur.execute(query, params or ())
+        cols = [desc[0] for desc in cur.description] if cur.description else []
+
+        while True:
+            with timer.span("fetch"):
+                rows = cur.fetchmany(chunk_rows)
+            if not rows:
+                break
+            with timer.span("dataframe"):
+                df = pd.DataFrame(rows, columns=cols)
+            event["rows"] += len(df)
+            event["bytes"] += int(df.memory_usage(deep=True).sum())
+            event["chunks"] += 1
+            yield df
+        _count("executed")
+
+    except Error as e:
+        _handle_query_error(e, event, connection_id=connection_id, loader=loader,
+                            max_execution_ms=max_execution_ms)
+        raise
+
+    finally:
+        _close_event(
+            event, timer, query, params,
+            explain=False, host=host_name, port=port, user=user, password=password, database=database,
+        )
+        if inflight_key is not None and connection_id is not None:
+            _unregister_inflight(inflight_key, connection_id)
+            with _inflight_lock:
+                _superseded_ids.discard(connection_id)
+        if cur:
+            try:
+                cur.close()
+            except Exception:
+                # Cursor sin buffer cerrado antes de leer todo (generador abandonado)
+                pass
+        if cnx:
+            try:
+                cnx.close()
+            except Exception:
+                pass
+
+
+# ======================================================
+#   CONSULTAS CONCURRENTES (asyncio)
+# ======================================================
+class QuerySpec(NamedTuple):
+    """Una consulta de lectura dentro de un fan-out (ver run_queries_concurrently)."""
+    query: str
+    params: Optional[Tuple[Any, ...]] = None
+    loader: Optional[str] = None
+    max_execution_ms: Optional[int] = None
+    host: Optional[str] = None
+    compact: bool = False
+
+
+class AsyncConnectionPool:
+    """
+    Pool de conexiones asyncio a UN endpoint, vivo durante un fan-out.
+    Abre conexiones a demanda hasta `size` y las reutiliza entre consultas.
+    """
+
+    def __init__(self, host: str, port: int, *, user: str, password: str, database: str, size: int):
+        self.host, self.port = host, port
+        self._cfg = {"host": host, "port": port, "user": user, "password": password, "database": database}
+        self._slots = asyncio.Semaphore(size)
+        self._idle: List[Any] = []
+        self._all: List[Any] = []
+
+    @asynccontextmanager
+    async def acquire(self, timer: Optional[SpanTimer] = None):
+        async with self._slots:
+            if self._idle:
+                cnx = self._idle.pop()
+            else:
+                if timer is not None:
+                    with timer.span("connect"):
+                        cnx = await mysql_aio.connect(**self._cfg)
+                else:
+                    cnx = await mysql_aio.connect(**self._cfg)
+                self._all.append(cnx)
+            ok = False
+            try:
+                yield cnx
+                ok = True
+            finally:
+                if ok:
+                    self._idle.append(cnx)
+                else:
+                    # Tras un error la conexión puede quedar en mal estado: se descarta
+                    self._all.remove(cnx)
+                    try:
+                        await cnx.close()
+                    except Exception:
+                        pass
+
+    async def close(self) -> None:
+        for cnx in self._all:
+            try:
+                await cnx.close()
+            except Exception:
+                pass
+        self._all.clear()
+        self._idle.clear()
+
+
+async def execute_mysql_query_async(
+    spec: QuerySpec,
+    pool: AsyncConnectionPool,
+    *,
+    user: str = USER,
+    password: str = PASSWORD,
+    database: str = DATABASE,
+    session_id: Optional[str] = None,
+    spec_key: Optional[str] = None,
+) -> Optional[pd.DataFrame]:
+    """
+    Versión asyncio de execute_mysql_query para lecturas (fetch=True) sobre
+    una conexión del `pool`. Mismas garantías: spans y slow-query log,
+    MAX_EXECUTION_TIME, registro en vuelo por (sesión, loader, spec_key) y
+    QueryCancelledError en timeout / reemplazo; None ante otros errores.
+    """
+    query, params, loader, max_execution_ms = spec.query, spec.params, spec.loader, spec.max_execution_ms
+    host_name, port = pool.host, pool.port
+    inflight_key = None
+    connection_id = None
+
+    timer = SpanTimer()
+    event: Dict[str, Any] = {
+        "name": loader or "anon",
+        "kind": "query",
+        "status": "ok",
+        "fingerprint": query_fingerprint(query),
+        "rows": None,
+        "bytes": None,
+        "endpoint": f"{host_name}:{port}",
+        "async": True,
+    }
+
+    try:
+        async with pool.acquire(timer) as cnx:
+            cur = await cnx.cursor()
+            try:
+                connection_id = cnx.connection_id
+                # Conexión reutilizada: siempre se fija el presupuesto (0 = sin límite)
+                await cur.execute("SET SESSION MAX_EXECUTION_TIME = %s", (int(max_execution_ms or 0),))
+
+                if loader and session_id is not None:
+                    inflight_key = (session_id, loader, spec_key)
+                    _register_inflight(inflight_key, {
+                        "connection_id": connection_id,
+                        "host": host_name,
+                        "port": port,
+                        "user": user,
+                        "password": password,
+                        "database": database,
+                        "started": time.time(),
+                    })
+
+                with timer.span("execute"):
+                    await cur.execute(query, params or ())
+                with timer.span("fetch"):
+                    rows = await cur.fetchall()
+                with timer.span("dataframe"):
+                    cols = [desc[0] for desc in cur.description] if cur.description else []
+                    df = pd.DataFrame(rows, columns=cols)
+                    if spec.compact:
+                        df = compact_frame(df)
+            finally:
+                try:
+                    await cur.close()
+                except Exception:
+                    pass
+
+        event["rows"] = len(df)
+        event["bytes"] = int(df.memory_usage(deep=True).sum())
+        _count("executed")
+        return df
+
+    except Error as e:
+        _handle_query_error(e, event, connection_id=connection_id, loader=loader,
+                            max_execution_ms=max_execution_ms)
+        return None
+
+    finally:
+        _close_event(
+            event, timer, query, params,
+            explain=True, host=host_name, port=port, user=user, password=password, database=database,
+        )
+        if inflight_key is not None and connection_id is not None:
+            _unregister_inflight(inflight_key, connection_id)
+            with _inflight_lock:
+                _superseded_ids.discard(connection_id)
+
+
+async def gather_queries(
+    specs: Dict[str, Union[str, QuerySpec]],
+    *,
+    max_concurrency: int = 4,
+    session_id: Optional[str] = None,
+) -> Dict[str, Optional[pd.DataFrame]]:
+    """
+    Ejecuta varias lecturas independientes a la vez (hasta `max_concurrency`
+    conexiones por endpoint). Sin `host`, cada consulta se rutea como
+    lectura (réplica sana o primario).
+
+    Si alguna consulta es cancelada (QueryCancelledError) se cancelan las
+    demás y se propaga el error. Cada consulta se registra en vuelo con su
+    clave en `specs`: solo la reemplaza la misma clave de un rerun posterior.
+    """
+    specs = {k: (QuerySpec(v) if isinstance(v, str) else v) for k, v in specs.items()}
+    pools: Dict[Tuple[str, int], AsyncConnectionPool] = {}
+
+    def pool_for(spec: QuerySpec) -> AsyncConnectionPool:
+        ep = split_endpoint(spec.host) if spec.host else _default_router.endpoint_for(read=True)
+        if ep not in pools:
+            pools[ep] = AsyncConnectionPool(
+                ep[0], ep[1], user=USER, password=PASSWORD, database=DATABASE, size=max_concurrency
+            )
+        return pools[ep]
+
+    try:
+        tasks = {
+            name: asyncio.ensure_future(
+                execute_mysql_query_async(spec, pool_for(spec), session_id=session_id, spec_key=name)
+            )
+            for name, spec in specs.items()
+        }
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for t in tasks.values():
+                t.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        return {name: t.result() for name, t in tasks.items()}
+    finally:
+        for pool in pools.values():
+            await pool.close()
+
+
+def _gather_with_threads(
+    specs: Dict[str, Union[str, QuerySpec]],
+    *,
+    max_concurrency: int,
+) -> Dict[str, Optional[pd.DataFrame]]:
+    """Respaldo sin mysql.connector.aio: un hilo por consulta con execute_mysql_query."""
+    specs = {k: (QuerySpec(v) if isinstance(v, str) else v) for k, v in specs.items()}
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="mysql-fanout") as ex:
+        futures = {
+            name: ex.submit(
+                execute_mysql_query,
+                spec.query,
+                spec.params,
+                host=spec.host,
+                loader=spec.loader,
+                max_execution_ms=spec.max_execution_ms,
+                compact=spec.compact,
+            )
+            for name, spec in specs.items()
+        }
+        return {name: f.result() for name, f in futures.items()}
+
+
+def run_queries_concurrently(
+    specs: Dict[str, Union[str, QuerySpec]],
+    *,
+    max_concurrency: int = 4,
+) -> Dict[str, Optional[pd.DataFrame]]:
+    """
+    Envoltorio síncrono para scripts de Streamlit: la latencia total es la de
+    la consulta más lenta y no la suma.
+
+        res = run_queries_concurrently({
+            "skus": QuerySpec(sql_a, loader="pos_skus"),
+            "total": QuerySpec(sql_b, loader="pos_total"),
+        })
+        df_skus, df_total = res["skus"], res["total"]
+
+    Usa mysql.connector.aio si está disponible; si no, hilos.
+    """
+    if not specs:
+        return {}
+    if not AIO_AVAILABLE:
+        return _gather_with_threads(specs, max_concurrency=max_concurrency)
+
+    # El registro "en vuelo" necesita la sesión del hilo que llama
+    session_id = _current_session_id()
+    coro_fn = lambda: gather_queries(specs, max_concurrency=max_concurrency, session_id=session_id)
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro_fn())
+
+    # Ya hay un loop corriendo en este hilo: se usa uno propio en otro hilo
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="mysql-aio") as ex:
+        return ex.submit(lambda: asyncio.run(coro_fn())).result()
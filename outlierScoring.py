@@ -0,0 +1,285 @@
+"""
+Score estadístico de outliers para precio_competidor, calculado al cargar.
+
+Para cada serie (id_competidor, id_sku) se mantiene una ventana con los
+últimos VENTANA_OBS precios efectivos (COALESCE(descuento, lleno)). Cada
+registro se evalúa contra la ventana ANTERIOR a él:
+
+    score = 0.6745 * (precio - mediana) / MAD
+
+(z robusto de Iglesias-Hoaglin; |score| > 3.5 es el corte habitual) y
+recién después entra a la ventana. Así un precio anómalo no se tapa a sí
+mismo y el score no depende de que Chiper haya vendido ese día.
+
+Cada corrida repuntúa por rango de fechas (por defecto los últimos
+DIAS_REPUNTAJE días): así entran los precios corregidos en el lugar, los
+upserts y las cargas tardías con ids menores, que un watermark por id no ve.
+La ventana de cada serie al comienzo del rango se reconstruye con sus
+últimos VENTANA_OBS precios ya puntuados antes del rango (la tabla de
+scores es la historia), de modo que lo que sale a cuarentena deja de
+contar: quarantineHelper borra los scores de las series afectadas desde su
+primer día movido y pide repuntuar desde ahí.
+
+Se procesa por series completas, en chunks; cada chunk reemplaza los
+scores de sus series en el rango en una misma transacción (si el job se
+corta, se relanza con el mismo rango).
+
+    python batchJobs.py scoring                        # tras la carga diaria
+    python batchJobs.py scoring --desde 2025-01-01     # repuntúa desde esa fecha
+    python batchJobs.py scoring --reset                # recalcula todo desde cero
+"""
+from collections import deque
+from datetime import date, timedelta
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from mySQLHelper import HOST, execute_mysql_query, execute_mysql_transaction, iter_mysql_query
+
+SCORE_TABLE = "precio_competidor_score"
+
+# Observaciones por ventana y mínimo para emitir score
+VENTANA_OBS = 30
+MIN_OBS = 5
+# Piso del MAD relativo a la mediana (series con precio constante: MAD = 0)
+MAD_MIN_REL = 0.01
+# Umbral sugerido de |score| en la página
+SCORE_UMBRAL_DEFAULT = 3.5
+
+# Días que repuntúa cada corrida diaria (correcciones y cargas tardías)
+DIAS_REPUNTAJE = 7
+
+CHUNK_ROWS = 20_000
+# Series por consulta al reconstruir ventanas
+CHUNK_SERIES = 500
+
+Serie = Tuple[int, int]
+
+# ======================================================
+# DDL
+# ======================================================
+DDL_SCORE = f"""
+CREATE TABLE IF NOT EXISTS {SCORE_TABLE} (
+    id               BIGINT       NOT NULL PRIMARY KEY,
+    id_competidor    INT          NOT NULL,
+    id_sku           INT          NOT NULL,
+    fecha            DATE         NOT NULL,
+    precio           DOUBLE       NOT NULL,
+    mediana          DOUBLE       NULL,
+    mad              DOUBLE       NULL,
+    n_ventana        SMALLINT     NOT NULL,
+    score            DOUBLE       NULL,
+    calculado_en     DATETIME     NOT NULL,
+    KEY idx_score_fecha (fecha, id_competidor),
+    KEY idx_score_serie (id_competidor, id_sku, fecha)
+);
+"""
+
+def ensure_scoring_tables() -> None:
+    execute_mysql_query(DDL_SCORE, fetch=False)
+
+
+# ======================================================
+# ESTADÍSTICA
+# ======================================================
+def robust_stats(window: Deque[float]) -> Tuple[Optional[float], Optional[float]]:
+    """(mediana, MAD con piso) de la ventana, o (None, None) si hay pocas observaciones."""
+    if len(window) < MIN_OBS:
+        return None, None
+    w = np.fromiter(window, dtype="float64", count=len(window))
+    med = float(np.median(w))
+    mad = float(np.median(np.abs(w - med)))
+    return med, max(mad, MAD_MIN_REL * abs(med), 1e-9)
+
+
+def score_series(
+    window: Deque[float],
+    precios: np.ndarray,
+) -> Tuple[List[Optional[float]], List[Optional[float]], List[Optional[float]], List[int]]:
+    """
+    Puntúa `precios` (ya en orden) contra la ventana móvil y la actualiza en
+    el lugar. Retorna mediana, MAD, score y tamaño de ventana por registro.
+    """
+    medianas, mads, scores, ns = [], [], [], []
+    for x in precios:
+        med, mad = robust_stats(window)
+        medianas.append(med)
+        mads.append(mad)
+        scores.append(None if med is None else 0.6745 * (float(x) - med) / mad)
+        ns.append(len(window))
+        window.append(float(x))
+    return medianas, mads, scores, ns
+
+
+# ======================================================
+# PERSISTENCIA
+# ======================================================
+def _primer_dia() -> Optional[date]:
+    df = execute_mysql_query("SELECT MIN(DATE(fecha)) AS desde FROM precio_competidor;", host=HOST)
+    if df is None or df.empty or pd.isna(df["desde"].iloc[0]):
+        return None
+    return pd.Timestamp(df["desde"].iloc[0]).date()
+
+
+def _pares(series: List[Serie]) -> str:
+    return ", ".join(f"({int(c)}, {int(s)})" for c, s in series)
+
+
+def _load_windows(series: List[Serie], desde: date) -> Dict[Serie, Deque[float]]:
+    """
+    Ventana de cada serie al comienzo de `desde`: sus últimos VENTANA_OBS
+    precios puntuados con fecha anterior (LATERAL + LIMIT sobre
+    idx_score_serie, sin recorrer la historia completa de la serie).
+    """
+    windows: Dict[Serie, Deque[float]] = {}
+    for start in range(0, len(series), CHUNK_SERIES):
+        bloque = series[start:start + CHUNK_SERIES]
+        claves = " UNION ALL ".join(
+            f"SELECT {int(c)} AS id_competidor, {int(s)} AS id_sku" for c, s in bloque
+        )
+        df = execute_mysql_query(
+            f"""
+            SELECT t.id_competidor, t.id_sku, w.precio
+            FROM ({claves}) AS t
+            JOIN LATERAL (
+                SELECT sc.precio, sc.fecha, sc.id
+                FROM {SCORE_TABLE} AS sc
+                WHERE sc.id_competidor = t.id_competidor
+                  AND sc.id_sku = t.id_sku
+                  AND sc.fecha < %s
+                ORDER BY sc.fecha DESC, sc.id DESC
+                LIMIT {VENTANA_OBS}
+            ) AS w ON TRUE
+            ORDER BY t.id_competidor, t.id_sku, w.fecha, w.id;
+            """,
+            (desde,),
+            host=HOST,
+            loader="scoring_ventanas",
+        )
+        if df is None:
+            raise RuntimeError("No se pudieron reconstruir las ventanas de scoring.")
+        for (c, s), grupo in df.groupby(["id_competidor", "id_sku"], sort=False):
+            windows[(int(c), int(s))] = deque(grupo["precio"].astype("float64"), maxlen=VENTANA_OBS)
+    return windows
+
+
+def _score_chunk(
+    chunk: pd.DataFrame,
+    desde: date,
+    hasta: date,
+    abierta: Dict[Serie, Deque[float]],
+) -> Dict[str, Any]:
+    """
+    Puntúa un chunk ordenado por serie. `abierta` trae la ventana de la
+    serie que quedó cortada en el chunk anterior (sus scores del rango ya se
+    borraron) y sale con la de la última serie de este chunk.
+    """
+    chunk = chunk.sort_values(["id_competidor", "id_sku", "fecha", "id"], kind="stable")
+    series = list(dict.fromkeys(zip(chunk["id_competidor"].astype(int), chunk["id_sku"].astype(int))))
+    nuevas = [k for k in series if k not in abierta]
+    windows = {**_load_windows(nuevas, desde), **abierta}
+
+    filas: List[Tuple[Any, ...]] = []
+    window: Deque[float] = deque(maxlen=VENTANA_OBS)
+    for (c, s), grupo in chunk.groupby(["id_competidor", "id_sku"], sort=False):
+        key = (int(c), int(s))
+        window = windows.get(key) or deque(maxlen=VENTANA_OBS)
+        precios = grupo["precio"].to_numpy(dtype="float64")
+        medianas, mads, scores, ns = score_series(window, precios)
+        for i, (id_, fecha) in enumerate(zip(grupo["id"], grupo["fecha"])):
+            filas.append((
+                int(id_), key[0], key[1], fecha, float(precios[i]),
+                medianas[i], mads[i], ns[i], scores[i],
+            ))
+    abierta.clear()
+    abierta[series[-1]] = window
+
+    statements: List[Tuple[str, Any]] = []
+    if nuevas:
+        # Scores previos del rango: incluyen registros que ya no existen o cambiaron
+        statements.append((
+            f"DELETE FROM {SCORE_TABLE} "
+            f"WHERE fecha BETWEEN %s AND %s AND (id_competidor, id_sku) IN ({_pares(nuevas)});",
+            (desde, hasta),
+        ))
+    statements.append((
+        f"INSERT INTO {SCORE_TABLE} "
+        f"(id, id_competidor, id_sku, fecha, precio, mediana, mad, n_ventana, score, calculado_en) "
+        f"VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW()) "
+        f"ON DUPLICATE KEY UPDATE id_competidor = VALUES(id_competidor), id_sku = VALUES(id_sku), "
+        f"fecha = VALUES(fecha), precio = VALUES(precio), mediana = VALUES(mediana), mad = VALUES(mad), "
+        f"n_ventana = VALUES(n_ventana), score = VALUES(score), calculado_en = VALUES(calculado_en);",
+        filas,
+    ))
+    res = execute_mysql_transaction(statements, loader="scoring_chunk")
+    if res is None:
+        raise RuntimeError("Falló la escritura de scores; relanzar el job con el mismo rango.")
+    return {"filas": len(filas), "series": len(nuevas)}
+
+
+def run_scoring(
+    *,
+    reset: bool = False,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    dias: int = DIAS_REPUNTAJE,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Dict[str, int]:
+    """
+    Repuntúa los registros de precio_competidor con fecha en [desde, hasta]
+    (por defecto los últimos `dias` días hasta hoy). Con `reset`, vacía los
+    scores y recalcula toda la historia.
+    """
+    ensure_scoring_tables()
+    hasta = hasta or date.today()
+    if reset:
+        execute_mysql_query(f"TRUNCATE TABLE {SCORE_TABLE};", fetch=False)
+        desde = _primer_dia()
+    elif desde is None:
+        desde = hasta - timedelta(days=dias - 1)
+    total = {"filas": 0, "series": 0, "chunks": 0}
+    if desde is None or desde > hasta:
+        return total
+
+    abierta: Dict[Serie, Deque[float]] = {}
+    # Orden por serie: cada serie se puntúa de corrido aunque cruce chunks
+    for chunk in iter_mysql_query(
+        f"""
+        SELECT
+            pc.id,
+            pc.id_competidor,
+            pc.id_sku,
+            pc.fecha,
+            COALESCE(pc.precio_descuento, pc.precio_lleno) AS precio
+        FROM precio_competidor AS pc
+        WHERE pc.fecha >= %s
+          AND pc.fecha < %s
+          AND COALESCE(pc.precio_descuento, pc.precio_lleno) > 0
+        ORDER BY pc.id_competidor, pc.id_sku, pc.fecha, pc.id;
+        """,
+        (desde, hasta + timedelta(days=1)),
+        chunk_rows=chunk_rows,
+        host=HOST,
+        loader="scoring_lectura",
+    ):
+        stats = _score_chunk(chunk, desde, hasta, abierta)
+        total["filas"] += stats["filas"]
+        total["series"] += stats["series"]
+        total["chunks"] += 1
+        print(f"[scoring] chunk {total['chunks']}: {stats['filas']} filas, {stats['series']} series")
+
+    # Series que ya no tienen registros válidos en el rango (borrados, en cuarentena, precio <= 0)
+    execute_mysql_query(
+        f"""
+        DELETE sc FROM {SCORE_TABLE} AS sc
+        LEFT JOIN precio_competidor AS pc
+            ON pc.id = sc.id
+        WHERE sc.fecha BETWEEN %s AND %s
+          AND (pc.id IS NULL OR NOT COALESCE(pc.precio_descuento, pc.precio_lleno) > 0);
+        """,
+        (desde, hasta),
+        fetch=False,
+        loader="scoring_limpieza",
+    )
+    return total
@@ -0,0 +1,310 @@
+import time
+
+import streamlit as st
+import pandas as pd
+
+from mySQLHelper import (
+    AIO_AVAILABLE,
+    DATABASE,
+    HOST,
+    MAX_REPLICA_LAG_S,
+    QueryCancelledError,
+    QuerySpec,
+    execute_mysql_query,
+    get_inflight_queries,
+    get_query_counters,
+    get_replica_router,
+    run_queries_concurrently,
+)
+import dataLoaders  # registra los loaders cacheados en cacheHelper.LOADERS
+from cacheHelper import LOADERS, get_cache_budget, get_cache_entries, get_cache_stats
+from exportHelper import available_formats
+from priceCube import get_price_cube
+from perfLog import get_latency_stats, read_slow_query_log, slow_query_threshold_ms
+from singleFlight import get_single_flight_stats
+
+# ======================================================
+# CONFIGURACIÓN GENERAL
+# ======================================================
+st.set_page_config(page_title="Configuración – Operaciones", layout="wide")
+st.title("Configuración y diagnóstico")
+
+st.caption(
+    "Las estadísticas de caché, latencias y conexiones en uso son del proceso "
+    "actual del servidor Streamlit y se reinician al reiniciar la app."
+)
+
+TABLAS_WATERMARK = {
+    "ventas_chiper": "fecha",
+    "precio_competidor": "fecha",
+    dataLoaders.SNAPSHOT_TABLE: "fecha_actual",
+}
+
+# ======================================================
+# PRUEBA DE CONEXIÓN
+# ======================================================
+st.subheader("Prueba de conexión")
+
+router = get_replica_router()
+endpoints = [("primario", HOST)] + [
+    (f"réplica {i + 1}", f"{h}:{p}") for i, (h, p) in enumerate(router.replicas)
+]
+
+if st.button("Probar conexiones"):
+    filas = []
+    for rol, ep in endpoints:
+        t0 = time.perf_counter()
+        df_ping = execute_mysql_query("SELECT 1 AS ok", host=ep, loader="diagnostico_ping")
+        filas.append({
+            "rol": rol,
+            "endpoint": ep,
+            "ok": df_ping is not None and not df_ping.empty,
+            "latencia_ms": (time.perf_counter() - t0) * 1000.0,
+        })
+    st.dataframe(pd.DataFrame(filas), use_container_width=True)
+
+if router.replicas:
+    st.markdown(f"**Réplicas de lectura** (lag máximo permitido: {MAX_REPLICA_LAG_S:.0f} s)")
+    st.dataframe(pd.DataFrame(router.status()), use_container_width=True)
+else:
+    st.info("Sin réplicas configuradas: todas las lecturas van al primario.")
+
+st.markdown("---")
+
+# ======================================================
+# CONEXIONES
+# ======================================================
+st.subheader("Conexiones")
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_estado_servidor() -> pd.DataFrame:
+    return execute_mysql_query(
+        """
+        SELECT VARIABLE_NAME AS variable, VARIABLE_VALUE AS valor
+        FROM performance_schema.global_status
+        WHERE VARIABLE_NAME IN ('Threads_connected', 'Threads_running', 'Max_used_connections')
+        UNION ALL
+        SELECT VARIABLE_NAME, VARIABLE_VALUE
+        FROM performance_schema.global_variables
+        WHERE VARIABLE_NAME = 'max_connections';
+        """,
+        host=HOST,
+        loader="diagnostico_servidor",
+    )
+
+
+df_srv = load_estado_servidor()
+inflight = get_inflight_queries()
+
+col1, col2, col3, col4 = st.columns(4)
+with col1:
+    st.metric("Consultas en vuelo (este proceso)", f"{len(inflight)}")
+
+if df_srv is not None and not df_srv.empty:
+    srv = {str(k).lower(): float(v) for k, v in zip(df_srv["variable"], df_srv["valor"])}
+    max_conn = srv.get("max_connections")
+    with col2:
+        st.metric("Threads_connected (primario)", f"{srv.get('threads_connected', 0):,.0f}")
+    with col3:
+        st.metric("Threads_running (primario)", f"{srv.get('threads_running', 0):,.0f}")
+    with col4:
+        st.metric(
+            "Uso de max_connections",
+            f"{srv.get('threads_connected', 0) / max_conn:.1%}" if max_conn else "N/A",
+        )
+else:
+    st.warning("No se pudo leer el estado del servidor (performance_schema).")
+
+if inflight:
+    st.dataframe(pd.DataFrame(inflight), use_container_width=True)
+
+st.markdown("---")
+
+# ======================================================
+# CACHÉ POR LOADER
+# ======================================================
+st.subheader("Caché por loader")
+
+df_cache = pd.DataFrame(get_cache_stats())
+if not df_cache.empty:
+    df_cache["MB"] = df_cache["bytes"] / (1024 * 1024)
+    st.dataframe(
+        df_cache[["loader", "calls", "misses", "hit_rate", "entries", "MB"]],
+        use_container_width=True,
+    )
+
+budget = get_cache_budget()
+c_usado, c_max, c_desalojos = st.columns(3)
+with c_usado:
+    st.metric("Memoria en caché (worker)", f"{budget['used_bytes'] / (1024 * 1024):,.1f} MB")
+with c_max:
+    st.metric(
+        "Presupuesto (CACHE_MAX_MB)",
+        f"{budget['max_bytes'] / (1024 * 1024):,.0f} MB" if budget["max_bytes"] else "Sin límite",
+    )
+with c_desalojos:
+    st.metric(
+        "Entradas desalojadas",
+        f"{budget['evicted_entries']}",
+        help=f"{budget['evicted_bytes'] / (1024 * 1024):,.1f} MB liberados",
+    )
+
+entradas = get_cache_entries()
+if entradas:
+    with st.expander(f"Entradas retenidas ({len(entradas)})"):
+        df_ent = pd.DataFrame(entradas)
+        df_ent["MB"] = df_ent["bytes"] / (1024 * 1024)
+        st.dataframe(
+            df_ent[["loader", "params", "MB", "hits", "edad_s", "sin_uso_s"]],
+            use_container_width=True,
+        )
+
+for name, loader in LOADERS.items():
+    c_name, c_warm, c_purge = st.columns([3, 1, 1])
+    with c_name:
+        st.write(f"`{name}`")
+    with c_warm:
+        if st.button("Calentar", key=f"warm_{name}", disabled=loader.warm_kwargs is None):
+            try:
+                with st.spinner(f"Precargando {name}..."):
+                    loader.warm()
+                st.success(f"{name}: precargado")
+            except QueryCancelledError as e:
+                st.error(f"{name}: consulta cancelada ({e.reason})")
+    with c_purge:
+        if st.button("Purgar", key=f"purge_{name}"):
+            loader.clear()
+            st.success(f"{name}: caché purgada")
+
+if st.button("Purgar todas las cachés"):
+    for loader in LOADERS.values():
+        loader.clear()
+    st.success("Cachés purgadas")
+
+cubo = get_price_cube()
+if cubo is None:
+    st.caption("Cubo de posicionamiento en memoria: deshabilitado (CUBE_ENABLED).")
+else:
+    estado_cubo = cubo.status()
+    with st.expander(
+        "Cubo de posicionamiento en memoria: "
+        + ("listo" if estado_cubo["listo"] else "construyendo" if estado_cubo["construyendo"] else "sin construir")
+    ):
+        st.json(estado_cubo)
+        if st.button("Reconstruir cubo", disabled=estado_cubo["construyendo"]):
+            cubo.invalidar()
+            st.success("Reconstrucción lanzada en segundo plano; mientras tanto las páginas usan SQL.")
+
+sf = get_single_flight_stats()
+st.caption(
+    f"Single-flight: {sf['thread_shared']} resultados compartidos entre hilos, "
+    f"{sf['process_shared']} entre procesos."
+)
+
+st.markdown("---")
+
+# ======================================================
+# LATENCIAS POR CONSULTA
+# ======================================================
+st.subheader("Latencias por consulta")
+
+counters = get_query_counters()
+col1, col2, col3, col4 = st.columns(4)
+with col1:
+    st.metric("Ejecutadas", f"{counters.get('executed', 0):,}")
+with col2:
+    st.metric("Errores", f"{counters.get('errors', 0):,}")
+with col3:
+    st.metric("Timeouts", f"{counters.get('timeouts', 0):,}")
+with col4:
+    st.metric("Canceladas por rerun", f"{counters.get('cancelled_superseded', 0):,}")
+
+df_lat = pd.DataFrame(get_latency_stats())
+if df_lat.empty:
+    st.info("Aún no hay consultas registradas en este proceso.")
+else:
+    st.dataframe(df_lat, use_container_width=True)
+
+with st.expander(f"Slow-query log (≥ {slow_query_threshold_ms():,.0f} ms o con error)"):
+    eventos = read_slow_query_log(limit=200)
+    if eventos:
+        df_slow = pd.DataFrame(eventos)
+        cols = [c for c in ["ts", "name", "status", "total_ms", "rows", "bytes", "endpoint", "fingerprint"]
+                if c in df_slow.columns]
+        st.dataframe(df_slow[cols].iloc[::-1], use_container_width=True, height=300)
+    else:
+        st.write("Sin eventos.")
+
+st.markdown("---")
+
+# ======================================================
+# ÚLTIMAS CARGAS (WATERMARKS)
+# ======================================================
+st.subheader("Últimas cargas por tabla")
+
+
+@st.cache_data(ttl=60, show_spinner=True)
+def load_watermarks() -> pd.DataFrame:
+    # Un MAX(fecha) por tabla + information_schema, todas en paralelo
+    specs = {
+        tabla: QuerySpec(
+            f"SELECT MAX({col}) AS ultima_fecha FROM {tabla};",
+            loader=f"diagnostico_watermark_{tabla}",
+        )
+        for tabla, col in TABLAS_WATERMARK.items()
+    }
+    specs["__info"] = QuerySpec(
+        """
+        SELECT
+            TABLE_NAME AS tabla,
+            TABLE_ROWS AS filas_aprox,
+            ROUND((DATA_LENGTH + INDEX_LENGTH) / 1024 / 1024, 1) AS mb,
+            UPDATE_TIME AS actualizada
+        FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = %s;
+        """,
+        (DATABASE,),
+        loader="diagnostico_watermark_info",
+    )
+    res = run_queries_concurrently(specs)
+
+    filas = []
+    for tabla in TABLAS_WATERMARK:
+        df_w = res[tabla]
+        filas.append({
+            "tabla": tabla,
+            "ultima_fecha": df_w["ultima_fecha"].iloc[0] if df_w is not None and not df_w.empty else None,
+        })
+    df_wm = pd.DataFrame(filas)
+
+    df_info = res["__info"]
+    if df_info is not None and not df_info.empty:
+        df_wm = df_wm.merge(df_info, on="tabla", how="left")
+    return df_wm
+
+
+if st.button("Refrescar watermarks"):
+    load_watermarks.clear()
+
+st.dataframe(load_watermarks(), use_container_width=True)
+
+st.markdown("---")
+
+# ======================================================
+# PARÁMETROS TÉCNICOS
+# ======================================================
+st.subheader("Parámetros técnicos")
+
+st.json({
+    "database": DATABASE,
+    "primario": HOST,
+    "replicas": [f"{h}:{p}" for h, p in router.replicas],
+    "max_replica_lag_s": MAX_REPLICA_LAG_S,
+    "max_execution_ms_pagina": dataLoaders.MAX_EXECUTION_MS_PAGINA,
+    "asyncio_mysql": AIO_AVAILABLE,
+    "exportar_formatos": list(available_formats()),
+    "slow_query_ms": slow_query_threshold_ms(),
+    "ventanas_snapshot": dataLoaders.VENTANAS_SNAPSHOT,
+    "cubo_dias": cubo.dias if cubo is not None else None,
+})
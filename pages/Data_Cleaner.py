@@ -1,11 +1,27 @@
 import streamlit as st
-import pandas as pd
+import numpy as np
 from datetime import date, timedelta
 
-from mySQLHelper import execute_mysql_query
+from mySQLHelper import QueryCancelledError
+from cacheHelper import CACHE_SYNC_S, publish_invalidation
+from dataLoaders import filter_outliers, load_ratios_competidor, load_scores_competidor
+from outlierScoring import SCORE_UMBRAL_DEFAULT, VENTANA_OBS
+import priceCube  # registra el cubo en la invalidación de cacheHelper
+from exportHelper import frame_chunks, render_export
+from quarantineHelper import (
+    CHUNK_IDS,
+    QUARANTINE_TABLE,
+    list_lotes,
+    plan_quarantine,
+    quarantine_rows,
+    restore_lote,
+)
+from renderProfiler import RenderProfiler
 
 st.title("Revisión y limpieza de datos – SIMPLE")
 
+prof = RenderProfiler.from_request("Data_Cleaner")
+
 # ============================================
 # Sidebar: parámetros básicos
 # ============================================
@@ -44,146 +60,294 @@ else:
 if fecha_desde > fecha_hasta:
     fecha_desde, fecha_hasta = fecha_hasta, fecha_desde
 
-# Umbrales configurables (por si quieres moverlos en el futuro)
-umbral_superior = st.sidebar.number_input(
-    "Umbral superior (ratio >)",
-    min_value=0.1,
-    max_value=100.0,
-    value=2.0,
-    step=0.1,
-)
+CRITERIO_RATIO = "Ratio vs. precio Chiper del día"
+CRITERIO_SCORE = "Score robusto (mediana/MAD de la serie)"
 
-umbral_inferior = st.sidebar.number_input(
-    "Umbral inferior (ratio <)",
-    min_value=0.01,
-    max_value=1.0,
-    value=0.5,
-    step=0.05,
-)
+criterio = st.sidebar.radio("Criterio", options=[CRITERIO_RATIO, CRITERIO_SCORE])
+
+if criterio == CRITERIO_RATIO:
+    # Umbrales configurables (por si quieres moverlos en el futuro)
+    umbral_superior = st.sidebar.number_input(
+        "Umbral superior (ratio >)",
+        min_value=0.1,
+        max_value=100.0,
+        value=2.0,
+        step=0.1,
+    )
+
+    umbral_inferior = st.sidebar.number_input(
+        "Umbral inferior (ratio <)",
+        min_value=0.01,
+        max_value=1.0,
+        value=0.5,
+        step=0.05,
+    )
+    col_criterio = "ratio_posicionamiento"
+    descripcion_criterio = (
+        f"precio_chiper / precio_competidor_efectivo > {umbral_superior} o < {umbral_inferior}"
+    )
+else:
+    umbral_score = st.sidebar.number_input(
+        "Umbral |score|",
+        min_value=1.0,
+        max_value=50.0,
+        value=SCORE_UMBRAL_DEFAULT,
+        step=0.5,
+    )
+    umbral_superior, umbral_inferior = umbral_score, -umbral_score
+    col_criterio = "score"
+    descripcion_criterio = (
+        f"|0.6745 · (precio − mediana) / MAD| > {umbral_score} "
+        f"(últimos {VENTANA_OBS} precios de la serie competidor/SKU)"
+    )
 
 st.markdown(
     f"**Rango fechas:** `{fecha_desde}` a `{fecha_hasta}`  \n"
     f"**Competidor:** {COMPETIDORES.get(id_competidor_opt)}  \n"
-    f"**Criterio:** precio_chiper / precio_competidor_efectivo "
-    f"> {umbral_superior} o < {umbral_inferior}"
+    f"**Criterio:** {descripcion_criterio}"
 )
 
 st.markdown("---")
 
 # ============================================
-# Consulta SQL simplificada
+# Tabla de ratios / scores (una consulta por rango y competidor)
 # ============================================
 
-@st.cache_data(show_spinner=True)
-def load_outliers(
-    fecha_desde_str: str,
-    fecha_hasta_str: str,
-    id_competidor_opt: int,
-    umbral_sup: float,
-    umbral_inf: float,
-) -> pd.DataFrame:
-    where_extra = ""
-    if id_competidor_opt != 0:
-        where_extra += f" AND pc.id_competidor = {id_competidor_opt}\n"
-
-    query = f"""
-    SELECT
-        pc.id,
-        pc.id_competidor,
-        c.nombre AS nombre_competidor,
-        pc.id_sku,
-        s.sku,
-        s.nombre AS nombre_sku,
-        pc.fecha,
-        pc.precio_lleno,
-        pc.precio_descuento,
-        vc.precio_bruto AS precio_bruto_chiper,
-        COALESCE(pc.precio_descuento, pc.precio_lleno)
-            AS precio_competidor_efectivo,
-        (vc.precio_bruto / COALESCE(pc.precio_descuento, pc.precio_lleno))
-            AS ratio_posicionamiento
-    FROM precio_competidor AS pc
-    JOIN competidor AS c
-        ON c.id = pc.id_competidor
-    JOIN sku AS s
-        ON s.id = pc.id_sku
-    LEFT JOIN ventas_chiper AS vc
-        ON vc.id_sku = pc.id_sku
-       AND vc.fecha  = pc.fecha
-    WHERE
-        vc.precio_bruto IS NOT NULL
-        AND COALESCE(pc.precio_descuento, pc.precio_lleno) > 0
-        AND DATE(pc.fecha) >= '{fecha_desde_str}'
-        AND DATE(pc.fecha) <= '{fecha_hasta_str}'
-        {where_extra}
-        AND (
-            (vc.precio_bruto / COALESCE(pc.precio_descuento, pc.precio_lleno)) > {umbral_sup}
-            OR
-            (vc.precio_bruto / COALESCE(pc.precio_descuento, pc.precio_lleno)) < {umbral_inf}
+# Los umbrales no van a SQL: moverlos no vuelve a consultar la base
+loader_criterio = load_ratios_competidor if criterio == CRITERIO_RATIO else load_scores_competidor
+with prof.stage("consulta"):
+    try:
+        df_ratios = loader_criterio(
+            fecha_desde_str=fecha_desde.strftime("%Y-%m-%d"),
+            fecha_hasta_str=fecha_hasta.strftime("%Y-%m-%d"),
+            id_competidor_opt=id_competidor_opt,
         )
-    ORDER BY
-        ratio_posicionamiento DESC;
-    """
-    return execute_mysql_query(query)
+    except QueryCancelledError as e:
+        st.error(f"La consulta fue cancelada ({e.reason}). Intente de nuevo o acote los parámetros.")
+        st.stop()
 
+if df_ratios is None or df_ratios.empty:
+    if criterio == CRITERIO_RATIO:
+        st.error("No se encontraron registros de precio_competidor con precio Chiper en el rango.")
+    else:
+        st.error("No hay registros puntuados en el rango. ¿Corrió `python batchJobs.py scoring` tras la carga?")
+    st.stop()
 
-df = load_outliers(
-    fecha_desde_str=fecha_desde.strftime("%Y-%m-%d"),
-    fecha_hasta_str=fecha_hasta.strftime("%Y-%m-%d"),
-    id_competidor_opt=id_competidor_opt,
-    umbral_sup=umbral_superior,
-    umbral_inf=umbral_inferior,
-)
+with prof.stage("umbrales"):
+    df = filter_outliers(df_ratios, umbral_superior, umbral_inferior, col=col_criterio)
+
+st.caption(f"{df.shape[0]:,} de {df_ratios.shape[0]:,} registros del rango quedan fuera de los umbrales.")
 
-if df is None or df.empty:
+if df.empty:
     st.error("No se encontraron registros con posicionamientos raros bajo este criterio.")
     st.stop()
 
-# Asegurar numéricos
-for col in [
-    "precio_lleno",
-    "precio_descuento",
-    "precio_bruto_chiper",
-    "precio_competidor_efectivo",
-    "ratio_posicionamiento",
-]:
-    if col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
-
 st.subheader("Registros detectados como outliers")
 
 st.write(f"Total de filas: **{df.shape[0]}**  |  SKU distintos: **{df['id_sku'].nunique()}**")
 
-st.dataframe(df, use_container_width=True, height=500)
+with prof.stage("exportar"):
+    render_export(
+        lambda: frame_chunks(df),
+        key="export_outliers",
+        file_stem=f"outliers_{col_criterio}_{fecha_desde}_{fecha_hasta}_{id_competidor_opt}",
+        signature=(col_criterio, fecha_desde, fecha_hasta, id_competidor_opt, umbral_superior, umbral_inferior),
+        label="Outliers",
+    )
 
 # ============================================
-# Selección manual de IDs a eliminar
+# Selección de registros (por filtro y por página)
 # ============================================
 
 st.markdown("---")
 st.subheader("Selección de registros a eliminar")
 
-ids_disponibles = df["id"].tolist()
-ids_preseleccion = ids_disponibles  # si quieres partir con todos marcados
+# La selección vive en la sesión y se reinicia si cambian rango, competidor o umbrales
+firma = (col_criterio, fecha_desde, fecha_hasta, id_competidor_opt, umbral_superior, umbral_inferior)
+if st.session_state.get("dc_firma") != firma:
+    st.session_state["dc_firma"] = firma
+    st.session_state["dc_sel"] = set()
+    st.session_state["dc_version"] = 0
+seleccion: set = st.session_state["dc_sel"]
 
-ids_seleccionados = st.multiselect(
-    "IDs de `precio_competidor` a eliminar",
-    options=ids_disponibles,
-    default=ids_preseleccion,
-)
 
-st.write(f"Has seleccionado **{len(ids_seleccionados)}** registros.")
+def _bulk(accion) -> None:
+    accion()
+    # Nueva versión de la grilla: descarta las ediciones de checkbox previas
+    st.session_state["dc_version"] += 1
+
+
+with prof.stage("seleccion"):
+    c_comp, c_tipo, c_texto = st.columns([2, 1, 2])
+    with c_comp:
+        competidores_vista = st.multiselect(
+            "Competidor",
+            options=sorted(df["nombre_competidor"].dropna().astype(str).unique()),
+        )
+    with c_tipo:
+        tipo = st.selectbox(
+            "Tipo",
+            options=["Todos", f"Alto (> {umbral_superior})", f"Bajo (< {umbral_inferior})"],
+        )
+    with c_texto:
+        texto = st.text_input("SKU o nombre contiene", value="")
+
+    vista = df
+    if competidores_vista:
+        vista = vista[vista["nombre_competidor"].astype(str).isin(competidores_vista)]
+    if tipo.startswith("Alto"):
+        vista = vista[vista[col_criterio] > umbral_superior]
+    elif tipo.startswith("Bajo"):
+        vista = vista[vista[col_criterio] < umbral_inferior]
+    if texto.strip():
+        patron = texto.strip()
+        vista = vista[
+            vista["sku"].astype(str).str.contains(patron, case=False, regex=False)
+            | vista["nombre_sku"].astype(str).str.contains(patron, case=False, regex=False)
+        ]
+    ids_vista = vista["id"].to_numpy(dtype="int64")
+
+    b1, b2, b3 = st.columns(3)
+    with b1:
+        if st.button(f"Seleccionar filtrados ({len(ids_vista):,})"):
+            _bulk(lambda: seleccion.update(ids_vista.tolist()))
+    with b2:
+        if st.button("Quitar filtrados de la selección"):
+            _bulk(lambda: seleccion.difference_update(ids_vista.tolist()))
+    with b3:
+        if st.button("Limpiar selección"):
+            _bulk(seleccion.clear)
 
-# Generar el DELETE listo para copiar
-if ids_seleccionados:
-    ids_str = ", ".join(str(int(x)) for x in ids_seleccionados)
-    delete_sql = f"DELETE FROM precio_competidor WHERE id IN ({ids_str});"
+    # Grilla paginada: solo la página visible va al navegador
+    c_tam, c_pag = st.columns([1, 1])
+    with c_tam:
+        tam_pagina = st.selectbox("Filas por página", options=[50, 100, 200, 500], index=2)
+    n_paginas = max(1, -(-len(vista) // tam_pagina))
+    with c_pag:
+        pagina = st.number_input(f"Página (de {n_paginas})", min_value=1, max_value=n_paginas, value=1, step=1)
 
-    st.markdown("### SQL para eliminar estos registros")
-    st.code(delete_sql, language="sql")
-    st.info(
-        "Copia este SQL y ejecútalo en tu cliente de base de datos "
-        "(DBeaver, MySQL Workbench, etc.)."
+    inicio = (int(pagina) - 1) * tam_pagina
+    df_pagina = vista.iloc[inicio:inicio + tam_pagina].copy()
+    ids_pagina = df_pagina["id"].to_numpy(dtype="int64")
+    df_pagina.insert(0, "eliminar", np.isin(ids_pagina, np.fromiter(seleccion, dtype="int64", count=len(seleccion))))
+
+    editado = st.data_editor(
+        df_pagina,
+        column_config={"eliminar": st.column_config.CheckboxColumn("Eliminar")},
+        disabled=[c for c in df_pagina.columns if c != "eliminar"],
+        hide_index=True,
+        use_container_width=True,
+        height=500,
+        key=f"dc_grid_{st.session_state['dc_version']}_{tam_pagina}_{int(pagina)}",
     )
-else:
-    st.info("Selecciona al menos un ID para generar la sentencia DELETE.")
+    marcados = editado["eliminar"].to_numpy(dtype=bool)
+    seleccion.update(ids_pagina[marcados].tolist())
+    seleccion.difference_update(ids_pagina[~marcados].tolist())
+
+    st.write(
+        f"Has seleccionado **{len(seleccion):,}** registros "
+        f"({len(vista):,} en el filtro actual, página {int(pagina)} de {n_paginas})."
+    )
+
+# ============================================
+# Cuarentena y eliminación por lotes
+# ============================================
+
+st.markdown("---")
+st.subheader("Mover a cuarentena y eliminar")
+st.caption(
+    f"Los registros se copian a `{QUARANTINE_TABLE}` y se eliminan de `precio_competidor` "
+    f"en transacciones de hasta {CHUNK_IDS:,} ids (por rango de id). Cada ejecución crea un "
+    f"lote que se puede restaurar."
+)
+
+
+
+def invalidar_derivados(rango_vencido) -> None:
+    """
+    Tras mover o restaurar: limpia las cachés de los loaders y el cubo de
+    este proceso, publica la invalidación para los demás procesos y avisa
+    qué días hay que recalcular con los jobs (sus corridas ya quedaron
+    marcadas como vencidas).
+    """
+    if publish_invalidation("precio_competidor"):
+        st.caption(f"Las demás instancias de la app limpian sus cachés en hasta {CACHE_SYNC_S:.0f} s.")
+    else:
+        st.warning(
+            "No se pudo publicar la invalidación: solo se limpió este proceso. Las demás "
+            "instancias de la app siguen mostrando datos cacheados hasta que expiren."
+        )
+    if rango_vencido:
+        st.info(
+            "Snapshots y sketches de los días afectados quedaron vencidos (las páginas "
+            "calculan en vivo) y los scores de las series afectadas se borraron desde su "
+            "primer día movido. Para regenerarlos:\n\n"
+            + "\n\n".join(
+                f"`python batchJobs.py {job} --desde {desde} --hasta {hasta}`"
+                for job, (desde, hasta) in rango_vencido.items()
+            )
+        )
+
+
+with prof.stage("cuarentena"):
+    c_sim, c_conf, c_run = st.columns([1, 2, 1])
+    with c_sim:
+        simular = st.button("Simular (dry-run)", disabled=not seleccion)
+    with c_conf:
+        confirmado = st.checkbox(f"Confirmo mover {len(seleccion):,} registros a cuarentena")
+    with c_run:
+        ejecutar = st.button("Ejecutar", type="primary", disabled=not (seleccion and confirmado))
+
+    if simular:
+        with st.spinner("Contando registros..."):
+            plan = plan_quarantine(seleccion)
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Seleccionados", f"{plan['seleccionados']:,}")
+        m2.metric("Aún existen", f"{plan['existentes']:,}")
+        m3.metric("Chunks", f"{plan['chunks']:,}")
+        if plan["ya_no_existen"]:
+            st.warning(f"{plan['ya_no_existen']:,} ids ya no existen en precio_competidor y se omitirán.")
+
+    if ejecutar:
+        barra = st.progress(0.0, text="Moviendo a cuarentena...")
+        res = quarantine_rows(
+            seleccion,
+            criterio=(
+                f"Data_Cleaner {fecha_desde}..{fecha_hasta} competidor={id_competidor_opt} "
+                f"{descripcion_criterio}"
+            ),
+            progress=lambda hechos, total: barra.progress(hechos / total, text=f"Chunk {hechos} de {total}"),
+        )
+        if res["error"]:
+            st.error(f"{res['error']} Lote {res['id_lote']}: {res['movidas']:,} registros movidos antes del error.")
+        else:
+            st.success(
+                f"Lote {res['id_lote']}: {res['movidas']:,} registros en cuarentena, "
+                f"{res['eliminadas']:,} eliminados de precio_competidor."
+            )
+        seleccion.clear()
+        st.session_state["dc_version"] += 1
+        invalidar_derivados(res.get("rango_vencido"))
+
+    with st.expander("Lotes de cuarentena (deshacer)"):
+        lotes = list_lotes()
+        if lotes is None or lotes.empty:
+            st.info("No hay lotes de cuarentena.")
+        else:
+            st.dataframe(lotes, use_container_width=True, hide_index=True)
+            restaurables = lotes[lotes["estado"].isin(["cuarentena", "parcial", "restauracion_parcial"])]
+            if not restaurables.empty:
+                id_lote = st.selectbox("Lote a restaurar", options=restaurables["id_lote"].tolist())
+                if st.button("Restaurar lote"):
+                    barra = st.progress(0.0, text="Restaurando...")
+                    res = restore_lote(
+                        int(id_lote),
+                        progress=lambda hechos, total: barra.progress(hechos / total, text=f"Chunk {hechos} de {total}"),
+                    )
+                    if res["error"]:
+                        st.error(f"{res['error']} {res['restauradas']:,} registros restaurados antes del error.")
+                    else:
+                        st.success(f"Lote {res['id_lote']}: {res['restauradas']:,} registros restaurados.")
+                    invalidar_derivados(res.get("rango_vencido"))
+
+prof.finish()
@@ -1,12 +1,26 @@
 # pages/04_Top20_Ventas.py
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 from datetime import date, timedelta
 
-from mySQLHelper import execute_mysql_query
+from mySQLHelper import QueryCancelledError
+from dataLoaders import (
+    COMPARAR_ANIO_ANTERIOR,
+    COMPARAR_PERIODO_ANTERIOR,
+    TOP_N_COLUMNA_GRUPO,
+    TOP_N_GRUPOS,
+    TOP_N_MAX,
+    load_top_n_ventas,
+    periodo_comparacion,
+    top_n_escalon,
+    top_n_por_grupo,
+)
+from exportHelper import frame_chunks, render_export
+from renderProfiler import RenderProfiler
+
+st.title("Top N productos por venta neta")
 
-st.title("Top 20 productos por venta neta")
+prof = RenderProfiler.from_request("Hit_List")
 
 st.sidebar.subheader("Parámetros de periodo")
 
@@ -30,149 +44,82 @@ else:
 if dfrom > dto:
     dfrom, dto = dto, dfrom
 
-st.markdown(
-    f"**Periodo seleccionado:** {dfrom.strftime('%Y-%m-%d')} → {dto.strftime('%Y-%m-%d')}"
-)
+st.sidebar.subheader("Ranking")
+nombre_grupo = st.sidebar.selectbox("Top N por", list(TOP_N_GRUPOS))
+rank_col = TOP_N_GRUPOS[nombre_grupo]
+top_n = int(st.sidebar.number_input("N", min_value=1, max_value=TOP_N_MAX, value=20, step=5))
+por_grupo = rank_col != "rank_global"
 
+modo_comparacion = st.sidebar.radio(
+    "Comparar con",
+    ["Sin comparación", COMPARAR_PERIODO_ANTERIOR, COMPARAR_ANIO_ANTERIOR],
+)
+comparar = modo_comparacion != "Sin comparación"
+if comparar:
+    ant_desde, ant_hasta = periodo_comparacion(dfrom, dto, modo_comparacion)
 
-@st.cache_data(show_spinner=True)
-def load_top_20_ventas(dfrom_str: str, dto_str: str) -> pd.DataFrame:
-    """
-    Consulta el Top 20 productos por venta neta en el periodo indicado.
-    Usa la estructura de daily_sku que compartiste.
-    """
-    query = f"""
-    WITH
-    params AS (
-      SELECT
-        CAST('{dfrom_str}' AS DATE) AS dfrom,
-        CAST('{dto_str}'   AS DATE) AS dto
-    ),
-    daily_sku AS (
-      SELECT 
-        DATE(v.fecha)                      AS date,
-        v.id_sku                           AS sku,
-        SUM(v.venta_neta)                  AS venta,
-        SUM(v.cantidad)                    AS unidades,
-
-        -- Precio bruto promedio del día (ponderado por unidades)
-        SUM(v.precio_bruto * v.cantidad) 
-          / NULLIF(SUM(v.cantidad), 0)     AS precio_bruto_prom_dia,
-
-        -- Margen total (front + back) del día, ponderado por venta
-        SUM( (v.front + v.back) * v.venta_neta )
-          / NULLIF(SUM(v.venta_neta), 0)   AS margen_front_back_prom_dia,
-
-        -- Precios competidor por día
-        AVG(pc.precio_lleno)               AS precio_lleno_dia,
-        AVG(pc.precio_descuento)           AS precio_descuento_dia
-      FROM ventas_chiper v
-      CROSS JOIN params p
-      LEFT JOIN precio_competidor pc
-        ON pc.id_sku = v.id_sku
-       AND DATE(pc.fecha) = DATE(v.fecha)
-       AND pc.id_competidor = 1          -- opcional / fijo por ahora
-      WHERE v.fecha >= p.dfrom
-        AND v.fecha <= p.dto
-      GROUP BY DATE(v.fecha), v.id_sku
+st.markdown(
+    f"**Periodo seleccionado:** {dfrom.strftime('%Y-%m-%d')} → {dto.strftime('%Y-%m-%d')}"
+    + (
+        f"  \n**Comparado con:** {ant_desde.strftime('%Y-%m-%d')} → {ant_hasta.strftime('%Y-%m-%d')}"
+        if comparar else ""
     )
-    SELECT
-        d.sku,
-        s.nombre                                    AS nombre_sku,
-        c.nombre                                    AS categoria,
-        mc.nombre                                   AS macro_categoria,
-        pvd.nombre                                  AS proveedor,
-
-        SUM(d.venta)                                AS venta_total_periodo,
-        SUM(d.unidades)                             AS unidades_total_periodo,
-
-        -- Precio bruto promedio ponderado por la venta de cada día
-        SUM(d.precio_bruto_prom_dia * d.venta)
-          / NULLIF(SUM(d.venta), 0)                 AS precio_bruto_prom_pond,
-
-        -- Margen (front + back) promedio ponderado por la venta de cada día
-        SUM(d.margen_front_back_prom_dia * d.venta)
-          / NULLIF(SUM(d.venta), 0)                 AS margen_front_back_prom_pond,
-
-        -- Precio lleno competidor promedio ponderado por venta Chiper
-        SUM(
-          CASE 
-            WHEN d.precio_lleno_dia IS NOT NULL 
-            THEN d.precio_lleno_dia * d.venta 
-          END
-        )
-          / NULLIF(
-              SUM(
-                CASE 
-                  WHEN d.precio_lleno_dia IS NOT NULL 
-                  THEN d.venta 
-                END
-              ),
-              0
-            )                                       AS precio_lleno_prom_pond,
-
-        -- Precio descuento competidor promedio ponderado
-        SUM(
-          CASE 
-            WHEN d.precio_descuento_dia IS NOT NULL 
-            THEN d.precio_descuento_dia * d.venta 
-          END
-        )
-          / NULLIF(
-              SUM(
-                CASE 
-                  WHEN d.precio_descuento_dia IS NOT NULL 
-                  THEN d.venta 
-                END
-              ),
-              0
-            )                                       AS precio_descuento_prom_pond
-    FROM daily_sku d
-    LEFT JOIN sku s
-        ON s.id = d.sku
-    LEFT JOIN categoria c
-        ON c.id = s.id_categoria
-    LEFT JOIN macro_categoria mc
-        ON mc.id = c.id_macro
-    LEFT JOIN proveedor pvd
-        ON pvd.id = s.id_proveedor
-    GROUP BY 
-        d.sku, s.nombre, c.nombre, mc.nombre, pvd.nombre
-    ORDER BY venta_total_periodo DESC
-      LIMIT 20;
-    """
-    return execute_mysql_query(query)
+)
 
 
 # Ejecutar consulta
-df_top = load_top_20_ventas(
-    dfrom.strftime("%Y-%m-%d"),
-    dto.strftime("%Y-%m-%d")
-)
+with prof.stage("consulta"):
+    try:
+        # Una consulta cubre todas las agrupaciones y todo N <= escalón;
+        # con comparación, ambos periodos salen del mismo recorrido
+        df_rank = load_top_n_ventas(
+            dfrom.strftime("%Y-%m-%d"),
+            dto.strftime("%Y-%m-%d"),
+            top_n_escalon(top_n),
+            ant_desde.strftime("%Y-%m-%d") if comparar else None,
+            ant_hasta.strftime("%Y-%m-%d") if comparar else None,
+        )
+    except QueryCancelledError as e:
+        st.error(f"La consulta fue cancelada ({e.reason}). Intente de nuevo o acote los parámetros.")
+        st.stop()
 
-if df_top is None or df_top.empty:
+if df_rank is None or df_rank.empty:
     st.error("No se encontraron ventas en el periodo seleccionado.")
     st.stop()
 
+df_top = top_n_por_grupo(df_rank, rank_col, top_n)
+etiqueta = f"Top {top_n}" + (f" por {nombre_grupo.lower()}" if por_grupo else "")
+
 # ============================
 # KPIs simples
 # ============================
-st.subheader("Resumen del Top 20")
+st.subheader(f"Resumen del {etiqueta}")
+
+venta_top = df_top["venta_total_periodo"].sum()
+unidades_top = df_top["unidades_total_periodo"].sum()
+delta_venta = delta_unidades = None
+if comparar:
+    venta_ant = df_top["venta_total_periodo_anterior"].sum()
+    unidades_ant = df_top["unidades_total_periodo_anterior"].sum()
+    delta_venta = f"{venta_top / venta_ant - 1:+.1%}" if venta_ant else None
+    delta_unidades = f"{unidades_top / unidades_ant - 1:+.1%}" if unidades_ant else None
 
 col1, col2, col3 = st.columns(3)
 with col1:
     st.metric(
-        "Venta total Top 20",
-        f"${df_top['venta_total_periodo'].sum():,.0f}"
+        f"Venta total {etiqueta}",
+        f"${venta_top:,.0f}",
+        delta=delta_venta,
     )
 with col2:
     st.metric(
-        "Unidades totales Top 20",
-        f"{df_top['unidades_total_periodo'].sum():,.0f}"
+        f"Unidades totales {etiqueta}",
+        f"{unidades_top:,.0f}",
+        delta=delta_unidades,
     )
 with col3:
     st.metric(
-        "Venta promedio por SKU (Top 20)",
+        f"Venta promedio por SKU ({etiqueta})",
         f"${df_top['venta_total_periodo'].mean():,.0f}"
     )
 
@@ -183,47 +130,87 @@ st.markdown("---")
 # ============================
 st.subheader("Ranking por venta neta en el periodo")
 
-# Ordenar por venta para que el gráfico quede consistente
-df_plot = df_top.sort_values("venta_total_periodo", ascending=False)
-
-fig = px.bar(
-    df_plot,
-    x="nombre_sku",
-    y="venta_total_periodo",
-    color="macro_categoria",
-    title="Top 20 productos por venta neta",
-    height=700  # alto en píxeles
-)
-fig.update_layout(
-    xaxis_title="SKU",
-    yaxis_title="Venta neta periodo",
-    xaxis_tickangle=-45
-)
-st.plotly_chart(fig, use_container_width=True)
+with prof.stage("grafico"):
+    if por_grupo:
+        # Un grupo a la vez: con cientos de grupos el gráfico conjunto no se lee
+        col_grupo = TOP_N_COLUMNA_GRUPO[rank_col]
+        # SKUs sin categoría: groupby los descarta y NULL nunca es == al elegido
+        grupos = df_top[col_grupo].astype("object").fillna("(sin grupo)")
+        venta_grupo = (
+            df_top["venta_total_periodo"].groupby(grupos).sum()
+            .sort_values(ascending=False)
+        )
+        grupo_sel = st.selectbox(nombre_grupo, list(venta_grupo.index))
+        df_plot = df_top[grupos == grupo_sel]
+    else:
+        df_plot = df_top
+    # Ordenar por venta para que el gráfico quede consistente
+    df_plot = df_plot.sort_values("venta_total_periodo", ascending=False)
+
+    fig = px.bar(
+        df_plot,
+        x="nombre_sku",
+        y="venta_total_periodo",
+        color="macro_categoria",
+        title=f"{etiqueta} productos por venta neta",
+        height=700  # alto en píxeles
+    )
+    fig.update_layout(
+        xaxis_title="SKU",
+        yaxis_title="Venta neta periodo",
+        xaxis_tickangle=-45
+    )
+    st.plotly_chart(fig, use_container_width=True)
 
 # ============================
 # Tabla detallada
 # ============================
-st.subheader("Detalle Top 20")
-
-# Reordenar columnas para lectura
-cols_order = [
-    "sku",
-    "nombre_sku",
-    "macro_categoria",
-    "categoria",
-    "proveedor",
-    "venta_total_periodo",
-    "unidades_total_periodo",
-    "precio_bruto_prom_pond",
-    "margen_front_back_prom_pond",
-    "precio_lleno_prom_pond",
-    "precio_descuento_prom_pond",
-]
-cols_presentes = [c for c in cols_order if c in df_top.columns]
-
-st.dataframe(
-    df_top[cols_presentes],
-    use_container_width=True,
-    height=500
-)
+st.subheader(f"Detalle {etiqueta}")
+
+with prof.stage("tabla"):
+    # Reordenar columnas para lectura
+    cols_order = [
+        rank_col,
+        "sku",
+        "nombre_sku",
+        "macro_categoria",
+        "categoria",
+        "proveedor",
+        "venta_total_periodo",
+        "unidades_total_periodo",
+        "precio_bruto_prom_pond",
+        "margen_front_back_prom_pond",
+        "precio_lleno_prom_pond",
+        "precio_descuento_prom_pond",
+    ]
+    if comparar:
+        cols_order[1:1] = [f"{rank_col}_anterior", "cambio_posicion"]
+        cols_order += [
+            "venta_total_periodo_anterior",
+            "delta_venta",
+            "delta_venta_pct",
+            "unidades_total_periodo_anterior",
+            "precio_bruto_prom_pond_anterior",
+            "precio_lleno_prom_pond_anterior",
+        ]
+    cols_presentes = [c for c in cols_order if c in df_top.columns]
+
+    st.dataframe(
+        df_top[cols_presentes],
+        use_container_width=True,
+        height=500
+    )
+
+# ============================
+# Exportar
+# ============================
+with prof.stage("exportar"):
+    render_export(
+        lambda: frame_chunks(df_top),
+        key="export_top_n",
+        file_stem=f"top{top_n}_{rank_col[len('rank_'):]}_{dfrom.strftime('%Y-%m-%d')}_{dto.strftime('%Y-%m-%d')}",
+        signature=(dfrom, dto, rank_col, top_n, modo_comparacion),
+        label=etiqueta,
+    )
+
+prof.finish()
@@ -0,0 +1,207 @@
+"""
+Instrumentación de rendimiento:
+- Spans de tiempo (connect, execute, fetch, dataframe, ...).
+- Log JSONL rotativo de consultas lentas (slow-query log).
+- Percentiles p50/p95/p99 por consulta nombrada, en memoria del proceso.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import numpy as np
+
+# ======================================================
+# CONFIGURACIÓN
+# ======================================================
+_config = {
+    "path": "slow_query_log.jsonl",
+    "threshold_ms": 2000.0,
+    "explain": False,
+    "max_bytes": 10 * 1024 * 1024,
+    "backup_count": 5,
+    "samples_per_name": 1000,
+}
+
+_lock = threading.Lock()
+_logger: Optional[logging.Logger] = None
+_samples: Dict[str, Deque[float]] = {}
+_counts: Dict[str, Dict[str, int]] = {}
+
+
+def configure_slow_query_log(
+    *,
+    path: Optional[str] = None,
+    threshold_ms: Optional[float] = None,
+    explain: Optional[bool] = None,
+    max_bytes: Optional[int] = None,
+    backup_count: Optional[int] = None,
+) -> None:
+    """Ajusta ruta, umbral y rotación del slow-query log (None = sin cambio)."""
+    global _logger
+    with _lock:
+        for k, v in (
+            ("path", path),
+            ("threshold_ms", threshold_ms),
+            ("explain", explain),
+            ("max_bytes", max_bytes),
+            ("backup_count", backup_count),
+        ):
+            if v is not None:
+                _config[k] = v
+        if _logger is not None:
+            for h in list(_logger.handlers):
+                _logger.removeHandler(h)
+                h.close()
+            _logger = None
+
+
+def slow_query_threshold_ms() -> float:
+    return float(_config["threshold_ms"])
+
+
+def explain_enabled() -> bool:
+    return bool(_config["explain"])
+
+
+def _get_logger() -> Optional[logging.Logger]:
+    """Logger con RotatingFileHandler; None si no se puede abrir el archivo."""
+    global _logger
+    with _lock:
+        if _logger is not None:
+            return _logger
+        logger = logging.getLogger("chiper_bi.slow_query")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        try:
+            handler = RotatingFileHandler(
+                _config["path"],
+                maxBytes=int(_config["max_bytes"]),
+                backupCount=int(_config["backup_count"]),
+                encoding="utf-8",
+            )
+        except OSError:
+            # Nunca detenemos una consulta por un problema de logging.
+            return None
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        _logger = logger
+        return _logger
+
+
+# ======================================================
+# SPANS
+# ======================================================
+class SpanTimer:
+    """
+    Acumula tiempos por etapa:
+
+        timer = SpanTimer()
+        with timer.span("execute"):
+            ...
+        timer.spans  # {"execute": 12.3}  (ms)
+    """
+
+    def __init__(self):
+        self._t0 = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[stage] = self.spans.get(stage, 0.0) + (time.perf_counter() - t) * 1000.0
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self._t0) * 1000.0
+
+
+def query_fingerprint(query: str) -> str:
+    """Hash corto del texto SQL normalizado en espacios."""
+    return hashlib.sha1(" ".join(query.split()).encode("utf-8")).hexdigest()[:12]
+
+
+# ======================================================
+# REGISTRO DE EVENTOS
+# ======================================================
+def record_event(event: Dict[str, Any], *, force_log: bool = False) -> None:
+    """
+    Registra un evento de consulta/render:
+    - siempre alimenta los percentiles de `event["name"]`;
+    - se escribe al JSONL si supera el umbral, no terminó OK, o force_log.
+    """
+    name = event.get("name") or "anon"
+    total_ms = float(event.get("total_ms", 0.0))
+    status = event.get("status", "ok")
+
+    with _lock:
+        dq = _samples.get(name)
+        if dq is None:
+            dq = deque(maxlen=int(_config["samples_per_name"]))
+            _samples[name] = dq
+        dq.append(total_ms)
+        c = _counts.setdefault(name, {"calls": 0, "slow": 0, "errors": 0})
+        c["calls"] += 1
+        if total_ms >= _config["threshold_ms"]:
+            c["slow"] += 1
+        if status != "ok":
+            c["errors"] += 1
+
+    if force_log or status != "ok" or total_ms >= _config["threshold_ms"]:
+        logger = _get_logger()
+        if logger is None:
+            return
+        line = {"ts": datetime.now(timezone.utc).isoformat(), **event}
+        try:
+            logger.info(json.dumps(line, default=str, ensure_ascii=False))
+        except Exception:
+            pass
+
+
+def get_latency_stats() -> List[Dict[str, Any]]:
+    """p50/p95/p99 por nombre sobre las últimas muestras del proceso."""
+    with _lock:
+        snapshot = {k: np.fromiter(v, dtype="float64") for k, v in _samples.items()}
+        counts = {k: dict(v) for k, v in _counts.items()}
+
+    out = []
+    for name, arr in sorted(snapshot.items()):
+        if arr.size == 0:
+            continue
+        p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+        out.append({
+            "name": name,
+            "calls": counts.get(name, {}).get("calls", int(arr.size)),
+            "slow": counts.get(name, {}).get("slow", 0),
+            "errors": counts.get(name, {}).get("errors", 0),
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": float(arr.max()),
+        })
+    return out
+
+
+def read_slow_query_log(limit: int = 200) -> List[Dict[str, Any]]:
+    """Últimas `limit` líneas del JSONL actual (sin los archivos rotados)."""
+    try:
+        with open(_config["path"], "r", encoding="utf-8") as fh:
+            lines = deque(fh, maxlen=limit)
+    except OSError:
+        return []
+    out = []
+    for line in lines:
+        try:
+            out.append(json.loads(line))
+        except ValueError:
+            continue
+    return out
@@ -0,0 +1,350 @@
+import json
+from contextlib import nullcontext
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from renderProfiler import RenderProfiler
+
+# Intentar importar st-aggrid
+try:
+    from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, JsCode
+    AGGRID_AVAILABLE = True
+except ImportError:
+    AGGRID_AVAILABLE = False
+
+SIN_MACRO = "(Sin macro)"
+SIN_CATEGORIA = "(Sin categoría)"
+SEP = " / "
+
+TREE_COLS = [
+    "ruta",
+    "nivel",
+    "macro_categoria",
+    "categoria",
+    "nombre_sku",
+    "venta_neta",
+    "posicionamiento",
+    "peso_venta",
+]
+
+# ======================================================
+# ESTILOS JS (compartidos por las páginas de posicionamiento)
+# ======================================================
+POSICIONAMIENTO_CELL_STYLE_JS = """
+    function(params) {
+        var v = null;
+
+        if (params.data && params.data.posicionamiento != null) {
+            v = params.data.posicionamiento;
+        } else if (params.value != null) {
+            v = params.value;
+        }
+
+        if (v == null) return {};
+
+        var minVal = 0.5;
+        var midVal = 1.0;
+        var maxVal = 2.0;
+
+        function clamp(x, a, b) { return Math.max(a, Math.min(b, x)); }
+        function lerp(a, b, t)  { return a + (b - a) * t; }
+
+        function hexToRgb(hex) {
+            var h = hex.replace('#','');
+            var bigint = parseInt(h, 16);
+            return {
+                r: (bigint >> 16) & 255,
+                g: (bigint >> 8) & 255,
+                b: bigint & 255
+            };
+        }
+
+        var red   = hexToRgb('#F8696B');
+        var green = hexToRgb('#63BE7B');
+        var white = {r: 255, g: 255, b: 255};
+        var c;
+
+        if (v < midVal) {
+            var t = clamp((midVal - v) / (midVal - minVal), 0, 1);
+            c = {
+                r: Math.round(lerp(white.r, green.r, t)),
+                g: Math.round(lerp(white.g, green.g, t)),
+                b: Math.round(lerp(white.b, green.b, t))
+            };
+        } else if (v > midVal) {
+            var t = clamp((v - midVal) / (maxVal - midVal), 0, 1);
+            c = {
+                r: Math.round(lerp(white.r, red.r, t)),
+                g: Math.round(lerp(white.g, red.g, t)),
+                b: Math.round(lerp(white.b, red.b, t))
+            };
+        } else {
+            c = white;
+        }
+
+        var bg = 'rgb(' + c.r + ',' + c.g + ',' + c.b + ')';
+        return {
+            'backgroundColor': bg,
+            'color': 'black'
+        };
+    }
+"""
+
+PESO_VENTA_CELL_STYLE_JS = """
+    function(params) {
+        var v = (params.data && params.data.peso_venta != null)
+                ? params.data.peso_venta
+                : params.value;
+
+        if (v == null) return {};
+
+        var scale = v / 0.05;  // saturación hasta 5%
+        scale = Math.max(0, Math.min(1, scale));
+
+        var yellow = {r: 246, g: 227, b: 122};  // #F6E37A
+        var white  = {r: 255, g: 255, b: 255};
+
+        function lerp(a, b, t) { return a + (b - a) * t; }
+
+        var c = {
+            r: Math.round(lerp(white.r, yellow.r, scale)),
+            g: Math.round(lerp(white.g, yellow.g, scale)),
+            b: Math.round(lerp(white.b, yellow.b, scale))
+        };
+
+        return {
+            'backgroundColor': 'rgb(' + c.r + ',' + c.g + ',' + c.b + ')',
+            'color': 'black'
+        };
+    }
+"""
+
+
+# ======================================================
+# CONSTRUCCIÓN DEL ÁRBOL (SERVIDOR)
+# ======================================================
+def _label(value, default: str) -> str:
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return default
+    return str(value)
+
+
+def category_key(macro, categoria) -> str:
+    """Clave legible de una categoría dentro del árbol (macro / categoría)."""
+    return f"{_label(macro, SIN_MACRO)}{SEP}{_label(categoria, SIN_CATEGORIA)}"
+
+
+def build_tree_rows(
+    rollup: Dict[str, pd.DataFrame],
+    df_sku: pd.DataFrame,
+    expandidas: Iterable[str],
+    *,
+    sku_limit: int = 200,
+) -> pd.DataFrame:
+    """
+    Arma las filas del árbol Macro → Categoría → SKU.
+
+    Las filas de macro y categoría vienen precalculadas desde `rollup`
+    (ver aggregationHelper.weighted_rollup, con sumas "venta_categoria" y
+    "peso_venta_categoria"). Las hojas SKU solo se agregan para las
+    categorías en `expandidas`, ordenadas por venta y con tope `sku_limit`
+    por categoría; así el payload inicial es proporcional a las categorías.
+    """
+    frames: List[pd.DataFrame] = []
+
+    def _group_rows(level_df: pd.DataFrame, nivel: str) -> pd.DataFrame:
+        macro = level_df["macro"].astype(object).map(lambda x: _label(x, SIN_MACRO))
+        out = pd.DataFrame({
+            "nivel": nivel,
+            "macro_categoria": macro,
+            "venta_neta": level_df["venta_categoria"].to_numpy(),
+            "posicionamiento": level_df["posicionamiento_pond"].to_numpy(),
+            "peso_venta": level_df["peso_venta_categoria"].to_numpy(),
+        })
+        if nivel == "macro":
+            out["categoria"] = None
+            out["ruta"] = [[m] for m in macro]
+        else:
+            cat = level_df["categoria"].astype(object).map(lambda x: _label(x, SIN_CATEGORIA))
+            out["categoria"] = cat.to_numpy()
+            out["ruta"] = [[m, c] for m, c in zip(macro, cat)]
+        out["nombre_sku"] = None
+        return out
+
+    frames.append(_group_rows(rollup["macro"], "macro"))
+    frames.append(_group_rows(rollup["categoria"], "categoria"))
+
+    expandidas = set(expandidas)
+    if expandidas and not df_sku.empty:
+        keys = [category_key(m, c) for m, c in zip(df_sku["macro"], df_sku["categoria"])]
+        hojas = df_sku[pd.Series(keys, index=df_sku.index).isin(expandidas)]
+
+        if not hojas.empty:
+            hojas = hojas.sort_values("venta_neta", ascending=False)
+            hojas = hojas.groupby(["macro", "categoria"], dropna=False, sort=False, observed=True).head(sku_limit)
+
+            macro = hojas["macro"].astype(object).map(lambda x: _label(x, SIN_MACRO))
+            cat = hojas["categoria"].astype(object).map(lambda x: _label(x, SIN_CATEGORIA))
+            nombre = hojas["nombre"].astype(str) + " · " + hojas["sku"].astype(str)
+
+            frames.append(pd.DataFrame({
+                "nivel": "sku",
+                "macro_categoria": macro.to_numpy(),
+                "categoria": cat.to_numpy(),
+                "nombre_sku": nombre.to_numpy(),
+                "venta_neta": hojas["venta_neta"].to_numpy(),
+                "posicionamiento": hojas["posicionamiento"].to_numpy(),
+                "peso_venta": hojas["peso_venta"].to_numpy(),
+                "ruta": [[m, c, n] for m, c, n in zip(macro, cat, nombre)],
+            }))
+
+    rows = pd.concat(frames, ignore_index=True)
+    return rows[TREE_COLS]
+
+
+# ======================================================
+# RENDER (AG GRID treeData, SIN AGREGACIÓN EN EL NAVEGADOR)
+# ======================================================
+def render_pivot_tree(
+    rollup: Dict[str, pd.DataFrame],
+    df_sku: pd.DataFrame,
+    *,
+    key: str,
+    venta_header: str = "Venta SKU",
+    posicionamiento_header: str = "Posicionamiento SKU",
+    peso_header: str = "Peso venta",
+    height: int = 600,
+    sku_limit_default: int = 200,
+    profiler: Optional[RenderProfiler] = None,
+) -> None:
+    """
+    Tabla pivote Macro → Categoría → SKU con agregados calculados en Python.
+
+    El usuario elige qué categorías desplegar; solo esas envían sus SKUs al
+    navegador. Los macro y categorías muestran los valores de `rollup`.
+    Con `profiler`, se miden por separado filas, opciones de grilla y AgGrid.
+    """
+    stage = profiler.stage if profiler is not None else (lambda name: nullcontext())
+
+    opciones = [
+        category_key(m, c)
+        for m, c in zip(rollup["categoria"]["macro"], rollup["categoria"]["categoria"])
+    ]
+
+    col_sel, col_lim = st.columns([4, 1])
+    with col_sel:
+        expandidas = st.multiselect(
+            "Categorías a desplegar (carga sus SKUs)",
+            options=opciones,
+            key=f"{key}_expandidas",
+        )
+    with col_lim:
+        sku_limit = st.number_input(
+            "Máx. SKUs por categoría",
+            min_value=10,
+            max_value=5000,
+            value=sku_limit_default,
+            step=50,
+            key=f"{key}_sku_limit",
+        )
+
+    with stage("pivot_filas"):
+        rows = build_tree_rows(rollup, df_sku, expandidas, sku_limit=int(sku_limit))
+
+    if not AGGRID_AVAILABLE:
+        st.info(
+            "Para usar la tabla pivote desplegable necesitas `streamlit-aggrid`.\n"
+            "Instala con: `pip install streamlit-aggrid`.\n\n"
+            "Mostrando tabla estática como alternativa."
+        )
+        st.dataframe(rows.drop(columns=["ruta"]), use_container_width=True, height=height)
+        return
+
+    with stage("pivot_opciones"):
+        # Nodos abiertos: macros con alguna categoría desplegada + esas categorías
+        abiertos: Dict[str, bool] = {}
+        sel = set(expandidas)
+        for m, k in zip(rollup["categoria"]["macro"], opciones):
+            if k in sel:
+                abiertos[_label(m, SIN_MACRO)] = True
+                abiertos[k] = True
+
+        is_open_js = JsCode(f"""
+            function(params) {{
+                var abiertos = {json.dumps(abiertos)};
+                var n = params.rowNode;
+                var partes = [];
+                while (n && n.key != null) {{
+                    partes.unshift(n.key);
+                    n = n.parent;
+                }}
+                return abiertos[partes.join({json.dumps(SEP)})] === true;
+            }}
+        """)
+
+        gb = GridOptionsBuilder.from_dataframe(rows)
+
+        gb.configure_default_column(
+            sortable=True,
+            filter=True,
+            editable=False,
+            resizable=True,
+        )
+
+        for col in ["ruta", "nivel", "macro_categoria", "categoria", "nombre_sku"]:
+            gb.configure_column(col, hide=True)
+
+        gb.configure_column(
+            "venta_neta",
+            header_name=venta_header,
+            type=["numericColumn"],
+            valueFormatter=(
+                "value == null ? '' : "
+                "value.toLocaleString('es-CL', {minimumFractionDigits: 0, maximumFractionDigits: 0})"
+            ),
+        )
+
+        gb.configure_column(
+            "posicionamiento",
+            header_name=posicionamiento_header,
+            type=["numericColumn"],
+            valueFormatter="value == null ? '' : (Number(value) * 100).toFixed(2) + '%'",
+            cellStyle=JsCode(POSICIONAMIENTO_CELL_STYLE_JS),
+        )
+
+        gb.configure_column(
+            "peso_venta",
+            header_name=peso_header,
+            type=["numericColumn"],
+            valueFormatter="value == null ? '' : (Number(value) * 100).toFixed(2) + '%'",
+            cellStyle=JsCode(PESO_VENTA_CELL_STYLE_JS),
+        )
+
+        grid_options = gb.build()
+        grid_options["treeData"] = True
+        grid_options["getDataPath"] = JsCode("function(data) { return data.ruta; }")
+        grid_options["isGroupOpenByDefault"] = is_open_js
+        grid_options["autoGroupColumnDef"] = {
+            "headerName": "Macro / Categoría / SKU",
+            "cellRendererParams": {"suppressCount": True},
+        }
+
+    with stage("pivot_aggrid"):
+        AgGrid(
+            rows,
+            gridOptions=grid_options,
+            update_mode=GridUpdateMode.NO_UPDATE,
+            allow_unsafe_jscode=True,
+            enable_enterprise_modules=True,  # necesario para treeData
+            height=height,
+            key=f"{key}_grid",
+        )
+
+    n_skus = int((rows["nivel"] == "sku").sum())
+    st.caption(
+        f"Filas enviadas al navegador: {len(rows):,} "
+        f"({n_skus:,} SKUs de {len(expandidas)} categorías desplegadas)."
+    )
@@ -0,0 +1,561 @@
+"""
+Cubo denso en memoria SKU × día × competidor con sumas prefijo, para
+responder el posicionamiento de cualquier ventana (terminada en cualquier
+día del horizonte) sin ir a MySQL.
+
+Se guardan, por día, sumas y conteos de los agregados diarios:
+- Chiper (día × SKU): suma y conteo de precio_bruto, venta_neta;
+- competidor (día × competidor × SKU): suma y conteo del precio mínimo
+  (LEAST(lleno, descuento)), de precio_lleno y de precio_descuento.
+
+Cada arreglo es acumulado sobre el eje de días (P[0] = 0, P[d+1] = P[d] +
+día d), así el agregado de los días [a, b] es P[b+1] - P[a]: una resta por
+SKU, independiente del largo de la ventana. Los promedios son suma / conteo,
+igual que los AVG de sql_posicionamiento_ventana y sql_posicionamiento_dia.
+
+El cubo se construye y se refresca en un hilo de fondo; mientras no está
+listo (o si no cubre la ventana pedida) las páginas usan el SQL de siempre.
+El refresco es incremental: por día se guarda una huella (filas, máximo
+id y suma de CRC32 del contenido de ventas_chiper y precio_competidor); se
+recargan solo los días cuya huella cambió (cargas tardías, backfills,
+precios corregidos en el lugar, cuarentenas) corrigiendo las sumas
+prefijo por diferencia, y se agregan los días nuevos, desplazando el
+horizonte. Si no cambió nada no se toca el cubo.
+
+    cubo = get_price_cube()      # None si CUBE_ENABLED es falso
+    df = cubo.ventana(1, fecha, 30) if cubo else None
+    if df is None:
+        df = load_posicionamiento_categoria(...)
+
+Memoria ≈ (CUBE_DIAS + 1) × SKUs × (20 + competidores × 36) bytes.
+"""
+import threading
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from cacheHelper import on_invalidation, sync_invalidations
+from dtypeHelper import compact_frame
+from mySQLHelper import _setting, execute_mysql_query, iter_mysql_query
+
+CUBE_ENABLED = str(_setting("CUBE_ENABLED", "0")).lower() in ("1", "true", "yes", "si", "sí")
+# Días de historia en el cubo (debe cubrir la ventana predefinida más larga)
+CUBE_DIAS = int(_setting("CUBE_DIAS", 120))
+# Cada cuánto se consulta si hay días nuevos
+CUBE_REFRESH_S = float(_setting("CUBE_REFRESH_S", 300))
+
+CHUNK_ROWS = 200_000
+
+# Columnas de salida (mismas que las consultas SQL equivalentes)
+COLUMNAS_VENTANA = [
+    "id_sku", "sku", "macro", "categoria", "proveedor", "nombre",
+    "precio_chiper", "precio_lleno_competidor", "precio_descuento_competidor",
+    "venta_neta", "posicionamiento", "peso_venta", "total_skus_chiper",
+]
+COLUMNAS_DIA = [
+    "fecha", "sku", "macro", "categoria", "proveedor", "nombre",
+    "precio_chiper", "precio_lleno_competidor", "precio_descuento_competidor",
+    "venta_neta", "posicionamiento",
+]
+
+# Arreglos del cubo: (nombre, por competidor, dtype)
+_ARREGLOS = [
+    ("chiper_sum", False, "float64"),
+    ("chiper_n", False, "int32"),
+    ("venta", False, "float64"),
+    ("min_sum", True, "float64"),
+    ("min_n", True, "int32"),
+    ("lleno_sum", True, "float64"),
+    ("lleno_n", True, "int32"),
+    ("desc_sum", True, "float64"),
+    ("desc_n", True, "int32"),
+]
+
+
+class _Estado(NamedTuple):
+    primer_dia: date
+    n_dias: int
+    skus: np.ndarray          # id_sku ordenados (eje SKU)
+    competidores: np.ndarray  # id_competidor ordenados (eje competidor)
+    dims: pd.DataFrame        # una fila por posición del eje SKU
+    p: Dict[str, np.ndarray]  # sumas prefijo: (n_dias + 1, S) o (n_dias + 1, C, S)
+    construido_en: float
+    huellas: Dict[date, Tuple[int, ...]]  # por día: (filas, max id, crc) de cada tabla de hechos
+
+    @property
+    def ultimo_dia(self) -> date:
+        return self.primer_dia + timedelta(days=self.n_dias - 1)
+
+
+# ======================================================
+# CARGA DE AGREGADOS DIARIOS
+# ======================================================
+def _sql_chiper_dia() -> str:
+    return """
+    SELECT
+        DATE(vc.fecha)          AS fecha,
+        vc.id_sku,
+        SUM(vc.precio_bruto)    AS chiper_sum,
+        COUNT(vc.precio_bruto)  AS chiper_n,
+        SUM(vc.venta_neta)      AS venta
+    FROM ventas_chiper vc
+    WHERE vc.fecha >= %s
+      AND vc.fecha <  %s
+      AND vc.precio_bruto IS NOT NULL
+    GROUP BY DATE(vc.fecha), vc.id_sku
+    """
+
+
+def _sql_competidor_dia() -> str:
+    return """
+    SELECT
+        DATE(pc.fecha)               AS fecha,
+        pc.id_competidor,
+        pc.id_sku,
+        SUM(LEAST(COALESCE(pc.precio_lleno, pc.precio_descuento),
+                  COALESCE(pc.precio_descuento, pc.precio_lleno)))  AS min_sum,
+        COUNT(*)                     AS min_n,
+        SUM(pc.precio_lleno)         AS lleno_sum,
+        COUNT(pc.precio_lleno)       AS lleno_n,
+        SUM(pc.precio_descuento)     AS desc_sum,
+        COUNT(pc.precio_descuento)   AS desc_n
+    FROM precio_competidor pc
+    WHERE pc.fecha >= %s
+      AND pc.fecha <  %s
+      AND (pc.precio_lleno IS NOT NULL OR pc.precio_descuento IS NOT NULL)
+    GROUP BY DATE(pc.fecha), pc.id_competidor, pc.id_sku
+    """
+
+
+def _load_dims() -> pd.DataFrame:
+    df = execute_mysql_query(
+        """
+        SELECT
+            s.id      AS id_sku,
+            s.sku,
+            mc.nombre AS macro,
+            c.nombre  AS categoria,
+            pr.nombre AS proveedor,
+            s.nombre  AS nombre
+        FROM sku s
+        LEFT JOIN categoria c
+          ON c.id = s.id_categoria
+        LEFT JOIN macro_categoria mc
+          ON mc.id = c.id_macro
+        LEFT JOIN proveedor pr
+          ON pr.id = s.id_proveedor
+        ORDER BY s.id;
+        """,
+        loader="cubo_dimensiones",
+    )
+    if df is None:
+        raise RuntimeError("No se pudieron leer las dimensiones de SKU.")
+    return compact_frame(df).reset_index(drop=True)
+
+
+def _load_competidores() -> np.ndarray:
+    df = execute_mysql_query("SELECT id FROM competidor ORDER BY id;", loader="cubo_competidores")
+    if df is None:
+        raise RuntimeError("No se pudieron leer los competidores.")
+    return df["id"].to_numpy(dtype="int64")
+
+
+def _watermark() -> Optional[date]:
+    """Último día con datos en ventas_chiper o precio_competidor."""
+    df = execute_mysql_query(
+        """
+        SELECT GREATEST(
+            COALESCE((SELECT MAX(fecha) FROM ventas_chiper), '1900-01-01'),
+            COALESCE((SELECT MAX(fecha) FROM precio_competidor), '1900-01-01')
+        ) AS wm;
+        """,
+        loader="cubo_watermark",
+    )
+    if df is None or df.empty or pd.isna(df["wm"].iloc[0]):
+        return None
+    wm = pd.Timestamp(df["wm"].iloc[0]).date()
+    return None if wm.year <= 1900 else wm
+
+
+# Columnas cuyo contenido entra en la huella de cada tabla de hechos
+_COLUMNAS_HUELLA = {
+    "ventas_chiper": ("id_sku", "precio_bruto", "venta_neta"),
+    "precio_competidor": ("id_sku", "id_competidor", "precio_lleno", "precio_descuento"),
+}
+
+
+def _huellas(desde: date, hasta: date) -> Dict[date, Tuple[int, ...]]:
+    """
+    Huella por día de [desde, hasta]: (filas, max id, suma de CRC32 del
+    contenido) de ventas_chiper y de precio_competidor. El término de
+    contenido detecta precios corregidos en el lugar (UPDATE, upserts
+    ON DUPLICATE KEY UPDATE) que no mueven filas ni ids. Si cambia, el día
+    se recarga.
+    """
+    rango = (desde, hasta + timedelta(days=1))
+    huellas: Dict[date, List[int]] = {}
+    for pos, (tabla, columnas) in enumerate(_COLUMNAS_HUELLA.items()):
+        # COALESCE: CONCAT_WS omite los NULL y (NULL, x) no debe igualar a (x, NULL)
+        contenido = ", ".join(["id"] + [f"COALESCE({c}, '')" for c in columnas])
+        df = execute_mysql_query(
+            f"""
+            SELECT
+                DATE(fecha)                             AS fecha,
+                COUNT(*)                                AS filas,
+                MAX(id)                                 AS max_id,
+                SUM(CRC32(CONCAT_WS('|', {contenido}))) AS crc
+            FROM {tabla}
+            WHERE fecha >= %s AND fecha < %s
+            GROUP BY DATE(fecha);
+            """,
+            rango,
+            loader="cubo_huellas",
+        )
+        if df is None:
+            raise RuntimeError(f"No se pudieron leer las huellas de {tabla}.")
+        for f, filas, max_id, crc in df[["fecha", "filas", "max_id", "crc"]].itertuples(index=False):
+            h = huellas.setdefault(pd.Timestamp(f).date(), [0] * 6)
+            h[3 * pos:3 * pos + 3] = [int(filas), int(max_id), int(crc)]
+    return {d: tuple(h) for d, h in huellas.items()}
+
+
+def _tramos(indices: List[int]) -> List[Tuple[int, int]]:
+    """Índices ordenados -> tramos contiguos (inicio, largo)."""
+    tramos: List[Tuple[int, int]] = []
+    for i in indices:
+        if tramos and tramos[-1][0] + tramos[-1][1] == i:
+            tramos[-1] = (tramos[-1][0], tramos[-1][1] + 1)
+        else:
+            tramos.append((i, 1))
+    return tramos
+
+
+def _load_dias(
+    desde: date,
+    n_dias: int,
+    skus: np.ndarray,
+    competidores: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    """
+    Agregados de los días [desde, desde + n_dias) en arreglos (n_dias, ...)
+    sin acumular. Filas de SKUs o competidores fuera de los ejes se ignoran
+    (igual que el JOIN con sku del SQL).
+    """
+    S, C = len(skus), len(competidores)
+    out = {
+        nombre: np.zeros((n_dias, C, S) if por_comp else (n_dias, S), dtype=dtype)
+        for nombre, por_comp, dtype in _ARREGLOS
+    }
+    rango = (desde, desde + timedelta(days=n_dias))
+
+    def _indices(chunk: pd.DataFrame, col: str, eje: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(posición en el eje, máscara de filas que están en el eje)."""
+        v = chunk[col].to_numpy(dtype="int64")
+        i = np.minimum(np.searchsorted(eje, v), max(len(eje) - 1, 0))
+        return i, (eje[i] == v) if len(eje) else np.zeros(len(v), dtype=bool)
+
+    def _dias(chunk: pd.DataFrame) -> np.ndarray:
+        f = pd.to_datetime(chunk["fecha"]).to_numpy(dtype="datetime64[D]")
+        return (f - np.datetime64(desde, "D")).astype("int64")
+
+    for chunk in iter_mysql_query(_sql_chiper_dia(), rango, chunk_rows=CHUNK_ROWS, loader="cubo_chiper"):
+        s, ok = _indices(chunk, "id_sku", skus)
+        d = _dias(chunk)
+        for col in ("chiper_sum", "chiper_n", "venta"):
+            x = pd.to_numeric(chunk[col], errors="coerce").fillna(0).to_numpy()
+            np.add.at(out[col], (d[ok], s[ok]), x[ok].astype(out[col].dtype))
+
+    for chunk in iter_mysql_query(_sql_competidor_dia(), rango, chunk_rows=CHUNK_ROWS, loader="cubo_competidor"):
+        s, ok_s = _indices(chunk, "id_sku", skus)
+        c, ok_c = _indices(chunk, "id_competidor", competidores)
+        d = _dias(chunk)
+        ok = ok_s & ok_c
+        for col in ("min_sum", "min_n", "lleno_sum", "lleno_n", "desc_sum", "desc_n"):
+            x = pd.to_numeric(chunk[col], errors="coerce").fillna(0).to_numpy()
+            np.add.at(out[col], (d[ok], c[ok], s[ok]), x[ok].astype(out[col].dtype))
+    return out
+
+
+def _acumular(diarios: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Sumas prefijo sobre el eje de días, con una fila inicial en cero."""
+    return {
+        nombre: np.concatenate([np.zeros_like(arr[:1]), np.cumsum(arr, axis=0, dtype=arr.dtype)])
+        for nombre, arr in diarios.items()
+    }
+
+
+# ======================================================
+# CUBO
+# ======================================================
+class PriceCube:
+    def __init__(self, dias: int = CUBE_DIAS, refresh_s: float = CUBE_REFRESH_S):
+        self.dias = int(dias)
+        self.refresh_s = float(refresh_s)
+        self._estado: Optional[_Estado] = None
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        # invalidar() incrementa la generación: un hilo que empezó antes no publica su resultado
+        self._generacion = 0
+        self._rebuild_pendiente = False
+        self._ultimo_chequeo = 0.0
+        self._error: Optional[str] = None
+        self._stats = {"builds": 0, "refreshes": 0, "dias_agregados": 0, "dias_recargados": 0, "consultas": 0}
+
+    # ---------- Construcción y refresco (en segundo plano) ----------
+    def _publicar(self, estado: Optional[_Estado], generacion: int) -> bool:
+        """Publica el estado solo si nadie invalidó el cubo desde que empezó el hilo."""
+        with self._lock:
+            if generacion != self._generacion:
+                return False
+            self._estado = estado
+            return True
+
+    def _build(self, generacion: int) -> None:
+        wm = _watermark()
+        if wm is None:
+            self._publicar(None, generacion)
+            return
+        primer_dia = wm - timedelta(days=self.dias - 1)
+        # Huellas antes de cargar: lo que llegue durante la carga se ve en el próximo refresco
+        huellas = _huellas(primer_dia, wm)
+        dims = _load_dims()
+        skus = dims["id_sku"].to_numpy(dtype="int64")
+        competidores = _load_competidores()
+        diarios = _load_dias(primer_dia, self.dias, skus, competidores)
+        estado = _Estado(
+            primer_dia, self.dias, skus, competidores, dims, _acumular(diarios), time.time(), huellas
+        )
+        if self._publicar(estado, generacion):
+            self._stats["builds"] += 1
+
+    def _refresh(self, generacion: int) -> None:
+        e = self._estado
+        if e is None:
+            self._build(generacion)
+            return
+        wm = _watermark()
+        if wm is None:
+            return
+        hasta = max(wm, e.ultimo_dia)
+        huellas = _huellas(e.primer_dia, hasta)
+        cambiados = [
+            i for i in range(e.n_dias)
+            if huellas.get(e.primer_dia + timedelta(days=i)) != e.huellas.get(e.primer_dia + timedelta(days=i))
+        ]
+        nuevos = (hasta - e.ultimo_dia).days
+        if not cambiados and not nuevos:
+            return
+
+        # SKUs o competidores nuevos cambian los ejes: se reconstruye
+        dims = _load_dims()
+        skus = dims["id_sku"].to_numpy(dtype="int64")
+        competidores = _load_competidores()
+        if not (np.array_equal(skus, e.skus) and np.array_equal(competidores, e.competidores)):
+            self._build(generacion)
+            return
+
+        # Copia: los lectores siguen usando e.p mientras se corrige
+        p = {nombre: arr.copy() for nombre, arr in e.p.items()}
+        for ini, largo in _tramos(cambiados):
+            diarios = _load_dias(e.primer_dia + timedelta(days=ini), largo, e.skus, e.competidores)
+            for nombre, arr in p.items():
+                # Diferencia entre el día recargado y el que estaba, acumulada hacia adelante
+                viejo = arr[ini + 1:ini + largo + 1] - arr[ini:ini + largo]
+                delta = np.cumsum(diarios[nombre] - viejo, axis=0, dtype=arr.dtype)
+                arr[ini + 1:ini + largo + 1] += delta
+                arr[ini + largo + 1:] += delta[-1]
+
+        recorte = 0
+        if nuevos:
+            diarios = _load_dias(e.ultimo_dia + timedelta(days=1), nuevos, e.skus, e.competidores)
+            for nombre, arr in p.items():
+                acum = np.cumsum(diarios[nombre], axis=0, dtype=arr.dtype) + arr[-1:]
+                # Se desplaza el horizonte: quedan `dias` días (dias + 1 filas)
+                p[nombre] = np.concatenate([arr, acum])[-(self.dias + 1):]
+            recorte = max(0, e.n_dias + nuevos - self.dias)
+
+        primer_dia = e.primer_dia + timedelta(days=recorte)
+        estado = e._replace(
+            primer_dia=primer_dia,
+            n_dias=e.n_dias + nuevos - recorte,
+            dims=dims,
+            p=p,
+            huellas={d: h for d, h in huellas.items() if d >= primer_dia},
+        )
+        if not self._publicar(estado, generacion):
+            return
+        self._stats["refreshes"] += 1
+        self._stats["dias_agregados"] += nuevos
+        self._stats["dias_recargados"] += len(cambiados)
+
+    def _run(self, rebuild: bool, generacion: int) -> None:
+        try:
+            # Invalidaciones publicadas por otros procesos (Data_Cleaner); puede invalidar este hilo
+            sync_invalidations()
+            if rebuild:
+                self._build(generacion)
+            else:
+                self._refresh(generacion)
+            self._error = None
+        except Exception as e:  # el cubo es un acelerador: ante error, SQL
+            self._error = str(e)
+            print(f"[CUBO] {e}")
+        finally:
+            self._ultimo_chequeo = time.time()
+            with self._lock:
+                # Invalidado mientras corría: se reconstruye con los datos nuevos
+                if self._rebuild_pendiente:
+                    self._lanzar(rebuild=True)
+
+    def _lanzar(self, rebuild: bool) -> None:
+        """Arranca el hilo de construcción/refresco. Requiere self._lock tomado."""
+        self._rebuild_pendiente = False
+        self._ultimo_chequeo = time.time()
+        self._worker = threading.Thread(
+            target=self._run, args=(rebuild, self._generacion), daemon=True, name="price-cube"
+        )
+        self._worker.start()
+
+    def _ensure_fresh(self, rebuild: bool = False) -> None:
+        """Lanza construcción/refresco en un hilo si corresponde; nunca bloquea al lector."""
+        vencido = time.time() - self._ultimo_chequeo >= self.refresh_s
+        if not (rebuild or self._estado is None or vencido):
+            return
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            if not rebuild and self._estado is not None and not vencido:
+                return
+            self._lanzar(rebuild)
+
+    def invalidar(self) -> None:
+        """
+        Descarta el cubo (p.ej. tras borrar registros históricos) y lo
+        reconstruye. Si hay un hilo corriendo, su resultado se descarta y la
+        reconstrucción queda pendiente para cuando termine.
+        """
+        with self._lock:
+            self._generacion += 1
+            self._estado = None
+            if self._worker is not None and self._worker.is_alive():
+                self._rebuild_pendiente = True
+            else:
+                self._lanzar(rebuild=True)
+
+    # ---------- Consultas ----------
+    def _rango(self, e: _Estado, desde: date, hasta: date) -> Optional[slice]:
+        lo = (desde - e.primer_dia).days
+        hi = (hasta - e.primer_dia).days + 1
+        if lo < 0 or hi > e.n_dias or lo >= hi:
+            return None
+        return slice(lo, hi)
+
+    @staticmethod
+    def _div(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(den > 0, num / np.where(den > 0, den, 1), np.nan)
+
+    def _sumas(self, e: _Estado, r: slice, id_competidor: int) -> Optional[Dict[str, np.ndarray]]:
+        ci = int(np.searchsorted(e.competidores, id_competidor))
+        if ci >= len(e.competidores) or e.competidores[ci] != id_competidor:
+            return None
+        out = {}
+        for nombre, por_comp, _ in _ARREGLOS:
+            arr = e.p[nombre]
+            out[nombre] = (arr[r.stop, ci] - arr[r.start, ci]) if por_comp else (arr[r.stop] - arr[r.start])
+        return out
+
+    def _precios(self, w: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        precio_chiper = self._div(w["chiper_sum"], w["chiper_n"])
+        comp_min = self._div(w["min_sum"], w["min_n"])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pos = np.where(comp_min > 0, precio_chiper / comp_min, np.nan)
+        return {
+            "precio_chiper": precio_chiper,
+            "precio_lleno_competidor": self._div(w["lleno_sum"], w["lleno_n"]),
+            "precio_descuento_competidor": self._div(w["desc_sum"], w["desc_n"]),
+            "venta_neta": np.where(w["chiper_n"] > 0, w["venta"], np.nan),
+            "posicionamiento": pos,
+        }
+
+    def ventana(self, id_competidor: int, fecha: date, ventana: int) -> Optional[pd.DataFrame]:
+        """
+        Equivalente a sql_posicionamiento_ventana(id_competidor, fecha, ventana)
+        (días [fecha - ventana, fecha]). None si el cubo no está listo o no
+        cubre el rango: el llamador usa SQL.
+        """
+        self._ensure_fresh()
+        e = self._estado
+        if e is None:
+            return None
+        r = self._rango(e, fecha - timedelta(days=int(ventana)), fecha)
+        w = None if r is None else self._sumas(e, r, int(id_competidor))
+        if w is None:
+            return None
+        self._stats["consultas"] += 1
+
+        # Igual que el SQL: filas = SKUs con precio de competidor en la ventana
+        idx = np.flatnonzero(w["min_n"] > 0)
+        cols = {k: v[idx] for k, v in self._precios(w).items()}
+        total = np.nansum(cols["venta_neta"])
+        cols["peso_venta"] = cols["venta_neta"] / total if total else np.full(len(idx), np.nan)
+        cols["total_skus_chiper"] = np.full(len(idx), int((w["chiper_n"] > 0).sum()))
+
+        df = e.dims.iloc[idx].reset_index(drop=True)
+        for k, v in cols.items():
+            df[k] = v
+        return df[COLUMNAS_VENTANA]
+
+    def dia(self, id_competidor: int, fecha: date) -> Optional[pd.DataFrame]:
+        """Equivalente a sql_posicionamiento_dia: SKUs con competidor y Chiper ese día."""
+        self._ensure_fresh()
+        e = self._estado
+        if e is None:
+            return None
+        r = self._rango(e, fecha, fecha)
+        w = None if r is None else self._sumas(e, r, int(id_competidor))
+        if w is None:
+            return None
+        self._stats["consultas"] += 1
+
+        idx = np.flatnonzero((w["min_n"] > 0) & (w["chiper_n"] > 0))
+        df = e.dims.iloc[idx].reset_index(drop=True)
+        for k, v in self._precios(w).items():
+            df[k] = v[idx]
+        df["fecha"] = fecha
+        return df[COLUMNAS_DIA]
+
+    # ---------- Diagnóstico ----------
+    def status(self) -> Dict[str, Any]:
+        e = self._estado
+        return {
+            "listo": e is not None,
+            "construyendo": self._worker is not None and self._worker.is_alive(),
+            "primer_dia": None if e is None else e.primer_dia.isoformat(),
+            "ultimo_dia": None if e is None else e.ultimo_dia.isoformat(),
+            "skus": 0 if e is None else len(e.skus),
+            "competidores": 0 if e is None else len(e.competidores),
+            "mb": 0.0 if e is None else sum(a.nbytes for a in e.p.values()) / (1024 * 1024),
+            "edad_s": None if e is None else time.time() - e.construido_en,
+            "error": self._error,
+            **self._stats,
+        }
+
+
+_default_cube: Optional[PriceCube] = PriceCube() if CUBE_ENABLED else None
+if _default_cube is not None:
+    # publish_invalidation() en cualquier proceso descarta también el cubo
+    on_invalidation(_default_cube.invalidar)
+
+
+def get_price_cube() -> Optional[PriceCube]:
+    """Cubo del proceso, o None si CUBE_ENABLED es falso."""
+    return _default_cube
+
+
+def invalidate_price_cube() -> None:
+    if _default_cube is not None:
+        _default_cube.invalidar()
@@ -0,0 +1,353 @@
+"""
+Eliminación por lotes de registros de precio_competidor con cuarentena:
+los registros no se borran directamente, se mueven a
+`precio_competidor_cuarentena` (mismas columnas + id_lote) y recién
+entonces se eliminan del origen. Un lote se puede restaurar completo.
+
+Todo se hace en chunks acotados por rangos de id (cada chunk es una
+transacción con INSERT ... SELECT + DELETE), así ninguna sentencia crece
+con la cantidad de registros seleccionados. Las lecturas van al primario:
+deben ver lo recién movido.
+
+    plan = plan_quarantine(ids)                       # dry-run: solo cuenta
+    res = quarantine_rows(ids, criterio="ratio > 2")  # mueve y elimina
+    restore_lote(res["id_lote"])                      # deshacer
+
+Mover o restaurar cambia los precios de competidor de esos días: las
+corridas de snapshot y de sketches que los cubren se borran de sus tablas
+*_run (los loaders vuelven a calcular en vivo), en la misma transacción de
+cada chunk se borran los scores de outliers de las series afectadas desde
+su primer día movido (sus ventanas incluían esos precios) y el resultado
+trae en "rango_vencido" las fechas para volver a correr los jobs.
+"""
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from mySQLHelper import HOST, execute_mysql_query, execute_mysql_transaction
+from dataLoaders import SKETCH_DIA_RUN_TABLE, SNAPSHOT_RUN_TABLE, VENTANAS_SNAPSHOT
+from outlierScoring import SCORE_TABLE
+
+SOURCE_TABLE = "precio_competidor"
+QUARANTINE_TABLE = "precio_competidor_cuarentena"
+LOTE_TABLE = "cuarentena_lote"
+
+# Ids por chunk (acota el tamaño de cada sentencia y de cada transacción)
+CHUNK_IDS = 1000
+
+ProgressFn = Callable[[int, int], None]
+
+# ======================================================
+# DDL
+# ======================================================
+DDL_LOTE = f"""
+CREATE TABLE IF NOT EXISTS {LOTE_TABLE} (
+    id_lote              INT           NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    creado_en            DATETIME      NOT NULL,
+    criterio             VARCHAR(1000) NULL,
+    filas_seleccionadas  INT           NOT NULL,
+    filas_movidas        INT           NOT NULL DEFAULT 0,
+    estado               VARCHAR(24)   NOT NULL,
+    restaurado_en        DATETIME      NULL
+);
+"""
+
+
+_tables_ok = False
+
+
+def ensure_quarantine_tables() -> None:
+    """Crea la tabla de lotes y la de cuarentena (copia de la estructura de origen + id_lote)."""
+    global _tables_ok
+    if _tables_ok:
+        return
+    execute_mysql_query(DDL_LOTE, fetch=False)
+    execute_mysql_query(f"CREATE TABLE IF NOT EXISTS {QUARANTINE_TABLE} LIKE {SOURCE_TABLE};", fetch=False)
+    if "id_lote" not in _columns(QUARANTINE_TABLE):
+        execute_mysql_query(
+            f"ALTER TABLE {QUARANTINE_TABLE} "
+            f"ADD COLUMN id_lote INT NOT NULL DEFAULT 0, "
+            f"ADD INDEX idx_cuarentena_lote (id_lote, id);",
+            fetch=False,
+        )
+    _tables_ok = "id_lote" in _columns(QUARANTINE_TABLE)
+
+
+def _columns(table: str) -> List[str]:
+    df = execute_mysql_query(
+        """
+        SELECT COLUMN_NAME AS columna
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY ORDINAL_POSITION;
+        """,
+        (table,),
+        host=HOST,
+    )
+    return [] if df is None else [str(c) for c in df["columna"]]
+
+
+def _source_columns() -> str:
+    """Columnas de origen, explícitas: la cuarentena tiene además id_lote al final."""
+    return ", ".join(f"`{c}`" for c in _columns(SOURCE_TABLE))
+
+
+# ======================================================
+# CHUNKS POR RANGO DE ID
+# ======================================================
+def id_chunks(ids: Iterable[int], chunk_size: int = CHUNK_IDS) -> Iterator[Tuple[int, int, np.ndarray]]:
+    """(id_min, id_max, ids) de cada chunk, en orden ascendente y sin duplicados."""
+    arr = np.unique(np.asarray(list(ids), dtype="int64"))
+    for start in range(0, len(arr), chunk_size):
+        chunk = arr[start:start + chunk_size]
+        yield int(chunk[0]), int(chunk[-1]), chunk
+
+
+def _in_list(chunk: np.ndarray) -> str:
+    return ", ".join(str(int(x)) for x in chunk)
+
+
+# ======================================================
+# DRY-RUN
+# ======================================================
+def plan_quarantine(ids: Iterable[int], *, chunk_size: int = CHUNK_IDS) -> Dict[str, Any]:
+    """Cuenta cuántos de los ids siguen existiendo y en cuántos chunks se moverían."""
+    chunks = list(id_chunks(ids, chunk_size))
+    seleccionados = sum(len(c) for _, _, c in chunks)
+    existentes = 0
+    for lo, hi, chunk in chunks:
+        df = execute_mysql_query(
+            f"SELECT COUNT(*) AS n FROM {SOURCE_TABLE} "
+            f"WHERE id BETWEEN %s AND %s AND id IN ({_in_list(chunk)});",
+            (lo, hi),
+            host=HOST,
+            loader="cuarentena_plan",
+        )
+        if df is not None and not df.empty:
+            existentes += int(df["n"].iloc[0])
+    return {
+        "seleccionados": seleccionados,
+        "existentes": existentes,
+        "ya_no_existen": seleccionados - existentes,
+        "chunks": len(chunks),
+        "id_min": chunks[0][0] if chunks else None,
+        "id_max": chunks[-1][1] if chunks else None,
+    }
+
+
+# ======================================================
+# AGREGADOS VENCIDOS (SNAPSHOT / SKETCHES)
+# ======================================================
+def _dias_lote(id_lote: int) -> Optional[pd.DataFrame]:
+    """Rango de días por competidor de los registros del lote en cuarentena."""
+    return execute_mysql_query(
+        f"SELECT id_competidor, MIN(DATE(fecha)) AS desde, MAX(DATE(fecha)) AS hasta "
+        f"FROM {QUARANTINE_TABLE} WHERE id_lote = %s GROUP BY id_competidor;",
+        (int(id_lote),),
+        host=HOST,
+        loader="cuarentena_dias",
+    )
+
+
+def _sql_vencer_scores() -> str:
+    """
+    DELETE de los scores de las series (competidor, SKU) de un chunk del
+    lote, desde el primer día movido de cada una: los posteriores se
+    calcularon con ventanas que incluían esos precios. Va dentro de la
+    transacción del chunk, mientras los registros siguen en cuarentena.
+    Parámetros: (id_lote, id_min, id_max).
+    """
+    return f"""
+    DELETE sc FROM {SCORE_TABLE} AS sc
+    JOIN (
+        SELECT id_competidor, id_sku, MIN(DATE(fecha)) AS desde
+        FROM {QUARANTINE_TABLE}
+        WHERE id_lote = %s AND id BETWEEN %s AND %s
+        GROUP BY id_competidor, id_sku
+    ) AS q
+        ON q.id_competidor = sc.id_competidor
+       AND q.id_sku = sc.id_sku
+       AND sc.fecha >= q.desde;
+    """
+
+
+def _marcar_vencidos(df_dias: Optional[pd.DataFrame]) -> Optional[Dict[str, Tuple[date, date]]]:
+    """
+    Borra las corridas de snapshot (ventanas que tocan los días del lote) y
+    de sketches (esos días) de sus tablas *_run, para que no se sirvan como
+    vigentes. Retorna {"snapshot": (desde, hasta), "sketches": (desde,
+    hasta), "scoring": (desde, hoy)} con las fechas a recalcular por cada
+    job, o None.
+    """
+    if df_dias is None or df_dias.empty:
+        return None
+    for id_competidor, desde, hasta in df_dias[["id_competidor", "desde", "hasta"]].itertuples(index=False):
+        execute_mysql_query(
+            f"DELETE FROM {SNAPSHOT_RUN_TABLE} "
+            f"WHERE id_competidor = %s AND fecha_actual >= %s "
+            f"AND DATE_SUB(fecha_actual, INTERVAL dias_ventana DAY) <= %s;",
+            (int(id_competidor), desde, hasta),
+            fetch=False,
+            loader="cuarentena_vencer_snapshot",
+        )
+    desde, hasta = min(df_dias["desde"]), max(df_dias["hasta"])
+    execute_mysql_query(
+        f"DELETE FROM {SKETCH_DIA_RUN_TABLE} WHERE fecha BETWEEN %s AND %s;",
+        (desde, hasta),
+        fetch=False,
+        loader="cuarentena_vencer_sketches",
+    )
+    # Un snapshot con fecha_actual hasta `hasta` + ventana más larga incluye esos días
+    hasta_snapshot = min(hasta + timedelta(days=max(VENTANAS_SNAPSHOT)), date.today())
+    # Los scores de las series afectadas se borraron hasta hoy (ver _sql_vencer_scores)
+    return {"snapshot": (desde, hasta_snapshot), "sketches": (desde, hasta), "scoring": (desde, date.today())}
+
+
+# ======================================================
+# MOVER A CUARENTENA / RESTAURAR
+# ======================================================
+def quarantine_rows(
+    ids: Iterable[int],
+    *,
+    criterio: str = "",
+    chunk_size: int = CHUNK_IDS,
+    progress: Optional[ProgressFn] = None,
+) -> Dict[str, Any]:
+    """
+    Mueve los registros `ids` a cuarentena y los elimina de precio_competidor,
+    un chunk (transacción) a la vez. Si un chunk falla se detiene: los chunks
+    anteriores quedan en cuarentena (lote "parcial") y pueden restaurarse.
+    """
+    ensure_quarantine_tables()
+    chunks = list(id_chunks(ids, chunk_size))
+    seleccionados = sum(len(c) for _, _, c in chunks)
+
+    res = execute_mysql_transaction(
+        [(
+            f"INSERT INTO {LOTE_TABLE} (creado_en, criterio, filas_seleccionadas, estado) "
+            f"VALUES (NOW(), %s, %s, 'moviendo');",
+            (criterio[:1000], seleccionados),
+        )],
+        loader="cuarentena_lote",
+    )
+    if res is None:
+        return {"id_lote": None, "movidas": 0, "eliminadas": 0, "chunks_ok": 0,
+                "chunks": len(chunks), "error": "No se pudo crear el lote."}
+    id_lote = int(res[0]["lastrowid"])
+
+    cols = _source_columns()
+    movidas = eliminadas = chunks_ok = 0
+    error = None
+    for i, (lo, hi, chunk) in enumerate(chunks):
+        res = execute_mysql_transaction(
+            [
+                (
+                    f"INSERT INTO {QUARANTINE_TABLE} ({cols}, id_lote) "
+                    f"SELECT {cols}, %s FROM {SOURCE_TABLE} "
+                    f"WHERE id BETWEEN %s AND %s AND id IN ({_in_list(chunk)});",
+                    (id_lote, lo, hi),
+                ),
+                (
+                    # Solo se elimina lo que efectivamente quedó copiado en este lote
+                    f"DELETE pc FROM {SOURCE_TABLE} AS pc "
+                    f"JOIN {QUARANTINE_TABLE} AS q ON q.id = pc.id AND q.id_lote = %s "
+                    f"WHERE pc.id BETWEEN %s AND %s;",
+                    (id_lote, lo, hi),
+                ),
+                (_sql_vencer_scores(), (id_lote, lo, hi)),
+            ],
+            loader="cuarentena_mover",
+        )
+        if res is None:
+            error = f"Falló el chunk {i + 1} de {len(chunks)} (ids {lo}–{hi})."
+            break
+        movidas += res[0]["rowcount"]
+        eliminadas += res[1]["rowcount"]
+        chunks_ok += 1
+        if progress is not None:
+            progress(i + 1, len(chunks))
+
+    execute_mysql_query(
+        f"UPDATE {LOTE_TABLE} SET filas_movidas = %s, estado = %s WHERE id_lote = %s;",
+        (movidas, "parcial" if error else "cuarentena", id_lote),
+        fetch=False,
+    )
+    return {
+        "id_lote": id_lote,
+        "movidas": movidas,
+        "eliminadas": eliminadas,
+        "chunks_ok": chunks_ok,
+        "chunks": len(chunks),
+        "error": error,
+        "rango_vencido": _marcar_vencidos(_dias_lote(id_lote)) if eliminadas else None,
+    }
+
+
+def restore_lote(
+    id_lote: int,
+    *,
+    chunk_size: int = CHUNK_IDS,
+    progress: Optional[ProgressFn] = None,
+) -> Dict[str, Any]:
+    """Devuelve a precio_competidor los registros de un lote, por chunks de id."""
+    df_ids = execute_mysql_query(
+        f"SELECT id FROM {QUARANTINE_TABLE} WHERE id_lote = %s ORDER BY id;",
+        (int(id_lote),),
+        host=HOST,
+        loader="cuarentena_ids",
+    )
+    ids = [] if df_ids is None else df_ids["id"].tolist()
+    chunks = list(id_chunks(ids, chunk_size))
+    # Antes de restaurar: después los registros ya no están en cuarentena
+    df_dias = _dias_lote(id_lote)
+
+    cols = _source_columns()
+    restauradas = chunks_ok = 0
+    error = None
+    for i, (lo, hi, _) in enumerate(chunks):
+        res = execute_mysql_transaction(
+            [
+                (
+                    f"INSERT INTO {SOURCE_TABLE} ({cols}) "
+                    f"SELECT {cols} FROM {QUARANTINE_TABLE} "
+                    f"WHERE id_lote = %s AND id BETWEEN %s AND %s;",
+                    (int(id_lote), lo, hi),
+                ),
+                (_sql_vencer_scores(), (int(id_lote), lo, hi)),
+                (
+                    f"DELETE FROM {QUARANTINE_TABLE} WHERE id_lote = %s AND id BETWEEN %s AND %s;",
+                    (int(id_lote), lo, hi),
+                ),
+            ],
+            loader="cuarentena_restaurar",
+        )
+        if res is None:
+            # Típicamente: el id volvió a cargarse en origen (clave duplicada)
+            error = f"Falló el chunk {i + 1} de {len(chunks)} (ids {lo}–{hi})."
+            break
+        restauradas += res[0]["rowcount"]
+        chunks_ok += 1
+        if progress is not None:
+            progress(i + 1, len(chunks))
+
+    execute_mysql_query(
+        f"UPDATE {LOTE_TABLE} SET estado = %s, restaurado_en = NOW() WHERE id_lote = %s;",
+        ("restauracion_parcial" if error else "restaurado", int(id_lote)),
+        fetch=False,
+    )
+    return {"id_lote": int(id_lote), "restauradas": restauradas, "chunks_ok": chunks_ok,
+            "chunks": len(chunks), "error": error,
+            "rango_vencido": _marcar_vencidos(df_dias) if restauradas else None}
+
+
+def list_lotes(limit: int = 20) -> Optional[pd.DataFrame]:
+    """Últimos lotes de cuarentena."""
+    ensure_quarantine_tables()
+    return execute_mysql_query(
+        f"SELECT id_lote, creado_en, criterio, filas_seleccionadas, filas_movidas, estado, restaurado_en "
+        f"FROM {LOTE_TABLE} ORDER BY id_lote DESC LIMIT %s;",
+        (int(limit),),
+        host=HOST,
+    )
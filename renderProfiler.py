@@ -0,0 +1,209 @@
+"""
+Perfil opcional del render de cada página (por rerun):
+- spans por etapa (consulta, tipos, filtros, rollup, grilla, ...);
+- opcionalmente cProfile y asignaciones (tracemalloc) de las etapas.
+  Ambos se encienden solo mientras corre una etapa y se apagan al salir de
+  la más externa, por cualquier excepción: son globales al proceso (o al
+  hilo) y una página que corta con st.stop() o un rerun fuera de una etapa
+  nunca llega a finish().
+
+Se activa por sesión con el parámetro de URL `?profile=`:
+    1 / spans  -> solo tiempos por etapa
+    cprofile   -> + top de funciones de las etapas (cProfile)
+    mem        -> + KB asignados y pico por etapa (tracemalloc)
+    full       -> todo
+o para todas las sesiones con la variable de entorno CHIPER_RENDER_PROFILE.
+
+El resultado se muestra en un panel plegable de la barra lateral y se
+escribe al slow-query log (mismo formato JSONL, name = "render:<página>").
+Desactivado, `stage()` no mide nada.
+"""
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+import streamlit as st
+
+from perfLog import record_event
+
+MODOS = {
+    "1": set(),
+    "spans": set(),
+    "cprofile": {"cprofile"},
+    "mem": {"memory"},
+    "full": {"cprofile", "memory"},
+}
+
+TOP_FUNCIONES = 25
+
+
+def _modo_solicitado() -> Optional[str]:
+    try:
+        modo = st.query_params.get("profile")
+    except Exception:
+        modo = None
+    modo = modo or os.environ.get("CHIPER_RENDER_PROFILE")
+    modo = str(modo).strip().lower() if modo else None
+    return modo if modo in MODOS else None
+
+
+class RenderProfiler:
+    """
+    Uso en una página:
+
+        prof = RenderProfiler.from_request("Posicionamiento")
+        with prof.stage("consulta"):
+            df = load_...(...)
+        ...
+        prof.finish()
+
+    Si la página corta con st.stop() dentro de una etapa, el perfil se
+    emite igual (con stopped = True).
+    """
+
+    def __init__(self, page: str, *, enabled: bool = True, cprofile: bool = False, memory: bool = False):
+        self.page = page
+        self.enabled = enabled
+        self._t0 = time.perf_counter()
+        self._spans: Dict[str, float] = {}
+        self._alloc_kb: Dict[str, float] = {}
+        self._peak_kb: Dict[str, float] = {}
+        self._finished = False
+        self._notes: List[str] = []
+
+        self._profile: Optional[cProfile.Profile] = cProfile.Profile() if enabled and cprofile else None
+        self._profiling = False
+        self._profiled = False
+
+        self._memory = enabled and memory
+        self._started_tracemalloc = False
+        self._depth = 0
+        if self._memory:
+            self._notes.append("tracemalloc es global al proceso: otras sesiones pueden sumar asignaciones.")
+
+    @classmethod
+    def from_request(cls, page: str) -> "RenderProfiler":
+        modo = _modo_solicitado()
+        if modo is None:
+            return cls(page, enabled=False)
+        extras = MODOS[modo]
+        return cls(page, cprofile="cprofile" in extras, memory="memory" in extras)
+
+    # ---------- etapas ----------
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if not self.enabled or self._finished:
+            yield
+            return
+
+        if self._depth <= 0:
+            self._start_tracers()
+        self._depth += 1
+        if self._memory:
+            tracemalloc.reset_peak()
+            mem0, _ = tracemalloc.get_traced_memory()
+        t = time.perf_counter()
+        stopped = False
+        try:
+            yield
+        except BaseException as e:
+            # st.stop() lanza StopException; el perfil se emite de todos modos
+            stopped = type(e).__name__ == "StopException"
+            raise
+        finally:
+            self._spans[name] = self._spans.get(name, 0.0) + (time.perf_counter() - t) * 1000.0
+            if self._memory:
+                mem1, peak = tracemalloc.get_traced_memory()
+                self._alloc_kb[name] = self._alloc_kb.get(name, 0.0) + (mem1 - mem0) / 1024.0
+                self._peak_kb[name] = max(self._peak_kb.get(name, 0.0), (peak - mem0) / 1024.0)
+            self._depth -= 1
+            if self._depth <= 0:
+                self._stop_tracers()
+            if stopped:
+                self.finish(stopped=True)
+
+    def _start_tracers(self) -> None:
+        """Enciende cProfile y tracemalloc al entrar a la etapa más externa."""
+        if self._profile is not None:
+            try:
+                self._profile.enable()
+                self._profiling = self._profiled = True
+            except ValueError:
+                # Otro perfilador activo en el proceso (p.ej. otra sesión con cprofile)
+                nota = "cProfile no disponible en algunas etapas: hay otro perfilador activo."
+                if nota not in self._notes:
+                    self._notes.append(nota)
+        if self._memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def _stop_tracers(self) -> None:
+        """Apaga lo que encendimos nosotros: fuera de una etapa no queda nada activo."""
+        if self._profiling:
+            self._profile.disable()
+            self._profiling = False
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    # ---------- cierre ----------
+    def _top_functions(self) -> List[str]:
+        if not self._profiled:
+            return []
+        buf = io.StringIO()
+        pstats.Stats(self._profile, stream=buf).sort_stats("cumulative").print_stats(TOP_FUNCIONES)
+        return buf.getvalue().splitlines()
+
+    def _stages_frame(self, total_ms: float) -> pd.DataFrame:
+        filas = [
+            {
+                "etapa": name,
+                "ms": ms,
+                "% del rerun": ms / total_ms if total_ms else None,
+                "KB asignados": self._alloc_kb.get(name),
+                "KB pico": self._peak_kb.get(name),
+            }
+            for name, ms in self._spans.items()
+        ]
+        otros = total_ms - sum(self._spans.values())
+        filas.append({"etapa": "(fuera de etapas)", "ms": otros, "% del rerun": otros / total_ms if total_ms else None})
+        return pd.DataFrame(filas)
+
+    def finish(self, *, stopped: bool = False) -> None:
+        """Cierra el perfil, lo muestra en la barra lateral y lo registra. Idempotente."""
+        if not self.enabled or self._finished:
+            return
+        self._finished = True
+        total_ms = (time.perf_counter() - self._t0) * 1000.0
+
+        self._depth = 0
+        self._stop_tracers()
+        top = self._top_functions()
+
+        record_event(
+            {
+                "name": f"render:{self.page}",
+                "kind": "render",
+                "status": "ok",
+                "stopped": stopped,
+                "total_ms": total_ms,
+                "spans_ms": dict(self._spans),
+                "alloc_kb": dict(self._alloc_kb) or None,
+                "peak_kb": dict(self._peak_kb) or None,
+                "top_functions": top or None,
+            },
+            force_log=True,
+        )
+
+        with st.sidebar.expander(f"Perfil de render ({total_ms:,.0f} ms)", expanded=False):
+            st.dataframe(self._stages_frame(total_ms), use_container_width=True, hide_index=True)
+            for nota in self._notes:
+                st.caption(nota)
+            if top:
+                st.code("\n".join(top), language="text")
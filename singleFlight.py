@@ -0,0 +1,311 @@
+"""
+Single-flight: llamadas concurrentes con la misma clave canónica esperan una
+única ejecución en vuelo y comparten su resultado.
+
+- Entre hilos del mismo proceso: un Event por clave.
+- Entre procesos locales: un lock file (fcntl.flock) por clave; quien obtiene
+  el lock calcula y, solo si otro proceso quedó esperando (marca .espera),
+  deja el resultado en un pickle junto al lock para que lo lea en vez de
+  repetir la consulta. El lock file se borra al terminar y los pickles y
+  marcas más viejos que result_ttl_s se purgan: el directorio no crece.
+
+El directorio de locks (CHIPER_SINGLEFLIGHT_DIR, por defecto uno por usuario
+en el tmp del sistema) tiene que ser del usuario actual y con modo 0700: un
+pickle plantado por otro usuario ejecutaría código al leerse. Si no cumple,
+no se comparte entre procesos y cada uno calcula lo suyo.
+"""
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import stat
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Lock entre procesos solo en POSIX; en otros sistemas queda solo entre hilos.
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+DEFAULT_LOCK_DIR = os.environ.get("CHIPER_SINGLEFLIGHT_DIR") or os.path.join(
+    tempfile.gettempdir(), f"chiper_bi_singleflight_{os.getuid() if hasattr(os, 'getuid') else 0}"
+)
+
+
+def canonical_key(name: str, fn: Callable, args: tuple, kwargs: dict) -> str:
+    """
+    Clave estable de una llamada: nombre + argumentos normalizados según la
+    firma de `fn` (posicionales y keywords dan la misma clave, defaults incluidos).
+    """
+    try:
+        bound = inspect.signature(fn).bind(*args, **kwargs)
+        bound.apply_defaults()
+        items = sorted(bound.arguments.items())
+    except (TypeError, ValueError):
+        items = [("args", args), ("kwargs", sorted(kwargs.items()))]
+    return f"{name}:" + repr(items)
+
+
+def _shared_copy(value: Any) -> Any:
+    """Los seguidores reciben una copia para no compartir objetos mutables (DataFrames)."""
+    copy = getattr(value, "copy", None)
+    if callable(copy):
+        try:
+            return copy()
+        except Exception:
+            return value
+    return value
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlightGroup:
+    """Deduplicación de llamadas en vuelo dentro del proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.stats = {"leaders": 0, "shared": 0}
+
+    def do(
+        self,
+        key: str,
+        fn: Callable[[], Any],
+        retry_followers_on: Optional[Callable[[BaseException], bool]] = None,
+    ) -> Any:
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _Call()
+                    self._calls[key] = call
+                    self.stats["leaders"] += 1
+
+            if leader:
+                try:
+                    call.result = fn()
+                    return call.result
+                except BaseException as e:
+                    call.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        self._calls.pop(key, None)
+                    call.event.set()
+
+            call.event.wait()
+            if call.error is not None:
+                # p.ej. la consulta del líder fue cancelada por un rerun de SU sesión:
+                # el seguidor no debe heredar ese error, reintenta.
+                if retry_followers_on is not None and retry_followers_on(call.error):
+                    continue
+                raise call.error
+            with self._lock:
+                self.stats["shared"] += 1
+            return _shared_copy(call.result)
+
+
+_group = SingleFlightGroup()
+_process_stats = {"computed": 0, "shared": 0}
+_process_stats_lock = threading.Lock()
+
+
+def get_single_flight_stats() -> Dict[str, int]:
+    """Líderes / resultados compartidos entre hilos y entre procesos."""
+    with _process_stats_lock:
+        return {
+            "thread_leaders": _group.stats["leaders"],
+            "thread_shared": _group.stats["shared"],
+            "process_computed": _process_stats["computed"],
+            "process_shared": _process_stats["shared"],
+        }
+
+
+_purge_lock = threading.Lock()
+_last_purge = {"t": 0.0}
+
+
+def _purge_stale(lock_dir: str, ttl_s: float) -> None:
+    """Borra pickles, marcas y temporales vencidos (a lo sumo una vez por ttl_s)."""
+    now = time.time()
+    with _purge_lock:
+        if now - _last_purge["t"] < ttl_s:
+            return
+        _last_purge["t"] = now
+    try:
+        entries = list(os.scandir(lock_dir))
+    except OSError:
+        return
+    for entry in entries:
+        if entry.name.endswith(".lock"):
+            continue
+        try:
+            if now - entry.stat().st_mtime > ttl_s:
+                os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+_rejected_dirs = set()
+
+
+def _private_dir(lock_dir: str) -> bool:
+    """
+    Crea `lock_dir` con modo 0700 y verifica que sea un directorio real (no
+    symlink), del usuario actual y sin permisos para grupo/otros. Si no,
+    avisa una vez y devuelve False.
+    """
+    try:
+        os.makedirs(lock_dir, mode=0o700, exist_ok=True)
+        st_dir = os.lstat(lock_dir)
+    except OSError:
+        return False
+    ok = (
+        stat.S_ISDIR(st_dir.st_mode)
+        and st_dir.st_uid == os.getuid()
+        and stat.S_IMODE(st_dir.st_mode) & 0o077 == 0
+    )
+    if not ok and lock_dir not in _rejected_dirs:
+        _rejected_dirs.add(lock_dir)
+        print(f"[SINGLE-FLIGHT] {lock_dir} no es privado del usuario: sin dedup entre procesos")
+    return ok
+
+
+def _open_locked(lock_path: str, wait_path: str):
+    """
+    Abre y bloquea el lock file de la clave. Si hay que esperar deja la marca
+    `wait_path` para que quien calcula publique el resultado. El dueño borra
+    el lock file al terminar: si el inode bloqueado ya no es el del path se
+    vuelve a abrir.
+    """
+    while True:
+        lock_file = open(lock_path, "a+b")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            try:
+                with open(wait_path, "ab"):
+                    pass
+                os.utime(wait_path)
+            except OSError:
+                pass
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            same = os.fstat(lock_file.fileno()).st_ino == os.stat(lock_path).st_ino
+        except OSError:
+            same = False
+        if same:
+            return lock_file
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        lock_file.close()
+
+
+def _run_across_processes(
+    key: str,
+    compute: Callable[[], Any],
+    lock_dir: str,
+    result_ttl_s: float,
+) -> Any:
+    """
+    Ejecuta `compute` bajo un lock file por clave. Si mientras esperábamos el
+    lock otro proceso dejó un resultado fresco, se reutiliza.
+    """
+    if not FCNTL_AVAILABLE or not _private_dir(lock_dir):
+        return compute()
+
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    lock_path = os.path.join(lock_dir, f"{digest}.lock")
+    result_path = os.path.join(lock_dir, f"{digest}.pkl")
+    wait_path = os.path.join(lock_dir, f"{digest}.espera")
+
+    t_wait = time.time()
+    lock_file = _open_locked(lock_path, wait_path)
+    try:
+        # ¿Otro proceso terminó esta misma clave mientras esperábamos?
+        try:
+            mtime = os.path.getmtime(result_path)
+            if mtime >= t_wait and (time.time() - mtime) <= result_ttl_s:
+                with open(result_path, "rb") as fh:
+                    # Solo pickles escritos por este usuario
+                    if os.fstat(fh.fileno()).st_uid != os.getuid():
+                        raise OSError(f"{result_path} no es del usuario actual")
+                    value = pickle.load(fh)
+                with _process_stats_lock:
+                    _process_stats["shared"] += 1
+                return value
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+
+        value = compute()
+        with _process_stats_lock:
+            _process_stats["computed"] += 1
+
+        # Solo se serializa si alguien quedó esperando esta clave
+        if os.path.exists(wait_path):
+            try:
+                tmp_path = f"{result_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as fh:
+                    pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, result_path)
+                os.unlink(wait_path)
+            except Exception:
+                # Compartir entre procesos es un extra; nunca rompe la carga.
+                pass
+
+        return value
+    finally:
+        try:
+            os.unlink(lock_path)
+        except OSError:
+            pass
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        lock_file.close()
+        _purge_stale(lock_dir, result_ttl_s)
+
+
+def single_flight(
+    name: str,
+    *,
+    lock_dir: str = DEFAULT_LOCK_DIR,
+    result_ttl_s: float = 60.0,
+    across_processes: bool = True,
+    retry_followers_on: Optional[Callable[[BaseException], bool]] = None,
+) -> Callable:
+    """
+    Decorador single-flight para loaders. Se pone DEBAJO de st.cache_data,
+    para que solo actúe en los cache miss:
+
+        @st.cache_data(show_spinner=True)
+        @single_flight("posicionamiento_dia")
+        def load_posicionamiento_dia(...): ...
+    """
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = canonical_key(name, fn, args, kwargs)
+
+            def compute():
+                if across_processes:
+                    return _run_across_processes(
+                        key, lambda: fn(*args, **kwargs), lock_dir, result_ttl_s
+                    )
+                return fn(*args, **kwargs)
+
+            return _group.do(key, compute, retry_followers_on=retry_followers_on)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,248 @@
+"""
+Sketches combinables (mergeables) para agregados por día:
+
+- HyperLogLog: cantidad aproximada de SKUs distintos. La unión de varios
+  días es el máximo registro a registro, así la representatividad de una
+  ventana sale de combinar un sketch por día, sin volver a ver las filas.
+- t-digest: cuantiles aproximados (p10/p50/p90) del posicionamiento. Se
+  combina concatenando centroides y recomprimiendo.
+
+Ambos se serializan a bytes para guardarse en MySQL (sketch_dia, job
+batchJobs.py sketches) y el costo de combinarlos depende de la cantidad de
+sketches (días × categorías), no de las filas que resumen.
+
+    hll = HyperLogLog.from_ids(ids_dia)
+    total = HyperLogLog.merge_all(HyperLogLog.from_bytes(b) for b in blobs).estimate()
+    p50 = TDigest.merge_all(TDigest.from_bytes(b) for b in blobs).quantile(0.5)
+
+Solo numpy: el error típico del HLL con p=12 es ≈ 1.6 %; el t-digest con
+compresión 100 es exacto en los extremos y ≈ 1 % de rango en la mediana.
+"""
+import struct
+from typing import Iterable, Optional
+
+import numpy as np
+
+HLL_P = 12
+TDIGEST_COMPRESION = 100.0
+
+_HLL_VERSION = 1
+_HLL_DENSO = 0
+_HLL_DISPERSO = 1
+_TDIGEST_VERSION = 1
+
+
+# ======================================================
+# HASH
+# ======================================================
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """Hash de 64 bits bien distribuido para enteros (ids consecutivos incluidos)."""
+    z = x.astype(np.uint64, copy=True)
+    with np.errstate(over="ignore"):
+        z += np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+# ======================================================
+# HYPERLOGLOG
+# ======================================================
+class HyperLogLog:
+    """HyperLogLog de 2^p registros uint8 sobre ids enteros."""
+
+    def __init__(self, p: int = HLL_P, registros: Optional[np.ndarray] = None):
+        self.p = int(p)
+        self.m = 1 << self.p
+        if registros is None:
+            registros = np.zeros(self.m, dtype=np.uint8)
+        self.registros = registros
+
+    @classmethod
+    def from_ids(cls, ids, p: int = HLL_P) -> "HyperLogLog":
+        hll = cls(p)
+        hll.add(ids)
+        return hll
+
+    def add(self, ids) -> None:
+        ids = np.asarray(ids)
+        if ids.size == 0:
+            return
+        h = _splitmix64(ids.astype(np.int64).view(np.uint64))
+        bits_resto = 64 - self.p
+        idx = (h >> np.uint64(bits_resto)).astype(np.intp)
+        resto = h & np.uint64((1 << bits_resto) - 1)
+        # rho = posición del primer 1 en los bits_resto bits (bits_resto + 1 si son 0).
+        # bits_resto <= 52 cabe exacto en float64, así frexp da el largo en bits
+        _, largo = np.frexp(resto.astype(np.float64))
+        rho = (bits_resto - largo + 1).astype(np.uint8)
+        np.maximum.at(self.registros, idx, rho)
+
+    def merge(self, otro: "HyperLogLog") -> "HyperLogLog":
+        if otro.p != self.p:
+            raise ValueError(f"HyperLogLog con precisión distinta ({self.p} != {otro.p})")
+        np.maximum(self.registros, otro.registros, out=self.registros)
+        return self
+
+    @classmethod
+    def merge_all(cls, sketches: Iterable["HyperLogLog"], p: int = HLL_P) -> "HyperLogLog":
+        total = cls(p)
+        for s in sketches:
+            total.merge(s)
+        return total
+
+    def estimate(self) -> float:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        est = alpha * m * m / np.sum(np.ldexp(1.0, -self.registros.astype(np.int32)))
+        ceros = int(np.count_nonzero(self.registros == 0))
+        # Rango bajo: conteo lineal (con hash de 64 bits no hace falta corrección alta)
+        if est <= 2.5 * m and ceros:
+            est = m * np.log(m / ceros)
+        return float(est)
+
+    def to_bytes(self) -> bytes:
+        """Denso (2^p bytes) o, si conviene, disperso: pares (registro uint16, valor uint8)."""
+        idx = np.flatnonzero(self.registros)
+        if idx.size * 3 < self.m:
+            return (
+                struct.pack("<BBB", _HLL_VERSION, self.p, _HLL_DISPERSO)
+                + idx.astype("<u2").tobytes()
+                + self.registros[idx].tobytes()
+            )
+        return struct.pack("<BBB", _HLL_VERSION, self.p, _HLL_DENSO) + self.registros.tobytes()
+
+    @classmethod
+    def from_bytes(cls, datos: bytes) -> "HyperLogLog":
+        version, p, formato = struct.unpack_from("<BBB", datos)
+        if version != _HLL_VERSION:
+            raise ValueError(f"Versión de HyperLogLog no soportada: {version}")
+        if formato == _HLL_DENSO:
+            return cls(p, np.frombuffer(datos, dtype=np.uint8, offset=3).copy())
+        n = (len(datos) - 3) // 3
+        idx = np.frombuffer(datos, dtype="<u2", count=n, offset=3)
+        hll = cls(p)
+        hll.registros[idx] = np.frombuffer(datos, dtype=np.uint8, count=n, offset=3 + 2 * n)
+        return hll
+
+
+# ======================================================
+# T-DIGEST
+# ======================================================
+class TDigest:
+    """
+    t-digest "merging" con función de escala k1 (arcoseno): centroides
+    (media, peso) ordenados, más chicos cerca de los extremos.
+    """
+
+    def __init__(
+        self,
+        medias: Optional[np.ndarray] = None,
+        pesos: Optional[np.ndarray] = None,
+        minimo: float = np.inf,
+        maximo: float = -np.inf,
+        compresion: float = TDIGEST_COMPRESION,
+    ):
+        self.medias = np.asarray(medias if medias is not None else [], dtype=np.float64)
+        self.pesos = np.asarray(pesos if pesos is not None else [], dtype=np.float64)
+        self.minimo = float(minimo)
+        self.maximo = float(maximo)
+        self.compresion = float(compresion)
+
+    @classmethod
+    def from_values(cls, valores, compresion: float = TDIGEST_COMPRESION) -> "TDigest":
+        v = np.asarray(valores, dtype=np.float64)
+        v = v[np.isfinite(v)]
+        if v.size == 0:
+            return cls(compresion=compresion)
+        td = cls(v, np.ones(v.size), v.min(), v.max(), compresion)
+        td._comprimir()
+        return td
+
+    @property
+    def n(self) -> float:
+        return float(self.pesos.sum())
+
+    def _comprimir(self) -> None:
+        if self.medias.size <= 1:
+            return
+        orden = np.argsort(self.medias, kind="stable")
+        medias = self.medias[orden]
+        pesos = self.pesos[orden]
+        total = pesos.sum()
+        # k1(q) = δ / 2π · asin(2q − 1): un centroide abarca a lo sumo 1 unidad de k
+        escala = self.compresion / (2 * np.pi)
+        k = escala * np.arcsin(np.clip(2 * np.cumsum(pesos) / total - 1, -1.0, 1.0))
+
+        out_m, out_w = [], []
+        k_ini = -escala * np.pi / 2
+        acc_m = acc_w = 0.0
+        for mi, wi, ki in zip(medias, pesos, k):
+            if acc_w and ki - k_ini > 1.0:
+                out_m.append(acc_m)
+                out_w.append(acc_w)
+                k_ini = k_prev
+                acc_m = acc_w = 0.0
+            acc_w += wi
+            acc_m += (mi - acc_m) * wi / acc_w
+            k_prev = ki
+        out_m.append(acc_m)
+        out_w.append(acc_w)
+        self.medias = np.array(out_m)
+        self.pesos = np.array(out_w)
+
+    def merge(self, otro: "TDigest") -> "TDigest":
+        if otro.medias.size == 0:
+            return self
+        self.medias = np.concatenate([self.medias, otro.medias])
+        self.pesos = np.concatenate([self.pesos, otro.pesos])
+        self.minimo = min(self.minimo, otro.minimo)
+        self.maximo = max(self.maximo, otro.maximo)
+        self._comprimir()
+        return self
+
+    @classmethod
+    def merge_all(cls, sketches: Iterable["TDigest"], compresion: float = TDIGEST_COMPRESION) -> "TDigest":
+        """Une todos los digests y recomprime una sola vez (no uno por uno)."""
+        sketches = [s for s in sketches if s.medias.size]
+        if not sketches:
+            return cls(compresion=compresion)
+        td = cls(
+            np.concatenate([s.medias for s in sketches]),
+            np.concatenate([s.pesos for s in sketches]),
+            min(s.minimo for s in sketches),
+            max(s.maximo for s in sketches),
+            compresion,
+        )
+        td._comprimir()
+        return td
+
+    def quantile(self, q: float) -> float:
+        """Cuantil q ∈ [0, 1] interpolando entre centros de centroides; NaN si está vacío."""
+        if self.medias.size == 0:
+            return float("nan")
+        if self.medias.size == 1:
+            return float(self.medias[0]) if self.minimo == self.maximo else float(
+                self.minimo + q * (self.maximo - self.minimo)
+            )
+        total = self.pesos.sum()
+        centros = np.cumsum(self.pesos) - self.pesos / 2
+        x = np.concatenate([[0.0], centros, [total]])
+        y = np.concatenate([[self.minimo], self.medias, [self.maximo]])
+        return float(np.interp(q * total, x, y))
+
+    def to_bytes(self) -> bytes:
+        cabecera = struct.pack(
+            "<BdddI", _TDIGEST_VERSION, self.compresion, self.minimo, self.maximo, self.medias.size
+        )
+        return cabecera + self.medias.astype("<f8").tobytes() + self.pesos.astype("<f8").tobytes()
+
+    @classmethod
+    def from_bytes(cls, datos: bytes) -> "TDigest":
+        version, compresion, minimo, maximo, n = struct.unpack_from("<BdddI", datos)
+        if version != _TDIGEST_VERSION:
+            raise ValueError(f"Versión de t-digest no soportada: {version}")
+        off = struct.calcsize("<BdddI")
+        medias = np.frombuffer(datos, dtype="<f8", count=n, offset=off)
+        pesos = np.frombuffer(datos, dtype="<f8", count=n, offset=off + 8 * n)
+        return cls(medias.copy(), pesos.copy(), minimo, maximo, compresion)